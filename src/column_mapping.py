@@ -0,0 +1,112 @@
+import pandas as pd
+
+
+class Column:
+    """One output column: the exporter headers it may come from, and how its values are converted.
+
+    `aliases` are tried in order and the first one present in the sheet is used, so a new exporter
+    version only needs its header added here. Values are divided by `divisor` (1024 turns MiB or MB
+    into GB), and missing values are replaced with `fill` when it is given.
+    """
+
+    def __init__(self, target, *aliases, divisor=None, fill=None):
+        self.target = target
+        self.aliases = aliases or (target,)
+        self.divisor = divisor
+        self.fill = fill
+
+
+class SheetMapping:
+    """The columns kept from one sheet, in output order.
+
+    The header of each sheet read is resolved against the aliases once and the plan is kept, so the
+    data itself is projected, filled and scaled in a single pass with no per-version branching.
+    Columns with no header present in the sheet are left out, as DataFrame.filter would.
+    """
+
+    def __init__(self, *columns):
+        self.columns = columns
+        self._plans = {}
+
+    def headers(self):
+        """Every header any column may come from, to whitelist when reading the sheet."""
+        return [alias for column in self.columns for alias in column.aliases]
+
+    def resolve(self, header):
+        """Pair each column with the header it comes from in a sheet with these column names."""
+        header = tuple(header)
+        plan = self._plans.get(header)
+        if plan is None:
+            present = set(header)
+            plan = []
+            for column in self.columns:
+                source = next((alias for alias in column.aliases if alias in present), None)
+                if source is not None:
+                    plan.append((source, column))
+            self._plans[header] = plan
+        return plan
+
+    def apply(self, df):
+        """Project `df` onto the output columns, filling and scaling them on the way."""
+        projected = {}
+        for source, column in self.resolve(df.columns):
+            values = df[source]
+            if column.fill is not None:
+                values = values.fillna(column.fill)
+            if column.divisor is not None:
+                values = values / column.divisor
+            projected[column.target] = values
+        return pd.DataFrame(projected, index = df.index)
+
+
+# dtype of every column a conversion outputs. Labels shared by many VMs are categorical and metrics
+# float32 - about seven significant digits, more than the exporters report - which takes a 100k-VM
+# frame's numbers and repeated strings to a fraction of their object/float64 size. Identifiers, names
+# and IP lists are nearly unique per VM and stay object. vRam is in GB, which is fractional for small
+# or oddly sized VMs, so unlike vCpu it is not an integer.
+OUTPUT_DTYPES = {
+    'sourceFile': 'category',
+    'vmId': object,
+    'cluster': 'category',
+    'virtualDatacenter': 'category',
+    'vCenter': 'category',
+    'ip_addresses': object,
+    'os': 'category',
+    'os_name': object,
+    'vmState': 'category',
+    'vCpu': 'Int16',
+    'vmName': object,
+    'vRam': 'float32',
+    'vinfo_provisioned': 'float32',
+    'vinfo_used': 'float32',
+    'vmdkTotal': 'float32',
+    'vmdkUsed': 'float32',
+    'readIOPS': 'float32',
+    'writeIOPS': 'float32',
+    'peakReadIOPS': 'float32',
+    'peakWriteIOPS': 'float32',
+    'readThroughput': 'float32',
+    'writeThroughput': 'float32',
+    'peakReadThroughput': 'float32',
+    'peakWriteThroughput': 'float32',
+    }
+
+
+def apply_output_schema(df):
+    """Cast a consolidated frame to OUTPUT_DTYPES, the last step of every conversion.
+
+    Raises ValueError for a column the schema does not list, so a new output column cannot slip
+    through with pandas' default dtype, and for values the column's dtype cannot hold, such as a
+    fractional or out-of-range vCpu.
+    """
+    unknown = [name for name in df.columns if name not in OUTPUT_DTYPES]
+    if unknown:
+        raise ValueError(f'no output dtype for column(s) {", ".join(unknown)}')
+
+    columns = {}
+    for name in df.columns:
+        try:
+            columns[name] = df[name].astype(OUTPUT_DTYPES[name])
+        except (TypeError, ValueError) as err:
+            raise ValueError(f'column {name} does not fit {OUTPUT_DTYPES[name]}: {err}') from err
+    return pd.DataFrame(columns, index = df.index)
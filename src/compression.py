@@ -0,0 +1,55 @@
+import gzip
+import zlib
+
+# text the app generates, which gzip shrinks several times over; downloads in binary formats are compressed
+# already, and static files are sent as they are. HTML is left alone: its pages carry CSRF tokens next to
+# text taken from the request, and the compressed length of such a page lets an attacker who can make a
+# victim's browser request it guess the token a character at a time (BREACH)
+COMPRESSIBLE_MIMETYPES = ('text/plain', 'text/csv', 'application/json')
+
+
+def gzip_chunks(chunks, level):
+    """Compress a streamed body as it is sent, flushing after every chunk so the client sees each one at once.
+
+    A sync flush ends the deflate block without resetting its window, so each chunk still refers
+    back to everything sent before it and the stream compresses almost as well as a whole body.
+    """
+    # wbits over 16 writes the gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if chunk:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def compress_response(response, accept_encodings, level, min_bytes):
+    """gzip a text response for a client that accepts it; anything else is returned unchanged.
+
+    Whole bodies shorter than `min_bytes` are left alone, as the gzip framing would outweigh the
+    saving; streamed bodies are compressed chunk by chunk with gzip_chunks.
+    """
+    if level <= 0 or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    # a quality of 0 is a client refusing gzip
+    if (accept_encodings['gzip'] <= 0 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 206, 304)):
+        return response
+
+    if response.is_streamed:
+        body = response.response
+        response.response = gzip_chunks(body, level)
+        # the body may hold the request context open until it is closed, which must still happen
+        # when the client goes away before the first chunk
+        if hasattr(body, 'close'):
+            response.call_on_close(body.close)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < min_bytes:
+            return response
+        response.set_data(gzip.compress(body, level))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -1,22 +1,108 @@
-import pandas as pd
+import logging
+import os
+import sys
+import zipfile
 
-def filetype_validation(input_path, fn):
-    print("determining file type")
+if 'pytest' in sys.modules:
+    from src.metrics import stage
+    from src.xlsx_reader import read_sheet_ids
+else:
+    from metrics import stage
+    from xlsx_reader import read_sheet_ids
 
-    lo_sheets=['Details', 'ESX Hosts', 'ESX Performance', 'Host Devices', 'VMs', 'VM Performance', 'VM Disks', 'ESX Licenses', 'Host Disks', 'Host Network Adapters']
-    rv_sheets=['vInfo', 'vCPU', 'vMemory', 'vDisk', 'vPartition', 'vNetwork', 'vCD', 'vUSB', 'vSnapshot', 'vTools', 'vSource', 'vRP', 'vCluster', 'vHost', 'vHBA', 'vNIC', 'vSwitch', 'vPort', 'dvSwitch', 'dvPort', 'vSC_VMK', 'vDatastore', 'vMultiPath', 'vLicense', 'vFileInfo', 'vHealth', 'vMetaData']
+logger = logging.getLogger('inventory.validation')
 
-    file_type=""
+lo_sheets=['Details', 'ESX Hosts', 'ESX Performance', 'Host Devices', 'VMs', 'VM Performance', 'VM Disks', 'ESX Licenses', 'Host Disks', 'Host Network Adapters']
+rv_sheets=['vInfo', 'vCPU', 'vMemory', 'vDisk', 'vPartition', 'vNetwork', 'vCD', 'vUSB', 'vSnapshot', 'vTools', 'vSource', 'vRP', 'vCluster', 'vHost', 'vHBA', 'vNIC', 'vSwitch', 'vPort', 'dvSwitch', 'dvPort', 'vSC_VMK', 'vDatastore', 'vMultiPath', 'vLicense', 'vFileInfo', 'vHealth', 'vMetaData']
 
-    vmfile = pd.ExcelFile(f'{input_path}{fn}')
-    vmsheets=vmfile.sheet_names
-    if vmsheets==lo_sheets:
-        print(f'{fn} is a match for live optics')
-        file_type="live-optics"
-    elif vmsheets==rv_sheets:
-        print(f'{fn} is a match for rvtools')
-        file_type="rv-tools"
+# file type -> (sheets the exporter writes, sheets the conversion reads)
+SIGNATURES = {
+    'live-optics': (lo_sheets, {'VMs', 'VM Performance'}),
+    'rv-tools': (rv_sheets, {'vInfo', 'vDisk', 'vPartition'}),
+}
+
+# share of an exporter's known sheets a workbook needs before it is taken for that exporter
+MIN_CONFIDENCE = 0.5
+
+# legacy .xls files are OLE2 compound documents
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+class FileSniff:
+    """What sniffing an upload found: its file type, how sure the match is and the sheet list.
+
+    `sheet_ids` (sheet name -> relationship id, .xlsx only) can be handed to Workbook so the
+    conversion does not parse the workbook manifest a second time.
+    """
+
+    def __init__(self, file_type, confidence, sheet_names, sheet_ids=None):
+        self.file_type = file_type
+        self.confidence = confidence
+        self.sheet_names = sheet_names
+        self.sheet_ids = sheet_ids
+
+
+def match_sheets(sheet_names):
+    """Score sheet names against each exporter; returns the best (file_type, confidence).
+
+    A workbook matches when it has every sheet the conversion reads; the confidence is the share of
+    the exporter's other sheets that are present too, so newer exporter versions that add, drop or
+    reorder sheets still match.
+    """
+    present = set(sheet_names)
+    best = ('invalid', 0.0)
+    for file_type, (known, required) in SIGNATURES.items():
+        if not required <= present:
+            continue
+        confidence = len(present.intersection(known)) / len(known)
+        if confidence >= MIN_CONFIDENCE and confidence > best[1]:
+            best = (file_type, confidence)
+    return best
+
+
+def sniff_file(input_path, fn):
+    """Identify an upload from its workbook manifest alone, never touching the sheet data."""
+    path = os.path.join(input_path, fn)
+    sheet_ids = None
+    with stage('sniff'):
+        try:
+            with open(path, 'rb') as f:
+                magic = f.read(len(OLE_MAGIC))
+            if zipfile.is_zipfile(path):
+                with zipfile.ZipFile(path) as container:
+                    sheet_ids = read_sheet_ids(container)
+                sheet_names = list(sheet_ids)
+            elif magic == OLE_MAGIC:
+                import pandas as pd
+                # xlrd only reads the workbook globals, where the sheet list lives, when loading on demand
+                with pd.ExcelFile(path, engine_kwargs={'on_demand': True}) as vmfile:
+                    sheet_names = vmfile.sheet_names
+            else:
+                sheet_names = []
+        except ImportError:
+            # a missing xlrd is a broken install, not a broken upload, and must not pass as one
+            raise
+        except Exception as err:
+            # broken zips, malformed manifests and whatever xlrd raises for a damaged .xls all mean invalid
+            logger.warning('%s could not be read as a workbook: %s', fn, err)
+            sheet_names = []
+
+    file_type, confidence = match_sheets(sheet_names)
+    return FileSniff(file_type, confidence, sheet_names, sheet_ids)
+
+
+def filetype_validation(input_path, fn, workbook=None):
+    # reuse the caller's workbook handle when there is one, so conversion does not have to reopen the file
+    if workbook is None:
+        sniff = sniff_file(input_path, fn)
+        file_type, confidence = sniff.file_type, sniff.confidence
+    else:
+        file_type, confidence = match_sheets(workbook.sheet_names)
+
+    if file_type == "live-optics":
+        logger.info(f'{fn} is a match for live optics ({confidence:.0%} of the known sheets)')
+    elif file_type == "rv-tools":
+        logger.info(f'{fn} is a match for rvtools ({confidence:.0%} of the known sheets)')
     else:
-        print(f'{fn} is neither a LiveOptics file, nor an RV Tools file, else is not correctly formed / complete.')
-        file_type="invalid"
-    return file_type
\ No newline at end of file
+        logger.info(f'{fn} is neither a LiveOptics file, nor an RV Tools file, else is not correctly formed / complete.')
+    return file_type
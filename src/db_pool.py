@@ -0,0 +1,130 @@
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# upper bounds, in seconds, of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    """Counts and a histogram of how long checkouts from one process's pool took.
+
+    Waits that creep towards DB_POOL_TIMEOUT, or any timeouts at all, mean the pool is too small
+    for the requests a process serves concurrently.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.buckets = [0] * len(WAIT_BUCKETS)
+
+    def observe(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[i] += 1
+
+    def timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'waitSeconds': self.wait_seconds,
+                'maxWaitSeconds': self.max_wait_seconds,
+                # cumulative, as in a Prometheus histogram
+                'waitBuckets': {str(bound): count for bound, count in zip(WAIT_BUCKETS, self.buckets)},
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout took, pre-ping and new connections included."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; the counts carry over
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.timed_out()
+            raise
+        self.metrics.observe(time.perf_counter() - start)
+        return connection
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the pool and session settings in `config`.
+
+    Only PostgreSQL URLs are tuned; anything else (the SQLite databases some tests use) keeps
+    SQLAlchemy's defaults. The statement timeout is sent as a startup option, except through
+    PgBouncer, which rejects those - configure_engine sets it per transaction instead.
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+    connect_args = {}
+    if config['DB_STATEMENT_TIMEOUT'] and not config['DB_PGBOUNCER']:
+        connect_args['options'] = f'-c statement_timeout={config["DB_STATEMENT_TIMEOUT"]}'
+    if url.get_driver_name() == 'psycopg':
+        # statements prepared on one server connection are unknown to the next one PgBouncer hands out
+        if config['DB_PGBOUNCER']:
+            connect_args['prepare_threshold'] = None
+        elif config['DB_PREPARE_THRESHOLD']:
+            connect_args['prepare_threshold'] = int(config['DB_PREPARE_THRESHOLD'])
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def configure_engine(engine, config):
+    """Hook the settings up that cannot be passed at connect time.
+
+    Behind PgBouncer in transaction pooling mode each transaction may run on a different server
+    connection, so the statement timeout is set with SET LOCAL at the start of every transaction.
+    """
+    timeout = config['DB_STATEMENT_TIMEOUT']
+    if config['DB_PGBOUNCER'] and timeout and engine.dialect.name == 'postgresql':
+        @event.listens_for(engine, 'begin')
+        def set_statement_timeout(connection):
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+def pool_status(engine):
+    """Occupancy of the engine's pool right now, and its checkout metrics when it keeps them."""
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checkedOut=pool.checkedout(), idle=pool.checkedin(), overflow=pool.overflow())
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
@@ -0,0 +1,261 @@
+import re
+import sys
+import zipfile
+from functools import reduce
+from operator import add
+from xml.sax.saxutils import escape
+from sqlalchemy import Float, Numeric, cast, select
+
+if 'pytest' in sys.modules:
+    from src.persistence import WORKLOAD_COLUMNS
+else:
+    from persistence import WORKLOAD_COLUMNS
+
+# rows converted and sent at a time; bounds the memory an export takes whatever its size
+EXPORT_CHUNK_ROWS = 5000
+
+XLSX_SHEET_NAME = 'VMs'
+
+# characters XML 1.0 does not allow, which Excel refuses to open a sheet over
+XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                 '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                 '<Default Extension="xml" ContentType="application/xml"/>'
+                 '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                 '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                 '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                 '</Types>')
+PACKAGE_RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+                '</Relationships>')
+WORKBOOK = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{XLSX_SHEET_NAME}" sheetId="1" r:id="rId1"/></sheets>'
+            f'<definedNames><definedName name="_xlnm._FilterDatabase" localSheetId="0" hidden="1">{{filter_range}}</definedName></definedNames>'
+            '</workbook>')
+WORKBOOK_RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                 '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+                 '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+                 '</Relationships>')
+STYLES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+          '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+          '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+          '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+          '<borders count="1"><border/></borders>'
+          '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+          '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+          '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+          '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+          '</styleSheet>')
+SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+              '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+              '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>'
+              '<sheetData>')
+
+
+class _StreamSink:
+    """Write-only file that hands what was written to it back in pieces, for writers that want a file."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def frame_chunks(vm_data_df, rows=EXPORT_CHUNK_ROWS):
+    """Slices of a converted frame, as the exporters consume them; at least one, so an empty frame still has a header."""
+    for start in range(0, max(len(vm_data_df), 1), rows):
+        yield vm_data_df.iloc[start:start + rows]
+
+
+def workload_export_query(table, pid):
+    """A project's workloads_tb rows under the consolidated column names, numerics as floats, in load order."""
+    columns = []
+    for col, name in WORKLOAD_COLUMNS.items():
+        column = table.columns[name]
+        if isinstance(column.type, Numeric) and not isinstance(column.type, Float):
+            column = cast(column, Float)
+        columns.append(column.label(col))
+    return select(*columns).where(table.c.pid == pid).order_by(table.c.vmid)
+
+
+def query_chunks(engine, statement, rows=EXPORT_CHUNK_ROWS):
+    """Run `statement` on a server-side cursor and yield its rows as frames of up to `rows` rows.
+
+    The connection is only taken when the first chunk is asked for, and given back when the last
+    one has been read or the consumer stops early.
+    """
+    import pandas as pd
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=rows).execute(statement)
+        columns = list(result.keys())
+        empty = True
+        for partition in result.partitions():
+            empty = False
+            yield pd.DataFrame.from_records(partition, columns=columns)
+        if empty:
+            yield pd.DataFrame(columns=columns)
+
+
+def csv_stream(chunks):
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _string_cells(values):
+    text = values.astype(str).str.replace(XML_ILLEGAL, '', regex=True).map(escape)
+    return ('<c t="inlineStr"><is><t>' + text + '</t></is></c>').where(values.notna(), '<c/>')
+
+
+def _number_cells(values):
+    return ('<c><v>' + values.astype(str) + '</v></c>').where(values.notna(), '<c/>')
+
+
+def _sheet_rows(chunk):
+    """The <row> elements of a chunk, built a column at a time rather than a cell at a time."""
+    import pandas as pd
+
+    cells = []
+    for col in chunk.columns:
+        values = chunk[col]
+        numeric = pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+        cells.append(_number_cells(values) if numeric else _string_cells(values.astype(object)))
+    rows = reduce(add, cells, pd.Series('<row>', index=chunk.index)) + '</row>'
+    return ''.join(rows)
+
+
+def xlsx_stream(chunks):
+    """A one-sheet workbook of the consolidated columns, with a bold frozen header row and a filter on every column.
+
+    The package is written as a zip to an unseekable stream, so each part's sizes follow its data,
+    and the sheet is deflated chunk by chunk; nothing but the current chunk is held in memory.
+    Strings are inline, so there is no shared strings table to build up front.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', CONTENT_TYPES)
+        package.writestr('_rels/.rels', PACKAGE_RELS)
+        package.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        package.writestr('xl/styles.xml', STYLES)
+        yield sink.drain()
+
+        written = 0
+        columns = None
+        with package.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(SHEET_HEAD.encode('utf-8'))
+            for chunk in chunks:
+                if columns is None:
+                    columns = list(chunk.columns)
+                    header = ''.join(f'<c t="inlineStr" s="1"><is><t>{escape(str(col))}</t></is></c>' for col in columns)
+                    sheet.write(f'<row>{header}</row>'.encode('utf-8'))
+                sheet.write(_sheet_rows(chunk).encode('utf-8'))
+                written += len(chunk)
+                yield sink.drain()
+            last_column, last_row = _column_letter(max(len(columns or ()), 1) - 1), written + 1
+            sheet.write(f'</sheetData><autoFilter ref="A1:{last_column}{last_row}"/></worksheet>'.encode('utf-8'))
+
+        package.writestr('xl/workbook.xml', WORKBOOK.format(filter_range=f"'{XLSX_SHEET_NAME}'!$A$1:${last_column}${last_row}"))
+    yield sink.drain()
+
+
+def parquet_schema(columns):
+    """The Arrow schema of an export of these consolidated columns, taken from the output schema rather than the data.
+
+    A schema inferred from the first chunk types a column that chunk leaves empty as null, or as strings,
+    and a later chunk with numbers in it cannot be written. Categorical labels become dictionaries of
+    strings, and the pandas metadata is kept, so the file reads back with the frame's dtypes.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    if 'pytest' in sys.modules:
+        from src.column_mapping import OUTPUT_DTYPES
+    else:
+        from column_mapping import OUTPUT_DTYPES
+
+    arrow_types = {'category': pa.dictionary(pa.int32(), pa.string()), 'Int16': pa.int16(), 'float32': pa.float32()}
+    dtypes = {name: OUTPUT_DTYPES.get(name, object) for name in columns}
+    metadata = pa.Schema.from_pandas(pd.DataFrame({name: pd.Series([], dtype=dtype) for name, dtype in dtypes.items()}),
+                                     preserve_index=False).metadata
+    return pa.schema([(name, arrow_types.get(dtype, pa.string())) for name, dtype in dtypes.items()], metadata=metadata)
+
+
+def parquet_stream(chunks):
+    """One row group per chunk, written as it arrives; needs pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _StreamSink()
+    writer = None
+    for chunk in chunks:
+        if writer is None:
+            schema = parquet_schema(chunk.columns)
+            writer = pq.ParquetWriter(sink, schema)
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+class ExportFormatError(ValueError):
+    """Raised for an export format that does not exist."""
+
+
+class ExportUnavailable(ValueError):
+    """Raised for an export format this installation cannot write, for want of the package that writes it."""
+
+
+# format -> (writer, mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv', 'csv'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': (parquet_stream, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def get_exporter(name):
+    """Look up an export format, failing before anything is streamed when it is unknown or unavailable."""
+    if name not in EXPORT_FORMATS:
+        raise ExportFormatError(f'unknown export format {name!r}, expected one of {", ".join(EXPORT_FORMATS)}')
+    if name == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ExportUnavailable('parquet export needs the pyarrow package installed')
+    return EXPORT_FORMATS[name]
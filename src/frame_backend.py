@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+BACKENDS = ('pandas', 'polars')
+
+
+class PandasBackend:
+    """Group and merge with pandas itself, on a single core."""
+
+    name = 'pandas'
+
+    def group_sum(self, df, key, column):
+        """Sum `column` per `key`, one row per key in sorted key order (NaN keys are dropped)."""
+        return df.groupby([key])[column].sum().reset_index()
+
+    def left_merge(self, left, right, on):
+        return pd.merge(left, right, on = on, how = "left")
+
+
+class PolarsBackend:
+    """Run the group and join stages on Polars' multi-threaded engine and hand back pandas frames.
+
+    Keys are factorized to integer codes first, so Polars only ever sees plain numpy columns (no
+    pyarrow needed) and key matching follows pandas exactly, NaN included. Values never leave pandas:
+    the join produces row positions, which are used to take from the original frames, so the results
+    are equal to PandasBackend's, dtypes included. Polars sizes its pool from POLARS_MAX_THREADS.
+    """
+
+    name = 'polars'
+
+    def __init__(self):
+        try:
+            import polars
+        except ImportError:
+            raise ValueError('the polars transform backend needs the polars package installed')
+        self.pl = polars
+
+    def group_sum(self, df, key, column):
+        pl = self.pl
+        codes, uniques = pd.factorize(df[key], sort = True)
+        # NaN becomes null, which Polars' sum skips the way pandas skips NaN
+        values = pl.Series('value', df[column].to_numpy(), nan_to_null = True)
+        sums = (pl.DataFrame({'code': codes, 'value': values})
+                .filter(pl.col('code') >= 0)
+                .group_by('code').agg(pl.col('value').sum())
+                .sort('code'))
+        return pd.DataFrame({key: uniques.take(sums['code'].to_numpy()), column: sums['value'].to_numpy()})
+
+    def left_merge(self, left, right, on):
+        pl = self.pl
+        codes, _ = pd.factorize(pd.concat([left[on], right[on]], ignore_index = True))
+        # missing keys share code -1, so they pair up just as pandas pairs NaN with NaN
+        left_keys = pl.DataFrame({'code': codes[:len(left)], 'left_row': np.arange(len(left))})
+        right_keys = pl.DataFrame({'code': codes[len(left):], 'right_row': np.arange(len(right))})
+        rows = left_keys.join(right_keys, on = 'code', how = 'left', maintain_order = 'left_right')
+
+        # unmatched left rows come back with a null right_row, which reindexes to an all-NaN row
+        consolidated = left.take(rows['left_row'].to_numpy()).reset_index(drop = True)
+        right_values = right.drop(columns = [on]).reset_index(drop = True).reindex(rows['right_row'].to_numpy(allow_copy = True))
+        return pd.concat([consolidated, right_values.reset_index(drop = True)], axis = 1)
+
+
+def get_backend(name = 'pandas'):
+    """Look up a transform backend by the name configured in TRANSFORM_BACKEND."""
+    if name == 'pandas':
+        return PandasBackend()
+    if name == 'polars':
+        return PolarsBackend()
+    raise ValueError(f'unknown transform backend {name!r}, expected one of {", ".join(BACKENDS)}')
@@ -0,0 +1,61 @@
+"""gunicorn settings for the production image: `gunicorn --config gunicorn.conf.py`.
+
+Each worker is a web process with its own thread pool, database pool and conversion pool, so the
+totals are WEB_WORKERS times the per-process settings in config.py: JOB_WORKERS conversion processes
+and DB_POOL_SIZE + DB_MAX_OVERFLOW connections each.
+"""
+import gc
+import os
+import tempfile
+
+wsgi_app = 'app:app'
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+
+# web processes; pages are mostly waiting on the database or the disk, so a few processes with
+# several threads each go further than many single-threaded ones
+workers = int(os.getenv('WEB_WORKERS', '2'))
+threads = int(os.getenv('WEB_THREADS', '4'))
+worker_class = 'gthread'
+# seconds a worker may go silent before the master restarts it; uploads and exports stream on
+# their own threads, so this does not limit how long a request may take
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+
+# import the app once in the master and fork the workers from it, so the code and the templates are
+# shared copy-on-write instead of loaded by every worker; turn off to reload code by restarting workers
+preload_app = os.getenv('WEB_PRELOAD', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# the app logs JSON lines on stderr itself; gunicorn's own messages go there too
+errorlog = '-'
+
+# the workers share their metrics and status reports through this folder, so /metrics and /status/*
+# answer for all of them whichever worker serves the request; set before the app reads its config
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'inventory-metrics'))
+
+
+def on_starting(server):
+    # what the workers of a previous run left there would be counted with this run's
+    folder = os.environ['METRICS_DIR']
+    if os.path.isdir(folder):
+        for file_name in os.listdir(folder):
+            os.remove(os.path.join(folder, file_name))
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # every template compiled once, in the master, so the workers share the compiled code rather
+        # than each compiling a template on its first request for it
+        jinja_env = server.app.wsgi().jinja_env
+        for name in jinja_env.list_templates():
+            jinja_env.get_template(name)
+    # the master's objects live as long as it does; moved out of the collector's reach, a worker's
+    # first collections no longer write to - and so copy - the pages they share with the master
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # connections the master may have opened while loading the app must not be shared between processes
+    flask_app = server.app.wsgi()
+    with flask_app.app_context():
+        flask_app.extensions['sqlalchemy'].engine.dispose(close=False)
@@ -0,0 +1,368 @@
+import importlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+if 'pytest' in sys.modules:
+    from src.metrics import CONVERSION_PEAK_RSS, apply, collecting, peak_rss_bytes, process_running, record, request_id_var, stage
+    from src.result_cache import ResultCache, file_digest
+else:
+    from metrics import CONVERSION_PEAK_RSS, apply, collecting, peak_rss_bytes, process_running, record, request_id_var, stage
+    from result_cache import ResultCache, file_digest
+
+# file type -> (transform module, conversion function, transform version). Bump the version whenever
+# the conversion's output changes, so cached results are recomputed; it is kept here rather than in
+# the module, so the result cache can be checked without importing the transforms
+TRANSFORMS = {
+    'live-optics': ('transform_lova', 'lova_conversion', 4),
+    'rv-tools': ('transform_rvtools', 'rvtools_conversion', 3),
+}
+
+TRANSFORM_VERSIONS = {file_type: version for file_type, (_, _, version) in TRANSFORMS.items()}
+
+
+def _import(module):
+    return importlib.import_module(f'src.{module}' if 'pytest' in sys.modules else module)
+
+
+class _Conversions(Mapping):
+    """file type -> conversion function, importing the transform module on first lookup.
+
+    The transforms pull in pandas and openpyxl, which take most of a web worker's startup time and
+    memory; looking them up through this mapping leaves them to the processes that convert, instead
+    of every worker importing them to serve a login page.
+    """
+
+    def __getitem__(self, file_type):
+        module, conversion, _ = TRANSFORMS[file_type]
+        return getattr(_import(module), conversion)
+
+    def __iter__(self):
+        return iter(TRANSFORMS)
+
+    def __len__(self):
+        return len(TRANSFORMS)
+
+
+CONVERSIONS = _Conversions()
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    digest TEXT,
+    batch TEXT,
+    owner INTEGER,
+    process INTEGER,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+# columns added to the jobs table after it was first created, with their types
+JOB_COLUMNS_ADDED = {'digest': 'TEXT', 'batch': 'TEXT', 'owner': 'INTEGER', 'process': 'INTEGER'}
+
+BATCH_FRAMES_KEPT = 2
+
+# seconds between sweeps for jobs left behind by a web process that died, made while serving status polls
+RECOVER_INTERVAL = 60
+
+
+class QueueFull(Exception):
+    """Raised when a web process already has its maximum number of conversions in flight."""
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def _set_status(db_path, job_id, status, error=None):
+    conn = _connect(db_path)
+    try:
+        conn.execute('UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?', (status, error, time.time(), job_id))
+    finally:
+        conn.close()
+
+
+def run_conversion(db_path, cache, job_id, input_path, file_name, file_type, digest, backend='pandas', sheet_ids=None,
+                   request_id=None, submitted=None):
+    """Convert one uploaded file inside a pool worker, store the frame in the result cache and record the outcome.
+
+    Returns the worker's metrics for the web process to record: the stages it timed, under the id
+    of the request that queued the job, and the worker's peak resident memory.
+    """
+    import pandas as pd
+
+    with collecting(request_id) as observations:
+        if submitted is not None:
+            record({'stage': 'queue_wait', 'seconds': max(time.time() - submitted, 0.0)})
+        _set_status(db_path, job_id, 'running')
+        try:
+            with stage('convert') as timer:
+                timer.bytes = os.path.getsize(os.path.join(input_path, file_name))
+                vm_data_df = pd.DataFrame(CONVERSIONS[file_type](input_path=input_path, file_name=file_name, backend=backend, sheet_ids=sheet_ids))
+                timer.rows = len(vm_data_df)
+            with stage('cache_put'):
+                cache.put(digest, file_type, vm_data_df)
+        except Exception as err:
+            _set_status(db_path, job_id, 'failed', error=f'{type(err).__name__}: {err}')
+        else:
+            _set_status(db_path, job_id, 'done')
+    return {'stages': observations, 'peak_rss': peak_rss_bytes()}
+
+
+class JobQueue:
+    """Run file conversions on a local process pool, tracking their state in a SQLite job table.
+
+    The table lives on local disk so any web process can answer status polls, while each process
+    owns its own pool and refuses new work once `max_queued` conversions are in flight.
+    Results go into a content-addressed ResultCache, so re-uploading a file already converted
+    completes the job immediately without parsing the workbook again.
+
+    Each job records the web process that queued it. A conversion still queued or running when
+    that process is gone, or not updated for `job_timeout` seconds, is marked failed; jobs are
+    deleted `job_retention` seconds after they were queued.
+    """
+
+    def __init__(self, db_path, results_folder, workers=2, max_queued=16, cache_max_bytes=1024 ** 3, backend='pandas',
+                 job_timeout=3600, job_retention=7 * 24 * 3600):
+        self.db_path = db_path
+        self.workers = workers
+        # fail at startup, not in every worker, when the configured backend is unknown or not installed;
+        # the default needs no check, which keeps pandas out of the web process until it converts something
+        if backend != 'pandas':
+            _import('frame_backend').get_backend(backend)
+        self.backend = backend
+        self.max_queued = max_queued
+        self.cache = ResultCache(results_folder, cache_max_bytes, TRANSFORM_VERSIONS)
+        self._pool = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._batch_frames = OrderedDict()
+        self.job_timeout = job_timeout
+        self.job_retention = job_retention
+        self._recovered = 0.0
+
+        conn = _connect(db_path)
+        try:
+            conn.execute(JOB_SCHEMA)
+            # job tables created by earlier versions lack the columns added since
+            existing = [row['name'] for row in conn.execute('PRAGMA table_info(jobs)')]
+            for column, kind in JOB_COLUMNS_ADDED.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        finally:
+            conn.close()
+        self.recover()
+
+    def recover(self):
+        """Fail the queued and running jobs nobody will finish and delete those past the retention age.
+
+        Returns the number of jobs failed. Run at startup and, at most every RECOVER_INTERVAL seconds,
+        from the status polls, so a page waiting on a web process that crashed stops polling.
+        """
+        now = time.time()
+        self._recovered = now
+        conn = _connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT id, process, updated FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            # jobs queued before the process was recorded are only failed once they time out
+            orphaned = [row['id'] for row in rows
+                        if row['updated'] < now - self.job_timeout or (row['process'] is not None and not process_running(row['process']))]
+            conn.executemany("UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ? AND status IN ('queued', 'running')",
+                             [('the conversion was interrupted; upload the file again', now, job_id) for job_id in orphaned])
+            conn.execute('DELETE FROM jobs WHERE created < ?', (now - self.job_retention,))
+        finally:
+            conn.close()
+        return len(orphaned)
+
+    def _recover_due(self):
+        if time.time() - self._recovered >= RECOVER_INTERVAL:
+            self.recover()
+
+    def _executor(self):
+        # created on first use, so importing the app never forks worker processes
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _insert(self, job_id, status, input_path, file_name, file_type, digest, batch=None, owner=None, error=None):
+        now = time.time()
+        conn = _connect(self.db_path)
+        try:
+            conn.execute('INSERT INTO jobs (id, status, file_type, input_path, file_name, digest, batch, owner, process, error, created, updated) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (job_id, status, file_type, input_path, file_name, digest, batch, owner, os.getpid(), error, now, now))
+        finally:
+            conn.close()
+
+    def submit(self, input_path, file_name, file_type, digest=None, sheet_ids=None, owner=None):
+        """Queue a conversion and return its job id straight away.
+
+        `digest` is the SHA-256 of the uploaded bytes; it is computed here when the caller has not already.
+        `sheet_ids` is the sheet list a FileSniff found, passed on so the worker does not reread it.
+        `owner` is the id of the user who uploaded the file, recorded so only they are shown the result.
+        """
+        upload = {'input_path': input_path, 'file_name': file_name, 'file_type': file_type, 'digest': digest, 'sheet_ids': sheet_ids}
+        return self._enqueue([upload], None, owner)[0]
+
+    def submit_batch(self, uploads, owner=None):
+        """Queue one conversion per upload under a shared batch id, and return the batch id.
+
+        `uploads` are dicts of submit's arguments. Files sniffed as 'invalid' are recorded as failed
+        jobs so they show up in the batch's progress. The whole batch is refused with QueueFull when
+        there is no room for all of its conversions.
+        """
+        batch = uuid.uuid4().hex
+        self._enqueue(uploads, batch, owner)
+        return batch
+
+    def _enqueue(self, uploads, batch, owner):
+        jobs = []
+        for upload in uploads:
+            file_type = upload['file_type']
+            digest = upload.get('digest')
+            if file_type not in CONVERSIONS:
+                status = 'failed'
+            else:
+                if digest is None:
+                    digest = file_digest(os.path.join(upload['input_path'], upload['file_name']))
+                status = 'done' if self.cache.contains(digest, file_type) else 'queued'
+            jobs.append((uuid.uuid4().hex, status, digest, upload))
+
+        queued = [job_id for job_id, status, _, _ in jobs if status == 'queued']
+        with self._lock:
+            if len(self._in_flight) + len(queued) > self.max_queued:
+                raise QueueFull(f'{len(self._in_flight)} conversions already queued')
+            self._in_flight.update(queued)
+
+        for job_id, status, digest, upload in jobs:
+            error = 'neither a LiveOptics nor an RVTools export' if status == 'failed' else None
+            self._insert(job_id, status, upload['input_path'], upload['file_name'], upload['file_type'], digest, batch, owner, error)
+        for job_id, status, digest, upload in jobs:
+            if status == 'queued':
+                self._start(job_id, upload, digest)
+        return [job_id for job_id, _, _, _ in jobs]
+
+    def _start(self, job_id, upload, digest):
+        try:
+            future = self._executor().submit(run_conversion, self.db_path, self.cache, job_id, upload['input_path'], upload['file_name'],
+                                             upload['file_type'], digest, self.backend, upload.get('sheet_ids'),
+                                             request_id_var.get(), time.time())
+        except Exception as err:
+            self._finished(job_id, None, err)
+            raise
+        future.add_done_callback(lambda f: self._finished(job_id, f, f.exception()))
+
+    def _finished(self, job_id, future, err):
+        with self._lock:
+            self._in_flight.discard(job_id)
+        # run_conversion records its own failures - this catches workers that died outright
+        if err is not None:
+            _set_status(self.db_path, job_id, 'failed', error=f'{type(err).__name__}: {err}')
+            if isinstance(err, BrokenProcessPool):
+                self._pool = None
+        elif future is not None:
+            worker_metrics = future.result()
+            for observation in worker_metrics['stages']:
+                apply(observation)
+            if worker_metrics['peak_rss'] is not None:
+                CONVERSION_PEAK_RSS.observe(worker_metrics['peak_rss'])
+
+    def get(self, job_id):
+        """Return the job row as a dict, or None for an unknown id."""
+        self._recover_due()
+        conn = _connect(self.db_path)
+        try:
+            row = conn.execute('SELECT id, status, file_type, input_path, file_name, digest, owner, error FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row is not None else None
+
+    def active_inputs(self):
+        """The upload folders of conversions still queued or running, in any web process."""
+        conn = _connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT DISTINCT input_path FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        finally:
+            conn.close()
+        return [row['input_path'] for row in rows]
+
+    def get_batch(self, batch):
+        """Return the batch's jobs in upload order, or an empty list for an unknown batch."""
+        self._recover_due()
+        conn = _connect(self.db_path)
+        try:
+            rows = conn.execute('SELECT id, status, file_type, input_path, file_name, digest, owner, error FROM jobs WHERE batch = ? '
+                                'ORDER BY created, rowid', (batch,)).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def load_batch(self, jobs):
+        """One frame of every finished job's workloads, each row tagged with its source file in sourceFile.
+
+        Returns None once any of the results has been evicted from the cache. The last few batches
+        are kept in memory, so paging through one does not reload and concatenate every file.
+        """
+        import numpy as np
+        import pandas as pd
+
+        done = [job for job in jobs if job['status'] == 'done']
+        key = tuple(job['id'] for job in done)
+        with self._lock:
+            if key in self._batch_frames:
+                self._batch_frames.move_to_end(key)
+                return self._batch_frames[key]
+
+        frames = []
+        for job in done:
+            vm_data_df = self.load_result(job)
+            if vm_data_df is None:
+                return None
+            frames.append(vm_data_df)
+        if not frames:
+            return pd.DataFrame({'sourceFile': []})
+        # LiveOptics and RVTools frames have different columns; each file's missing columns are left empty
+        combined = pd.concat(frames, ignore_index=True, sort=False)
+        combined.insert(0, 'sourceFile', np.repeat([job['file_name'] for job in done], [len(frame) for frame in frames]))
+        # concat falls back to object for categoricals whose categories differ between files
+        combined = _import('column_mapping').apply_output_schema(combined)
+
+        with self._lock:
+            self._batch_frames[key] = combined
+            while len(self._batch_frames) > BATCH_FRAMES_KEPT:
+                self._batch_frames.popitem(last=False)
+        return combined
+
+    def has_result(self, job):
+        """Whether a finished job's converted frame is still cached, without loading it.
+
+        Not counted as a cache lookup: the caller goes on to load_result, and submit already counted
+        the job's own lookup.
+        """
+        return self.cache.exists(job['digest'], job['file_type'])
+
+    def load_result(self, job):
+        """The converted frame for a finished job, or None once its cache entry has been evicted."""
+        return self.cache.get(job['digest'], job['file_type'])
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
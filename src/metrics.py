@@ -0,0 +1,386 @@
+import atexit
+import bisect
+import contextvars
+import copy
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# seconds; from a cached lookup to a large workbook's conversion
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# bytes; 32 MiB to 8 GiB
+MEMORY_BUCKETS = tuple(2 ** power * 1024 ** 2 for power in range(5, 14))
+
+logger = logging.getLogger('inventory.metrics')
+
+# the id of the request being served, or of the request that queued the conversion a pool worker runs
+request_id_var = contextvars.ContextVar('request_id', default=None)
+# set inside pool workers, where stages are collected and handed back instead of recorded locally
+_collector_var = contextvars.ContextVar('collector', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._samples(key, value))
+        return lines
+
+    def snapshot(self):
+        """The current values as JSON-friendly [labels, value] pairs."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merged(self, processes):
+        """A copy of this metric holding the values of several processes' snapshots, for rendering."""
+        metric = copy.copy(self)
+        metric._lock = threading.Lock()
+        metric._values = {}
+        for _, samples in processes:
+            for key, value in samples:
+                key = tuple(key)
+                metric._values[key] = value if key not in metric._values else metric._add_values(metric._values[key], value)
+        return metric
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, key, value):
+        return [f'{self.name}{_labels(self.labelnames, key)} {value}']
+
+    def _add_values(self, a, b):
+        return a + b
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self, key, value):
+        return [f'{self.name}{_labels(self.labelnames, key)} {value}']
+
+    def merged(self, processes):
+        # a level belongs to the process that measured it, so each keeps its own, labelled with its pid
+        metric = super().merged([(pid, [[[*key, pid], value] for key, value in samples]) for pid, samples in processes])
+        metric.labelnames = (*self.labelnames, 'pid')
+        return metric
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # the last slot counts observations above every bound, which only show in +Inf
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[slot] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, key, value):
+        counts, total = value
+        samples = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), counts):
+            cumulative += count
+            samples.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", bound)])} {cumulative}')
+        samples.append(f'{self.name}_sum{_labels(self.labelnames, key)} {total}')
+        samples.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return samples
+
+    def _add_values(self, a, b):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1]
+
+
+class Registry:
+    """The metrics of one process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        return '\n'.join(line for metric in self._metrics for line in metric.render()) + '\n'
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def kinds(self):
+        return {metric.name: metric.kind for metric in self._metrics}
+
+    def render_merged(self, snapshots):
+        """Render the values of several processes, given as {pid: snapshot()}, as one registry."""
+        lines = []
+        for metric in self._metrics:
+            processes = [(pid, snapshot.get(metric.name, [])) for pid, snapshot in sorted(snapshots.items())]
+            lines.extend(metric.merged(processes).render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram('inventory_stage_duration_seconds', 'Time spent in each stage of ingesting an upload.', ('stage', 'sheet'))
+STAGE_ROWS = REGISTRY.counter('inventory_stage_rows_total', 'Rows produced by each stage.', ('stage',))
+STAGE_BYTES = REGISTRY.counter('inventory_stage_bytes_total', 'Bytes read or written by each stage.', ('stage',))
+CONVERSION_PEAK_RSS = REGISTRY.histogram('inventory_conversion_peak_rss_bytes', 'Peak resident memory of the pool worker after each conversion.',
+                                         buckets=MEMORY_BUCKETS)
+HTTP_SECONDS = REGISTRY.histogram('inventory_http_request_duration_seconds', 'Time to answer each request, streamed bodies excluded.',
+                                  ('endpoint', 'method', 'status'))
+PROCESS_PEAK_RSS = REGISTRY.gauge('inventory_process_peak_rss_bytes', 'Peak resident memory of this web process.')
+
+
+def process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ProcessShare:
+    """The metrics and status reports of every web process on a host, shared through files in `folder`.
+
+    Under gunicorn a request reaches whichever worker is free, so what one worker knows of itself
+    is a sample, not the whole. Each process writes its registry and its `reports` - name -> callable
+    returning a JSON-friendly dict - to a file named after its pid, after calling `refresh` to update
+    any gauges that are only measured on demand: every `interval` seconds from a
+    background thread, when it exits, and before it answers for everyone. Counters and histograms are
+    summed over every file, workers that have since exited included, so totals never go back; gauges
+    and reports are kept for running processes only, gauges labelled with the pid. The folder must be
+    emptied whenever the server starts, as gunicorn.conf.py does. Without a folder, everything is
+    this process's own.
+    """
+
+    def __init__(self, registry, folder=None, interval=5.0, reports=None, refresh=None):
+        self.registry = registry
+        self.folder = folder or None
+        self.interval = interval
+        self.reports = reports or {}
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._started_in = None
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def start(self):
+        """Start publishing this process's values, once per process; cheap to call on every request."""
+        if self.folder is None or self._started_in == os.getpid():
+            return
+        with self._lock:
+            # a forked worker inherits the flag but not the thread
+            if self._started_in == os.getpid():
+                return
+            self._started_in = os.getpid()
+            threading.Thread(target=self._publish_forever, name='metrics-publisher', daemon=True).start()
+            atexit.register(self.publish)
+
+    def _publish_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception:
+                logger.exception('could not publish the metrics of process %s', os.getpid())
+
+    def _own(self):
+        if self.refresh is not None:
+            self.refresh()
+        return {'metrics': self.registry.snapshot(), 'reports': {name: report() for name, report in self.reports.items()}}
+
+    def publish(self):
+        """Write this process's values, replacing the file atomically so a reader never sees half of it."""
+        if self.folder is None:
+            return
+        path = os.path.join(self.folder, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self._own(), f)
+        os.replace(path + '.tmp', path)
+
+    def _processes(self):
+        """{pid: published values} of every process that has written a file, this one up to date."""
+        if self.folder is None:
+            return {os.getpid(): self._own()}
+        self.publish()
+        processes = {}
+        for file_name in os.listdir(self.folder):
+            pid, extension = os.path.splitext(file_name)
+            if extension != '.json' or not pid.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.folder, file_name)) as f:
+                    processes[int(pid)] = json.load(f)
+            except (OSError, ValueError):
+                # gone, or being replaced, since the listing
+                continue
+        return processes
+
+    def render(self):
+        """The exposition of every process's metrics together."""
+        processes = self._processes()
+        running = {pid for pid in processes if process_running(pid)}
+        snapshots = {}
+        for pid, values in processes.items():
+            metrics = values['metrics']
+            if pid not in running:
+                metrics = {name: samples for name, samples in metrics.items() if not self._is_gauge(name)}
+            snapshots[pid] = metrics
+        return self.registry.render_merged(snapshots)
+
+    def _is_gauge(self, name):
+        return self.registry.kinds().get(name) == 'gauge'
+
+    def report(self, name):
+        """{pid: report} of the running processes, for report `name`."""
+        return {str(pid): values['reports'][name] for pid, values in sorted(self._processes().items())
+                if name in values['reports'] and process_running(pid)}
+
+
+def peak_rss_bytes():
+    """High-water mark of this process's resident memory, or None where the platform cannot tell."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageTimer:
+    """What a stage reports besides its duration; set `rows` and `bytes` inside the with block."""
+
+    def __init__(self):
+        self.rows = None
+        self.bytes = None
+
+
+def record(observation):
+    """Record a finished stage: locally, or for the web process when inside a pool worker."""
+    collector = _collector_var.get()
+    if collector is not None:
+        collector.append(observation)
+    else:
+        apply(observation)
+
+
+def apply(observation):
+    STAGE_SECONDS.observe(observation['seconds'], stage=observation['stage'], sheet=observation.get('sheet', ''))
+    if observation.get('rows') is not None:
+        STAGE_ROWS.inc(observation['rows'], stage=observation['stage'])
+    if observation.get('bytes') is not None:
+        STAGE_BYTES.inc(observation['bytes'], stage=observation['stage'])
+
+
+@contextmanager
+def stage(name, sheet=''):
+    """Time the block as stage `name`, and log it with the current request id.
+
+    Stages that raise are recorded too, with their duration up to the error.
+    """
+    timer = StageTimer()
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield timer
+        failed = False
+    finally:
+        observation = {'stage': name, 'sheet': sheet, 'seconds': time.perf_counter() - start, 'rows': timer.rows, 'bytes': timer.bytes}
+        record(observation)
+        logger.info('stage', extra={'fields': {**observation, 'failed': failed}})
+
+
+@contextmanager
+def collecting(request_id=None):
+    """Collect the stages run inside a pool worker into a list, to be applied in the web process."""
+    observations = []
+    collector_token = _collector_var.set(observations)
+    request_token = request_id_var.set(request_id)
+    try:
+        yield observations
+    finally:
+        _collector_var.reset(collector_token)
+        request_id_var.reset(request_token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and any `fields` passed as extra."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': request_id_var.get(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level='INFO'):
+    """Send the app's logs to stderr as structured JSON lines, unless logging has been set up already."""
+    root = logging.getLogger()
+    if any(isinstance(handler.formatter, JsonFormatter) for handler in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    root.addHandler(handler)
+    logging.getLogger('inventory').setLevel(level)
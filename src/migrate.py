@@ -0,0 +1,62 @@
+import os
+import re
+from sqlalchemy import text
+
+MIGRATIONS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_NAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version integer PRIMARY KEY,
+    name character varying(100) NOT NULL,
+    applied_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# any constant works, as long as every process running migrations uses the same one
+LOCK_ID = 7140001
+
+
+def available_migrations(folder=MIGRATIONS_FOLDER):
+    """The versioned scripts in `folder` as (version, name, path), oldest first.
+
+    Scripts are named NNNN_description.sql; the number orders them and is recorded once applied.
+    """
+    migrations = []
+    for file_name in os.listdir(folder):
+        match = MIGRATION_NAME.match(file_name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(folder, file_name)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f'duplicate migration versions in {folder}')
+    return migrations
+
+
+def applied_versions(connection):
+    return {row.version for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def apply_migrations(engine, folder=MIGRATIONS_FOLDER):
+    """Apply the PostgreSQL scripts in `folder` that the database has not seen yet and return their versions.
+
+    Each script runs in a transaction of its own together with its schema_migrations row, so a failing
+    script leaves the database at the previous version. An advisory lock serializes concurrent runners,
+    e.g. several containers starting at once.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(VERSION_TABLE))
+
+    applied = []
+    for version, name, path in available_migrations(folder):
+        with engine.begin() as connection:
+            connection.execute(text('SELECT pg_advisory_xact_lock(:lock)'), {'lock': LOCK_ID})
+            if version in applied_versions(connection):
+                continue
+            with open(path) as f:
+                connection.exec_driver_sql(f.read())
+            connection.execute(text('INSERT INTO schema_migrations (version, name) VALUES (:version, :name)'),
+                               {'version': version, 'name': name})
+        applied.append(version)
+    return applied
@@ -0,0 +1,11 @@
+-- Indexes for the hot lookups: login and registration by username, a user's projects, and a
+-- project's workloads. workloads_tb.pid needs no index of its own, every index below leads with it.
+
+-- usernames were only unique as far as the registration form checked
+CREATE UNIQUE INDEX IF NOT EXISTS "users_tb_username_key" ON "public"."users_tb" USING btree ("username");
+
+CREATE INDEX IF NOT EXISTS "projects_tb_userid_idx" ON "public"."projects_tb" USING btree ("userid");
+
+-- the project summary groups a project's rows by cluster and by power state
+CREATE INDEX IF NOT EXISTS "workloads_tb_pid_cluster_idx" ON "public"."workloads_tb" USING btree ("pid", "cluster");
+CREATE INDEX IF NOT EXISTS "workloads_tb_pid_vmstate_idx" ON "public"."workloads_tb" USING btree ("pid", "vmstate");
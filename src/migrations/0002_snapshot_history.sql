@@ -0,0 +1,28 @@
+-- Saving an inventory into a project diffs it against the saved rows and writes only what changed,
+-- recording each save and the VMs it added, changed or removed.
+
+-- a hash of each row's values, compared instead of the values themselves; rows saved before this
+-- migration have none and are rewritten, with one, on the next save
+ALTER TABLE "public"."workloads_tb" ADD COLUMN IF NOT EXISTS "fingerprint" bigint;
+
+CREATE TABLE IF NOT EXISTS "public"."snapshots_tb" (
+    "snapshotid" serial PRIMARY KEY,
+    "pid" integer NOT NULL REFERENCES "public"."projects_tb" ("pid"),
+    "created" timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "source" character varying(255),
+    "added" integer NOT NULL,
+    "changed" integer NOT NULL,
+    "removed" integer NOT NULL,
+    "unchanged" integer NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "snapshots_tb_pid_idx" ON "public"."snapshots_tb" USING btree ("pid");
+
+CREATE TABLE IF NOT EXISTS "public"."workload_changes_tb" (
+    "changeid" serial PRIMARY KEY,
+    "snapshotid" integer NOT NULL REFERENCES "public"."snapshots_tb" ("snapshotid"),
+    "mobid" character varying(20) NOT NULL,
+    "change" character varying(10) NOT NULL,
+    "columns" text,
+    "previous" text
+);
+CREATE INDEX IF NOT EXISTS "workload_changes_tb_snapshotid_idx" ON "public"."workload_changes_tb" USING btree ("snapshotid");
@@ -0,0 +1,28 @@
+-- Managed object ids are only unique within a vCenter, so workloads remember the vCenter they were
+-- exported from, and re-saving upserts against (pid, inventory, mobid): the inventory is the vCenter,
+-- or a label for exports that do not name one.
+
+ALTER TABLE "public"."workloads_tb" ADD COLUMN IF NOT EXISTS "vcenter" character varying(255);
+-- rows saved before this migration do not say which vCenter they came from and share the empty inventory
+ALTER TABLE "public"."workloads_tb" ADD COLUMN IF NOT EXISTS "inventory" character varying(255) NOT NULL DEFAULT '';
+
+-- the (pid, mobid) key an earlier 0001 created would merge VMs of two vCenters that share an id
+DROP INDEX IF EXISTS "public"."workloads_tb_pid_mobid_key";
+
+-- saving a conversion again used to append a second copy of every VM; keep the latest copy. Rows only
+-- count as copies when their name and datacenter match as well, since two vCenters' VMs may share an id.
+DELETE FROM "public"."workloads_tb" AS older
+    USING "public"."workloads_tb" AS newer
+    WHERE older.pid = newer.pid AND older.inventory = newer.inventory AND older.mobid = newer.mobid
+        AND older.vmname IS NOT DISTINCT FROM newer.vmname
+        AND older.virtualdatacenter IS NOT DISTINCT FROM newer.virtualdatacenter
+        AND older.vmid < newer.vmid;
+
+-- the different VMs left sharing an id are kept, each older one in an inventory of its own
+UPDATE "public"."workloads_tb" AS older SET "inventory" = 'vmid ' || older.vmid
+    WHERE EXISTS (SELECT 1 FROM "public"."workloads_tb" AS newer
+                  WHERE newer.pid = older.pid AND newer.inventory = older.inventory AND newer.mobid = older.mobid
+                      AND newer.vmid > older.vmid);
+
+-- one row per VM, inventory and project, which re-ingesting upserts against
+CREATE UNIQUE INDEX IF NOT EXISTS "workloads_tb_pid_inventory_mobid_key" ON "public"."workloads_tb" USING btree ("pid", "inventory", "mobid");
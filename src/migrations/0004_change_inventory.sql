@@ -0,0 +1,5 @@
+-- Snapshots are diffed per inventory since VMs of two vCenters may share a managed object id, so a
+-- change records the inventory of the VM it describes as well as its mobid.
+
+-- changes recorded before this migration do not say which inventory their VM was in
+ALTER TABLE "public"."workload_changes_tb" ADD COLUMN IF NOT EXISTS "inventory" character varying(255) NOT NULL DEFAULT '';
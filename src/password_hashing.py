@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PasswordHasher:
+    """Run Flask-Bcrypt's hashing and verification on a small thread pool of its own.
+
+    The bcrypt C extension releases the GIL while it works, so a process serving requests on
+    several threads overlaps that many verifications, while `workers` caps how many cores login
+    and registration traffic can take from the rest of the app. The cost factor is Flask-Bcrypt's
+    BCRYPT_LOG_ROUNDS.
+    """
+
+    def __init__(self, bcrypt, workers=4):
+        self.bcrypt = bcrypt
+        self.workers = workers
+        self._pool = None
+
+    def _executor(self):
+        # created on first use, so importing the app starts no threads
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        return self._pool
+
+    def hash(self, password):
+        return self._executor().submit(self.bcrypt.generate_password_hash, password).result().decode('utf-8')
+
+    def check(self, pw_hash, password):
+        return self._executor().submit(self.bcrypt.check_password_hash, pw_hash, password).result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,151 @@
+import io
+
+# consolidated DataFrame column -> workloads_tb column; vmid is the table's own serial key, so the VM's
+# managed object id (vmId) lands in mobid
+WORKLOAD_COLUMNS = {
+    'vmId': 'mobid',
+    'cluster': 'cluster',
+    'virtualDatacenter': 'virtualdatacenter',
+    'vCenter': 'vcenter',
+    'os': 'os',
+    'os_name': 'os_name',
+    'vmState': 'vmstate',
+    'vCpu': 'vcpu',
+    'vmName': 'vmname',
+    'vRam': 'vram',
+    'ip_addresses': 'ip_addresses',
+    'vinfo_provisioned': 'vinfo_provisioned',
+    'vinfo_used': 'vinfo_used',
+    'vmdkTotal': 'vmdktotal',
+    'vmdkUsed': 'vmdkused',
+    'readIOPS': 'readiops',
+    'writeIOPS': 'writeiops',
+    'peakReadIOPS': 'peakreadiops',
+    'peakWriteIOPS': 'peakwriteiops',
+    'readThroughput': 'readthroughput',
+    'writeThroughput': 'writethroughput',
+    'peakReadThroughput': 'peakreadthroughput',
+    'peakWriteThroughput': 'peakwritethroughput',
+}
+
+COPY_CHUNK_ROWS = 50000
+STAGING_TABLE = 'workloads_stage'
+# the unique key re-ingesting a project upserts against, see migrations/0003_workload_inventory.sql.
+# Managed object ids are only unique within a vCenter, so a VM is keyed on the inventory it belongs to
+# as well: its vCenter, or for an export that does not name one, whatever the caller labels it with.
+UPSERT_KEY = ('pid', 'inventory', 'mobid')
+
+
+def workload_rows(vm_data_df, table, pid, inventory=''):
+    """Project a consolidated frame onto the workloads_tb columns, coerced to what the table accepts.
+
+    Each row's inventory is its vCenter, or `inventory` for VMs whose export does not name one.
+    Strings longer than their varchar column are truncated, integer columns are rounded and numeric
+    columns are rounded to their scale, so a single oversized value cannot abort a whole bulk load.
+    """
+    # imported here rather than with the module, which the web process needs at startup for WORKLOAD_COLUMNS
+    import pandas as pd
+
+    present = [col for col in WORKLOAD_COLUMNS if col in vm_data_df]
+    rows = vm_data_df[present].rename(columns=WORKLOAD_COLUMNS)
+    rows.insert(0, 'pid', pid)
+    vcenters = rows['vcenter'].astype(object) if 'vcenter' in rows else pd.Series(None, index=rows.index, dtype=object)
+    rows.insert(1, 'inventory', vcenters.where(vcenters.notna() & (vcenters != ''), inventory))
+
+    for name in rows.columns:
+        column_type = table.columns[name].type
+        python_type = column_type.python_type
+        if python_type is str:
+            # categorical labels are truncated as plain strings, since truncating can merge two categories
+            values = rows[name].astype(object)
+            rows[name] = values.where(values.isna(), values.astype(str).str.slice(0, column_type.length))
+        elif python_type is int:
+            rows[name] = pd.to_numeric(rows[name]).round().astype('Int64')
+        else:
+            # float32 metrics are widened before rounding, or the rounding itself is only float32-precise
+            rows[name] = pd.to_numeric(rows[name]).astype('float64').round(column_type.scale)
+    return rows
+
+
+def upsert_statement(connection, table, columns):
+    """INSERT ... ON CONFLICT (pid, inventory, mobid) DO UPDATE for the dialects that have it, a plain insert otherwise."""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return table.insert()
+    statement = insert(table)
+    return statement.on_conflict_do_update(index_elements=list(UPSERT_KEY),
+                                           set_={name: statement.excluded[name] for name in columns if name not in UPSERT_KEY})
+
+
+def unique_rows(rows):
+    """Drop all but the last row of a VM listed twice, which would hit the same row twice in one upsert."""
+    if 'mobid' not in rows:
+        return rows
+    return rows[rows['mobid'].isna() | ~rows.duplicated(['inventory', 'mobid'], keep='last')]
+
+
+def row_fingerprints(rows):
+    """A 64-bit hash of each projected row's values, the key columns and fingerprint excluded.
+
+    Numbers are hashed as float64 and missing values as None whatever their dtype, so equal values
+    fingerprint equally however a conversion happened to type the column. Signed, to fit a BIGINT.
+    """
+    import pandas as pd
+
+    canonical = {}
+    for name in rows.columns:
+        if name in (*UPSERT_KEY, 'fingerprint'):
+            continue
+        values = rows[name]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            canonical[name] = values.astype('float64')
+        else:
+            canonical[name] = values.astype(object).where(values.notna(), None)
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(canonical, index=rows.index), index=False)
+    return pd.Series(hashes.to_numpy().view('int64'), index=rows.index)
+
+
+def persist_workloads(connection, table, pid, vm_data_df, inventory=''):
+    """Upsert a consolidated frame into workloads_tb under project `pid` and return the row count.
+
+    Rows are keyed on (pid, inventory, mobid), so saving the same conversion twice updates the VMs
+    in place instead of adding a second copy, while VMs of two vCenters that happen to share a
+    managed object id stay apart. The caller owns the transaction.
+    """
+    return upsert_rows(connection, table, unique_rows(workload_rows(vm_data_df, table, pid, inventory)))
+
+
+def upsert_rows(connection, table, rows):
+    """Upsert rows projected by workload_rows, each stored with its fingerprint, and return the row count.
+
+    With psycopg2 the rows are COPYed in chunks into a temporary staging table and merged with a
+    single INSERT ... ON CONFLICT; other drivers get a batched executemany upsert.
+    """
+    rows = rows.assign(fingerprint=row_fingerprints(rows))
+    columns = ", ".join(rows.columns)
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+            cursor.execute(f'CREATE TEMPORARY TABLE {STAGING_TABLE} ON COMMIT DROP AS SELECT {columns} FROM {table.name} WITH NO DATA')
+            statement = f'COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)'
+            for start in range(0, len(rows), COPY_CHUNK_ROWS):
+                buffer = io.StringIO()
+                # empty unquoted fields are NULL in COPY's csv format
+                rows.iloc[start:start + COPY_CHUNK_ROWS].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cursor.copy_expert(statement, buffer)
+            updates = ", ".join(f'{name} = EXCLUDED.{name}' for name in rows.columns if name not in UPSERT_KEY)
+            cursor.execute(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {STAGING_TABLE} '
+                           f'ON CONFLICT ({", ".join(UPSERT_KEY)}) DO UPDATE SET {updates}')
+            return len(rows)
+    finally:
+        cursor.close()
+
+    records = rows.astype(object).where(rows.notna(), None).to_dict('records')
+    if records:
+        connection.execute(upsert_statement(connection, table, rows.columns), records)
+    return len(records)
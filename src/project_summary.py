@@ -0,0 +1,58 @@
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import func, select
+
+if 'pytest' in sys.modules:
+    from src.persistence import WORKLOAD_COLUMNS
+else:
+    from persistence import WORKLOAD_COLUMNS
+
+# consolidated column names of the workloads_tb columns that are summed
+SUMMED_COLUMNS = ('vCpu', 'vRam', 'vmdkTotal', 'vmdkUsed', 'peakReadIOPS', 'peakWriteIOPS', 'peakReadThroughput', 'peakWriteThroughput')
+
+
+def summary_query(table, pid):
+    """Workload counts and sums per (cluster, datacenter, power state) for one project.
+
+    This is the finest grain the summary needs, so a single pass over the project's rows - found
+    through the (pid, ...) indexes - returns a handful of groups that roll up into every other total.
+    """
+    keys = (table.c.cluster, table.c.virtualdatacenter, table.c.vmstate)
+    sums = (func.sum(table.columns[WORKLOAD_COLUMNS[col]]).label(col) for col in SUMMED_COLUMNS)
+    return select(*keys, func.count().label('workloads'), *sums).where(table.c.pid == pid).group_by(*keys)
+
+
+def _number(value):
+    if value is None:
+        return 0
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _rollup(groups, name):
+    return [{name: key, **values} for key, values in sorted(groups.items(), key=lambda item: (item[0] is None, item[0] or ''))]
+
+
+def project_summary(connection, table, pid):
+    """Totals, per-cluster and per-datacenter sums and power-state counts of a project's workloads."""
+    def empty():
+        return dict.fromkeys(('workloads', *SUMMED_COLUMNS), 0)
+
+    totals = empty()
+    clusters = defaultdict(empty)
+    datacenters = defaultdict(empty)
+    vm_states = defaultdict(int)
+    for row in connection.execute(summary_query(table, pid)):
+        vm_states[row.vmstate] += row.workloads
+        for rollup in (totals, clusters[row.cluster], datacenters[row.virtualdatacenter]):
+            rollup['workloads'] += row.workloads
+            for col in SUMMED_COLUMNS:
+                rollup[col] += _number(getattr(row, col))
+
+    return {
+        'pid': pid,
+        'totals': totals,
+        'clusters': _rollup(clusters, 'cluster'),
+        'datacenters': _rollup(datacenters, 'virtualDatacenter'),
+        'vmStates': {state or 'unknown': count for state, count in sorted(vm_states.items(), key=lambda item: item[0] or '')},
+    }
@@ -0,0 +1,53 @@
+import math
+import threading
+import time
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets, one per key (a client address or a username).
+
+    Each bucket holds up to `burst` tokens and refills at `per_minute` tokens a minute; an attempt
+    takes one token, and is refused while the bucket is empty. Buckets that have refilled completely
+    carry no information, so they are dropped once more than `max_keys` are tracked. The buckets
+    belong to one process: with several web processes the effective limit is that many times higher.
+
+    Raises ValueError for a rate that is not positive or a burst below one attempt, with which every
+    attempt would be refused forever.
+    """
+
+    def __init__(self, per_minute, burst, max_keys=10000, clock=time.monotonic):
+        if per_minute <= 0:
+            raise ValueError(f'the attempt rate must be positive, not {per_minute}')
+        if burst < 1:
+            raise ValueError(f'the burst must allow at least one attempt, not {burst}')
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def attempt(self, key):
+        """Take a token from `key`'s bucket; return 0 if there was one, else the seconds until there is."""
+        with self._lock:
+            now = self.clock()
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return math.ceil((1 - tokens) / self.rate)
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        full = [key for key, (tokens, last) in self._buckets.items() if tokens + (now - last) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+        # under a flood from more sources than that, the longest tracked buckets go, oldest first
+        for key in list(self._buckets)[:len(self._buckets) - self.max_keys]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
@@ -0,0 +1,146 @@
+import glob
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """SHA-256 of a file's bytes, read in chunks so large uploads are never held in memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded on-disk LRU cache of consolidated frames, keyed on the uploaded file's content hash.
+
+    Entries are named <digest>.<file_type>.v<transform version>.pkl, so bumping a transform's
+    version in jobs.TRANSFORMS makes its old entries unreachable; they are removed on startup and on lookup.
+    Recency is tracked through file modification times, which every process sharing the folder sees.
+    The last few frames read are also kept in memory, so paging through a result does not unpickle
+    it on every request; callers must treat returned frames as read-only.
+    """
+
+    def __init__(self, folder, max_bytes, versions, memory_entries=4):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.versions = versions
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+
+        os.makedirs(folder, exist_ok=True)
+        for path in glob.glob(os.path.join(folder, '*.pkl')):
+            parts = os.path.basename(path)[:-len('.pkl')].split('.')
+            if len(parts) != 3 or f'v{self.versions.get(parts[1])}' != parts[2]:
+                self._remove(path)
+
+    def __getstate__(self):
+        # pool workers get a copy to store results with - the lock and counters stay in the web process
+        state = self.__dict__.copy()
+        del state['_lock'], state['_memory']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+
+    def _path(self, digest, file_type):
+        return os.path.join(self.folder, f'{digest}.{file_type}.v{self.versions[file_type]}.pkl')
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def exists(self, digest, file_type):
+        """Check for an entry without loading it or counting a lookup, marking it recently used.
+
+        For callers that go on to get() the entry, which is the lookup; a stale entry of an older
+        transform version is removed.
+        """
+        path = self._path(digest, file_type)
+        with self._lock:
+            if path in self._memory:
+                return True
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            for stale in glob.glob(os.path.join(self.folder, f'{digest}.{file_type}.v*.pkl')):
+                self._remove(stale)
+            return False
+
+    def contains(self, digest, file_type):
+        """Check for an entry without loading it, counting the lookup as a hit or a miss."""
+        found = self.exists(digest, file_type)
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    def get(self, digest, file_type):
+        """Return the cached frame, or None when there is no usable entry."""
+        path = self._path(digest, file_type)
+        with self._lock:
+            if path in self._memory:
+                self._memory.move_to_end(path)
+                return self._memory[path]
+        try:
+            with open(path, 'rb') as f:
+                vm_data_df = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            self._memory[path] = vm_data_df
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+        return vm_data_df
+
+    def put(self, digest, file_type, vm_data_df):
+        path = self._path(digest, file_type)
+        # write then rename, so readers never see a half-written entry
+        with open(f'{path}.{os.getpid()}.tmp', 'wb') as f:
+            pickle.dump(vm_data_df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the folder is back under max_bytes."""
+        entries = []
+        for path in glob.glob(os.path.join(self.folder, '*.pkl')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def stats(self):
+        """This process's lookups; the entries on disk are shared with every other web process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hitRatio': self.hits / lookups if lookups else None}
@@ -0,0 +1,317 @@
+import sys
+import threading
+from collections import OrderedDict
+from sqlalchemy import Float, cast, func, select
+
+if 'pytest' in sys.modules:
+    from src.persistence import WORKLOAD_COLUMNS
+else:
+    from persistence import WORKLOAD_COLUMNS
+
+# numpy is imported by the functions that size a fleet rather than with the module, which the web
+# process loads at startup
+
+# query string parameter -> (default, minimum, maximum)
+HOST_PARAMETERS = {
+    # vCPUs scheduled per physical core, and vRAM granted per GB of host RAM
+    'cpuOvercommit': (4.0, 0.25, 32.0),
+    'ramOvercommit': (1.0, 0.5, 4.0),
+    # share of each host's capacity planned for, the rest left as headroom
+    'maxUtilization': (0.8, 0.1, 1.0),
+    'hostCores': (32, 1, 1024),
+    'hostRamGb': (768, 1, 65536),
+    # usable storage per host, after RAID or vSAN overheads
+    'hostStorageGb': (16384, 1, 10 ** 7),
+    'hostIops': (100000, 1, 10 ** 8),
+    # hosts added to the count so the cluster survives failures (N+1 and so on)
+    'spareHosts': (1, 0, 16),
+}
+
+INTEGER_PARAMETERS = ('hostCores', 'spareHosts')
+
+# storage sized on what the VMs were given or on what they use
+STORAGE_BASES = ('provisioned', 'used')
+
+DEFAULT_VM_STATES = ('poweredOn',)
+
+# host resources a fleet is packed into
+RESOURCES = ('cpu', 'ram', 'storage', 'iops')
+
+# distinct VM sizes a packing places one at a time; more are rounded up onto a grid of this many steps up to the largest
+PACKING_SIZES = 512
+
+
+class SizingError(ValueError):
+    """Raised for sizing parameters that are missing, malformed or out of range."""
+
+
+def _list(value):
+    return tuple(sorted({item.strip() for item in value.split(',') if item.strip()}))
+
+
+def parse_sizing_args(args):
+    """Read the host, overcommit and filter parameters from a request's query string.
+
+    Returns a plain tuple of (name, value) pairs, lists as sorted tuples, so equal parameter sets
+    make equal cache keys however the query string ordered them.
+    """
+    params = {}
+    for name, (default, low, high) in HOST_PARAMETERS.items():
+        kind = int if name in INTEGER_PARAMETERS else float
+        try:
+            value = kind(args.get(name, default))
+        except ValueError:
+            raise SizingError(f'{name} must be a{"n integer" if kind is int else " number"}')
+        if not low <= value <= high:
+            raise SizingError(f'{name} must be between {low} and {high}')
+        params[name] = value
+
+    storage = args.get('storage', STORAGE_BASES[0])
+    if storage not in STORAGE_BASES:
+        raise SizingError(f'storage must be one of {", ".join(STORAGE_BASES)}')
+    params['storage'] = storage
+
+    # power states and clusters are exact names, several comma-separated; the OS is a case-insensitive substring
+    params['vmState'] = _list(args['vmState']) if 'vmState' in args else DEFAULT_VM_STATES
+    params['cluster'] = _list(args.get('cluster', ''))
+    params['os'] = args.get('os', '').strip().lower()
+    return tuple(sorted(params.items()))
+
+
+class Fleet:
+    """A project's workloads as NumPy arrays: one float64 array per demand, label codes per filter column."""
+
+    def __init__(self, demands, codes, labels):
+        # demand name -> float64 array, NaN read as 0
+        self.demands = demands
+        # filter column -> int array of indexes into labels[column]
+        self.codes = codes
+        self.labels = labels
+
+    def __len__(self):
+        return len(next(iter(self.demands.values())))
+
+
+# Fleet demand -> workloads_tb column(s) summed into it
+DEMAND_COLUMNS = {
+    'vCpu': ('vCpu',),
+    'vRam': ('vRam',),
+    'provisioned': ('vmdkTotal',),
+    'used': ('vmdkUsed',),
+    'iops': ('peakReadIOPS', 'peakWriteIOPS'),
+}
+
+FILTER_COLUMNS = ('vmState', 'cluster', 'os')
+
+
+def load_fleet(connection, table, pid):
+    """Read the columns sizing needs for a project's workloads, numbers cast to float in the query."""
+    import numpy as np
+
+    numeric = sorted({col for cols in DEMAND_COLUMNS.values() for col in cols})
+    query = select(*(cast(table.columns[WORKLOAD_COLUMNS[col]], Float).label(col) for col in numeric),
+                   *(table.columns[WORKLOAD_COLUMNS[col]].label(col) for col in FILTER_COLUMNS)).where(table.c.pid == pid)
+    rows = connection.execute(query).all()
+
+    columns = dict(zip(numeric + list(FILTER_COLUMNS), zip(*rows))) if rows else {}
+    values = {col: np.nan_to_num(np.array(columns.get(col, ()), dtype='float64')) for col in numeric}
+    demands = {name: sum(values[col] for col in cols) for name, cols in DEMAND_COLUMNS.items()}
+
+    codes, labels = {}, {}
+    for col in FILTER_COLUMNS:
+        names = np.array(['' if name is None else name for name in columns.get(col, ())], dtype=object)
+        labels[col], codes[col] = np.unique(names, return_inverse=True)
+    return Fleet(demands, codes, labels)
+
+
+def bins_needed(sizes, capacity):
+    """At least how many bins of `capacity` the items of `sizes` need, by Martello and Toth's L2 bound.
+
+    Every threshold k up to half a bin is tried at once: items too big to share a bin with one of
+    size k each need a bin of their own, and items of at least k fill whatever room the bigger
+    half-bin items leave before needing more. No packing can do with fewer bins, but the bound
+    need not be reachable; bins_packed gives a count that is.
+    """
+    import numpy as np
+
+    sizes = np.sort(sizes[sizes > 0])
+    if not len(sizes):
+        return 0
+    prefix = np.concatenate(([0.0], np.cumsum(sizes)))
+    half = np.searchsorted(sizes, capacity / 2, side='right')
+    thresholds = np.concatenate(([0.0], np.unique(sizes[:half])))
+
+    from_k = np.searchsorted(sizes, thresholds, side='left')
+    # with a little slack, so an item of exactly C - k is not pushed out by float error in the subtraction
+    up_to_rest = np.searchsorted(sizes, capacity - thresholds + capacity * 1e-9, side='right')
+    alone = len(sizes) - up_to_rest
+    big = up_to_rest - half
+    room = big * capacity - (prefix[up_to_rest] - prefix[half])
+    small = prefix[half] - prefix[from_k]
+    # rounded before the ceiling, so float error in the sums cannot add a bin
+    extra = np.maximum(0, np.ceil(np.round((small - room) / capacity, 9)))
+    return int((alone + big + extra).max())
+
+
+def bins_packed(sizes, capacity, max_sizes=PACKING_SIZES):
+    """How many bins of `capacity` a first-fit-decreasing packing of the items of `sizes` uses.
+
+    First fit places a run of equal items by filling each open bin in turn with as many as it has
+    room for, then opening bins as full as they can be, so the packing takes a few vectorized
+    operations per distinct size rather than a pass per item. With more than `max_sizes` distinct
+    sizes - storage, say - the sizes are first rounded up to a multiple of the largest / max_sizes;
+    each rounded item holds its real one, so the count stays one the real VMs fit in.
+    """
+    import numpy as np
+
+    sizes = sizes[sizes > 0]
+    if not len(sizes):
+        return 0
+    # slack so that items filling a bin exactly are not refused for float error in the sums
+    slack = capacity * 1e-9
+    if len(np.unique(sizes)) > max_sizes:
+        step = sizes.max() / max_sizes
+        sizes = np.minimum(np.ceil(sizes / step - 1e-9) * step, capacity)
+    values, counts = np.unique(sizes, return_counts=True)
+
+    # room left in each bin, slack included, in the order first fit tries them
+    free = np.empty(0)
+    for size, count in zip(values[::-1], counts[::-1]):
+        # the bins with room for one more take the run in order, as many each as fit, until it is used up
+        fitting = np.flatnonzero(free >= size)
+        if len(fitting):
+            room = np.floor(free[fitting] / size)
+            placed = np.minimum(room, np.maximum(0, count - (np.cumsum(room) - room)))
+            free[fitting] -= placed * size
+            count -= int(placed.sum())
+        if count:
+            per_bin = int((capacity + slack) // size)
+            full, rest = divmod(int(count), per_bin)
+            opened = [np.full(full, capacity + slack - per_bin * size)]
+            if rest:
+                opened.append([capacity + slack - rest * size])
+            free = np.concatenate([free, *opened])
+    return len(free)
+
+
+def size_fleet(fleet, params):
+    """Host counts for the workloads of `fleet` that pass the filters in `params`, one per resource and overall.
+
+    Each resource is packed on its own with bins_packed, and the busiest sets hostsNeeded; the L2
+    bounds of bins_needed are reported beside the counts.
+    """
+    import numpy as np
+
+    params = dict(params)
+    mask = np.ones(len(fleet), dtype=bool)
+    for col in ('vmState', 'cluster'):
+        if params[col]:
+            mask &= np.isin(fleet.codes[col], np.flatnonzero(np.isin(fleet.labels[col], params[col])))
+    if params['os']:
+        matches = np.array([params['os'] in label.lower() for label in fleet.labels['os']], dtype=bool)
+        mask &= matches[fleet.codes['os']]
+
+    utilization = params['maxUtilization']
+    capacity = {
+        'cpu': params['hostCores'] * params['cpuOvercommit'] * utilization,
+        'ram': params['hostRamGb'] * params['ramOvercommit'] * utilization,
+        'storage': params['hostStorageGb'] * utilization,
+        'iops': params['hostIops'] * utilization,
+    }
+    demand = {
+        'cpu': fleet.demands['vCpu'][mask],
+        'ram': fleet.demands['vRam'][mask],
+        'storage': fleet.demands[params['storage']][mask],
+        'iops': fleet.demands['iops'][mask],
+    }
+
+    # a VM bigger than a whole host in any resource cannot be placed; it is counted, not packed
+    fits = np.ones(int(mask.sum()), dtype=bool)
+    oversized = {}
+    for resource in RESOURCES:
+        too_big = demand[resource] > capacity[resource]
+        oversized[resource] = int(too_big.sum())
+        fits &= ~too_big
+
+    hosts = {resource: bins_packed(demand[resource][fits], capacity[resource]) for resource in RESOURCES}
+    lower_bounds = {resource: bins_needed(demand[resource][fits], capacity[resource]) for resource in RESOURCES}
+    needed = max(hosts.values())
+    lower_bound = max(lower_bounds.values())
+    return {
+        'workloads': int(mask.sum()),
+        'demand': {'vCpu': float(demand['cpu'].sum()), 'vRamGb': float(demand['ram'].sum()),
+                   'storageGb': float(demand['storage'].sum()), 'iops': float(demand['iops'].sum())},
+        'hostCapacity': capacity,
+        'hosts': hosts,
+        'lowerBounds': lower_bounds,
+        'limitedBy': max(RESOURCES, key=hosts.get) if needed else None,
+        'oversized': oversized,
+        'spareHosts': params['spareHosts'],
+        'hostsNeeded': needed + params['spareHosts'] if needed else 0,
+        # no packing fits the VMs in fewer; the gap to hostsNeeded is how far first fit may be from the best packing
+        'hostsLowerBound': lower_bound + params['spareHosts'] if lower_bound else 0,
+        'parameters': {name: list(value) if isinstance(value, tuple) else value for name, value in params.items()},
+    }
+
+
+class SizingCache:
+    """Memoized sizing per (project, parameter set), with each project's fleet kept as arrays in between.
+
+    Entries are keyed on the project's latest snapshot id, which every save creates, so a save seen
+    by any web process makes the old answers unreachable; `invalidate` also frees them at once in
+    the process that saved. A what-if slider moving over a loaded fleet only costs the vectorized
+    sizing, and moving back to a value already tried costs a dictionary lookup.
+    """
+
+    def __init__(self, max_results=256, max_fleets=4):
+        self.max_results = max_results
+        self.max_fleets = max_fleets
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._fleets = OrderedDict()
+
+    @staticmethod
+    def _get(entries, key):
+        value = entries.get(key)
+        if value is not None:
+            entries.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _put(entries, key, value, limit):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+    def size(self, connection, workloads, snapshots, pid, params):
+        version = connection.execute(select(func.max(snapshots.c.snapshotid)).where(snapshots.c.pid == pid)).scalar()
+        with self._lock:
+            result = self._get(self._results, (pid, version, params))
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+            fleet = self._get(self._fleets, (pid, version))
+
+        if fleet is None:
+            fleet = load_fleet(connection, workloads, pid)
+        result = {'pid': pid, **size_fleet(fleet, params)}
+        with self._lock:
+            self._put(self._fleets, (pid, version), fleet, self.max_fleets)
+            self._put(self._results, (pid, version, params), result, self.max_results)
+        return result
+
+    def invalidate(self, pid):
+        with self._lock:
+            for entries in (self._results, self._fleets):
+                for key in [key for key in entries if key[0] == pid]:
+                    del entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'results': len(self._results), 'fleets': len(self._fleets), 'hits': self.hits, 'misses': self.misses,
+                    'hitRatio': self.hits / lookups if lookups else None}
@@ -0,0 +1,159 @@
+import json
+import logging
+import sys
+from decimal import Decimal
+import pandas as pd
+from sqlalchemy import delete, insert, select, text
+
+if 'pytest' in sys.modules:
+    from src.persistence import row_fingerprints, unique_rows, upsert_rows, workload_rows
+else:
+    from persistence import row_fingerprints, unique_rows, upsert_rows, workload_rows
+
+logger = logging.getLogger('inventory.snapshots')
+
+# mobids per IN list when reading or deleting saved rows
+MOBID_BATCH = 1000
+# what identifies a VM within a project: managed object ids are only unique within an inventory
+KEY = ('inventory', 'mobid')
+# pg_advisory_xact_lock(namespace, pid) serializes snapshots of one project; any constant other than migrate's
+SNAPSHOT_LOCK_NAMESPACE = 7140002
+
+
+class SnapshotDiff:
+    """The (inventory, mobid) keys a new snapshot adds, changes and removes relative to a project's saved workloads."""
+
+    def __init__(self, added, changed, removed, unchanged):
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.unchanged = unchanged
+
+    def counts(self):
+        return {'added': len(self.added), 'changed': len(self.changed), 'removed': len(self.removed), 'unchanged': self.unchanged}
+
+
+def diff_snapshot(saved, rows):
+    """Hash-join the saved (inventory, mobid, fingerprint) rows against a snapshot's projected rows.
+
+    A saved row without a fingerprint - stored before fingerprints were - counts as changed, so it
+    is rewritten once and compared by fingerprint from then on.
+    """
+    incoming = pd.DataFrame({'inventory': rows['inventory'].to_numpy(), 'mobid': rows['mobid'].to_numpy(),
+                             'fingerprint': row_fingerprints(rows).astype('Int64').to_numpy()})
+    saved = saved.astype({'fingerprint': 'Int64'})
+    joined = incoming.merge(saved, on=list(KEY), how='outer', suffixes=('', '_saved'), indicator=True, sort=False)
+
+    def keys(frame):
+        return list(zip(frame['inventory'], frame['mobid']))
+
+    both = joined[joined['_merge'] == 'both']
+    same = (both['fingerprint'] == both['fingerprint_saved']).fillna(False).astype(bool)
+    return SnapshotDiff(added=keys(joined[joined['_merge'] == 'left_only']),
+                        changed=keys(both[~same]),
+                        removed=keys(joined[joined['_merge'] == 'right_only']),
+                        unchanged=int(same.sum()))
+
+
+def _batches(keys):
+    """The mobids of (inventory, mobid) keys, MOBID_BATCH at a time, with the inventory they belong to."""
+    by_inventory = {}
+    for inventory, mobid in keys:
+        by_inventory.setdefault(inventory, []).append(mobid)
+    for inventory, mobids in by_inventory.items():
+        for start in range(0, len(mobids), MOBID_BATCH):
+            yield inventory, mobids[start:start + MOBID_BATCH]
+
+
+def _saved_rows(connection, table, pid, columns, keys):
+    """The saved values of `columns` for the given (inventory, mobid) keys, indexed by them, numerics as floats."""
+    columns = [*KEY, *columns]
+    frames = []
+    for inventory, batch in _batches(keys):
+        query = (select(*(table.columns[name] for name in columns))
+                 .where(table.c.pid == pid, table.c.inventory == inventory, table.c.mobid.in_(batch)))
+        frames.append(pd.DataFrame(connection.execute(query).all(), columns=columns))
+    saved = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    for name in columns:
+        if saved[name].map(lambda value: isinstance(value, Decimal)).any():
+            saved[name] = pd.to_numeric(saved[name])
+    return saved.set_index(list(KEY))
+
+
+def _differs(new, old):
+    same = (new == old).astype('boolean').fillna(False) | (new.isna() & old.isna())
+    return ~same.astype(bool)
+
+
+def _json_values(values):
+    return json.dumps({name: (None if pd.isna(value) else value) for name, value in values.items()},
+                      default=lambda value: value.item() if hasattr(value, 'item') else str(value))
+
+
+def _change_records(snapshotid, diff, rows, previous):
+    """workload_changes_tb rows: the columns each changed VM changed and their previous values, removed VMs' last values."""
+    def record(key, change, columns=None, values=None):
+        inventory, mobid = key
+        return {'snapshotid': snapshotid, 'inventory': inventory, 'mobid': mobid, 'change': change, 'columns': columns,
+                'previous': None if values is None else _json_values(values)}
+
+    records = [record(key, 'added') for key in diff.added]
+
+    if diff.changed:
+        new = rows.set_index(list(KEY)).loc[diff.changed, previous.columns]
+        old = previous.loc[diff.changed]
+        differs = pd.DataFrame({name: _differs(new[name], old[name]) for name in previous.columns}, index=new.index)
+        for key, flags in differs.iterrows():
+            names = [name for name in previous.columns if flags[name]]
+            records.append(record(key, 'changed', ','.join(names), old.loc[key, names]))
+
+    for key, values in previous.loc[diff.removed].iterrows():
+        records.append(record(key, 'removed', values=values))
+    return records
+
+
+def apply_snapshot(connection, workloads, snapshots, changes, pid, vm_data_df, source=None, inventory=''):
+    """Make a project's saved workloads match a new inventory snapshot, touching only what differs.
+
+    Each VM belongs to an inventory - its vCenter, or `inventory` for exports that do not name one,
+    as in workload_rows - and only the inventories the snapshot lists are compared, so saving one
+    vCenter leaves the project's other vCenters and exports alone. Within them the snapshot is
+    diffed against the saved rows by (inventory, mobid) and row fingerprint: added and changed VMs
+    are upserted, VMs no longer listed are deleted, and unchanged rows are not written.
+    Each call records a snapshots_tb row with the counts, and one workload_changes_tb row per VM
+    that differed, holding the previous values of whatever changed. VMs without a vmId cannot be
+    matched between snapshots and are left out. The caller owns the transaction.
+
+    Returns the counts and the new snapshot's id.
+    """
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SELECT pg_advisory_xact_lock(:namespace, :pid)'), {'namespace': SNAPSHOT_LOCK_NAMESPACE, 'pid': pid})
+
+    rows = unique_rows(workload_rows(vm_data_df, workloads, pid, inventory))
+    unkeyed = int(rows['mobid'].isna().sum())
+    if unkeyed:
+        logger.warning('%d VMs without a vmId left out of the snapshot of project %s', unkeyed, pid)
+    rows = rows[rows['mobid'].notna()]
+
+    saved = pd.DataFrame(connection.execute(select(workloads.c.inventory, workloads.c.mobid, workloads.c.fingerprint)
+                                            .where(workloads.c.pid == pid, workloads.c.inventory.in_(rows['inventory'].unique().tolist()),
+                                                   workloads.c.mobid.is_not(None))).all(),
+                         columns=[*KEY, 'fingerprint'])
+    diff = diff_snapshot(saved, rows)
+
+    # only the rows that differ are read back, for the change history
+    history_columns = [name for name in rows.columns if name not in ('pid', 'fingerprint', *KEY)]
+    previous = _saved_rows(connection, workloads, pid, history_columns, diff.changed + diff.removed)
+
+    counts = diff.counts()
+    snapshotid = connection.execute(insert(snapshots).values(pid=pid, source=source, **counts)).inserted_primary_key[0]
+    records = _change_records(snapshotid, diff, rows, previous)
+    if records:
+        connection.execute(insert(changes), records)
+
+    touched = set(diff.added) | set(diff.changed)
+    if touched:
+        upsert_rows(connection, workloads, rows[pd.MultiIndex.from_frame(rows[list(KEY)]).isin(touched)])
+    for inventory, batch in _batches(diff.removed):
+        connection.execute(delete(workloads).where(workloads.c.pid == pid, workloads.c.inventory == inventory, workloads.c.mobid.in_(batch)))
+    return {**counts, 'unkeyed': unkeyed, 'snapshotid': snapshotid}
@@ -0,0 +1,118 @@
+import sys
+from sqlalchemy import func, select
+
+if 'pytest' in sys.modules:
+    from src.persistence import WORKLOAD_COLUMNS
+else:
+    from persistence import WORKLOAD_COLUMNS
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# rows of a streamed first page sent in each chunk
+STREAM_CHUNK_ROWS = 25
+
+# query string parameter -> column it filters on (case-insensitive substring match)
+FILTER_COLUMNS = ('cluster', 'os', 'vmState', 'vCenter', 'sourceFile')
+
+
+class TableQueryError(ValueError):
+    """Raised for pagination, sort or filter parameters the table cannot honour."""
+
+
+def parse_table_args(args, columns):
+    """Read offset/limit/sort/order and the text filters from a request's query string."""
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise TableQueryError('offset and limit must be integers')
+    if offset < 0 or not 0 < limit <= MAX_LIMIT:
+        raise TableQueryError(f'offset must be non-negative and limit between 1 and {MAX_LIMIT}')
+
+    sort = args.get('sort') or None
+    if sort is not None and sort not in columns:
+        raise TableQueryError(f'cannot sort on {sort}')
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise TableQueryError('order must be asc or desc')
+
+    filters = {col: args[col] for col in FILTER_COLUMNS if args.get(col) and col in columns}
+    return {'offset': offset, 'limit': limit, 'sort': sort, 'descending': order == 'desc', 'filters': filters}
+
+
+def query_frame(vm_data_df, offset, limit, sort, descending, filters):
+    """Filter, sort and slice a consolidated frame; returns the matching row count and the page."""
+    mask = None
+    for col, text in filters.items():
+        matches = vm_data_df[col].astype(str).str.contains(text, case=False, regex=False, na=False)
+        mask = matches if mask is None else mask & matches
+    matching = vm_data_df if mask is None else vm_data_df[mask]
+
+    if sort is not None:
+        # stable sort keeps the original row order among equal keys, so pages never overlap
+        matching = matching.sort_values(sort, ascending=not descending, kind='stable', na_position='last')
+    return len(matching), matching.iloc[offset:offset + limit]
+
+
+def query_workloads(table, pid, columns, offset, limit, sort, descending, filters):
+    """Build the count and page selects over workloads_tb for the same filters, sort and slice.
+
+    Column, sort and filter names are the consolidated frame's camelCase names; ties are broken on
+    vmid so pages are stable.
+    """
+    conditions = [table.c.pid == pid]
+    for col, text in filters.items():
+        conditions.append(table.columns[WORKLOAD_COLUMNS[col]].icontains(text, autoescape=True))
+
+    order_by = []
+    if sort is not None:
+        column = table.columns[WORKLOAD_COLUMNS[sort]]
+        order_by.append(column.desc().nulls_last() if descending else column.asc().nulls_last())
+    order_by.append(table.c.vmid)
+
+    count_query = select(func.count()).select_from(table).where(*conditions)
+    page_query = (select(*(table.columns[WORKLOAD_COLUMNS[col]].label(col) for col in columns))
+                  .where(*conditions).order_by(*order_by).offset(offset).limit(limit))
+    return count_query, page_query
+
+
+def page_payload(total, offset, limit, columns, rows):
+    return {'total': total, 'offset': offset, 'limit': limit, 'columns': list(columns), 'rows': rows}
+
+
+def frame_rows(page):
+    """JSON-ready row lists with NaN turned into null.
+
+    float32 values go through their shortest repr, so 0.1 is sent as 0.1 rather than as the
+    0.10000000149011612 a plain widening to float64 would give.
+    """
+    widened = {name: page[name].astype(str).astype('float64') for name in page.columns if page[name].dtype == 'float32'}
+    if widened:
+        page = page.assign(**widened)
+    return page.astype(object).where(page.notna(), None).values.tolist()
+
+
+class FirstPage:
+    """The first page of a results table, unsorted and unfiltered, for a template that is streamed.
+
+    Nothing is loaded until the template iterates it, by which time the page shell has been sent.
+    Iterating calls `load` for the frame and yields the page's rows `chunk_rows` at a time;
+    `payload` then holds the page's page_payload with an empty row list, or stays None when `load`
+    returned None.
+    """
+
+    def __init__(self, load, limit=DEFAULT_LIMIT, chunk_rows=STREAM_CHUNK_ROWS):
+        self.load = load
+        self.limit = limit
+        self.chunk_rows = chunk_rows
+        self.payload = None
+
+    def __iter__(self):
+        vm_data_df = self.load()
+        if vm_data_df is None:
+            return
+        total, page = query_frame(vm_data_df, 0, self.limit, None, False, {})
+        rows = frame_rows(page)
+        self.payload = page_payload(total, 0, self.limit, page.columns, [])
+        for start in range(0, len(rows), self.chunk_rows):
+            yield rows[start:start + self.chunk_rows]
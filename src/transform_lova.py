@@ -1,80 +1,107 @@
-import pandas as pd
+import logging
 import sys
 
+if 'pytest' in sys.modules:
+    from src.column_mapping import Column, SheetMapping, apply_output_schema
+    from src.frame_backend import get_backend
+    from src.metrics import stage
+    from src.workbook import Workbook
+else:
+    from column_mapping import Column, SheetMapping, apply_output_schema
+    from frame_backend import get_backend
+    from metrics import stage
+    from workbook import Workbook
+
+logger = logging.getLogger('inventory.transform')
+
+# the version of this conversion's output is kept in jobs.TRANSFORMS
+
 def lova_conversion(**kwargs):
     input_path = kwargs['input_path'] 
     file_name = kwargs['file_name'] 
 
-    print()
-    print("Parsing LiveOptics file(s) locally.")
-
-    vmdata_df = pd.read_excel(f'{input_path}/{file_name}', sheet_name="VMs")
-
-    # specify columns to KEEP - all others will be dropped
-    keep_columns = ['Cluster','Datacenter','Guest IP1','Guest IP2','Guest IP3','Guest IP4','VM OS','Guest Hostname', 'Power State', 'Virtual CPU', 'VM Name', 'MOB ID']
-    if 'Virtual Disk Size (MiB)' in vmdata_df:
-        keep_columns.extend(['Virtual Disk Size (MiB)','Virtual Disk Used (MiB)', 'Provisioned Memory (MiB)'])
-    else:
-        keep_columns.extend(['Virtual Disk Size (MB)','Virtual Disk Used (MB)', 'Provisioned Memory (MB)'])
-
-    vmdata_df = vmdata_df.filter(items= keep_columns, axis= 1)
-
-    # rename remaining columns
-    vmdata_df.rename(columns = {
-        'MOB ID':'vmId',
-        'VM Name':'vmName',
-        'VM OS':'os',
-        'Guest Hostname':'os_name',
-        'Power State':'vmState',
-        'Virtual CPU':'vCpu',
-        'Cluster':'cluster',
-        'Datacenter':'virtualDatacenter'
-        }, inplace = True)
-
-    if 'Virtual Disk Size (MiB)' in vmdata_df:
-        vmdata_df.rename(columns = {
-            'Provisioned Memory (MiB)':'vRam',
-            'Virtual Disk Size (MiB)':'vmdkTotal',
-            'Virtual Disk Used (MiB)':'vmdkUsed',
-            }, inplace = True)
-    else:
-        vmdata_df.rename(columns = {
-            'Provisioned Memory (MB)':'vRam',
-            'Virtual Disk Size (MB)':'vmdkTotal',
-            'Virtual Disk Used (MB)':'vmdkUsed',
-            }, inplace = True)
-
-    fillna_values = {"Guest IP1": "no ip", "Guest IP2": "no ip", "Guest IP3": "no ip", "Guest IP4": "no ip", "os": "none specified"}
-    vmdata_df.fillna(value=fillna_values, inplace = True)
+    # 'pandas' or 'polars'; both produce equal frames, polars runs the group/merge stages on all cores
+    backend = get_backend(kwargs.get('backend', 'pandas'))
+
+    # reuse the caller's workbook handle when there is one, so the file is only unzipped and parsed once
+    workbook = kwargs.get('workbook')
+    if workbook is None:
+        with Workbook(input_path, file_name, kwargs.get('sheet_ids')) as workbook:
+            return _convert(workbook, backend)
+    return _convert(workbook, backend)
 
-    # aggregate IP addresses into one column
-    vmdata_df['ip_addresses'] = vmdata_df['Guest IP1'].map(str)+ ', ' + vmdata_df['Guest IP2'].map(str)+ ', ' + vmdata_df['Guest IP3'].map(str)+ ', ' + vmdata_df['Guest IP4'].map(str)
-    vmdata_df['ip_addresses'] = vmdata_df.ip_addresses.str.replace(', no ip' , '')
-    vmdata_df.drop(['Guest IP1', 'Guest IP2', 'Guest IP3', 'Guest IP4'], axis=1, inplace=True)
 
+# LiveOptics header(s) -> consolidated column, in output order; sizes are reported in MiB or MB
+# depending on the LiveOptics version
+VMS_SHEET = SheetMapping(
+    Column('cluster', 'Cluster'),
+    Column('virtualDatacenter', 'Datacenter'),
+    Column('os', 'VM OS', fill='none specified'),
+    Column('os_name', 'Guest Hostname'),
+    Column('vmState', 'Power State'),
+    Column('vCpu', 'Virtual CPU'),
+    Column('vmName', 'VM Name'),
+    Column('vmId', 'MOB ID'),
     # convert RAM and storage numbers into GB
-    vmdata_df['vmdkUsed'] = vmdata_df['vmdkUsed']/1024
-    vmdata_df['vmdkTotal'] = vmdata_df['vmdkTotal']/1024
-    vmdata_df['vRam'] = vmdata_df['vRam']/1024
+    Column('vmdkTotal', 'Virtual Disk Size (MiB)', 'Virtual Disk Size (MB)', divisor=1024),
+    Column('vmdkUsed', 'Virtual Disk Used (MiB)', 'Virtual Disk Used (MB)', divisor=1024),
+    Column('vRam', 'Provisioned Memory (MiB)', 'Provisioned Memory (MB)', divisor=1024),
+    )
 
-    vm_df_export = vmdata_df.round({'vmdkUsed':0,'vmdkTotal':0,'vRam':0})
+IP_COLUMNS = ['Guest IP1','Guest IP2','Guest IP3','Guest IP4']
+
+PERFORMANCE_SHEET = SheetMapping(
+    Column('vmId', 'MOB ID'),
+    Column('readIOPS', 'Avg Read IOPS'),
+    Column('writeIOPS', 'Avg Write IOPS'),
+    Column('peakReadIOPS', 'Peak Read IOPS'),
+    Column('peakWriteIOPS', 'Peak Write IOPS'),
+    Column('readThroughput', 'Avg Read MB/s'),
+    Column('writeThroughput', 'Avg Write MB/s'),
+    Column('peakReadThroughput', 'Peak Read MB/s'),
+    Column('peakWriteThroughput', 'Peak Write MB/s'),
+    )
+
+
+def _convert(workbook, backend):
+    logger.info('parsing LiveOptics file', extra={'fields': {'backend': backend.name}})
+
+    vmdata_df = workbook.read_sheet('VMs', columns = VMS_SHEET.headers() + IP_COLUMNS)
 
     # pull in rows from VM Performance for storage performance metrics
-    diskperf_df = pd.read_excel(f'{input_path}/{file_name}', sheet_name = 'VM Performance')
-
-    perf_columns = ["MOB ID","Avg Read IOPS","Avg Write IOPS","Peak Read IOPS","Peak Write IOPS","Avg Read MB/s","Avg Write MB/s","Peak Read MB/s","Peak Write MB/s"]
-    diskperf_df = diskperf_df.filter(items= perf_columns, axis= 1)
-    diskperf_df.rename(columns = {
-        'MOB ID':'vmId', 
-        'Avg Read IOPS':'readIOPS',
-        'Avg Write IOPS':'writeIOPS',
-        'Peak Read IOPS':'peakReadIOPS',
-        'Peak Write IOPS':'peakWriteIOPS',
-        'Avg Read MB/s':'readThroughput',
-        'Avg Write MB/s':'writeThroughput',
-        'Peak Read MB/s':'peakReadThroughput',
-        'Peak Write MB/s':'peakWriteThroughput'
-        }, inplace = True)
-
-    vm_consolidated = pd.merge(vmdata_df, diskperf_df, on = "vmId", how = "left")
-    return vm_consolidated
\ No newline at end of file
+    diskperf_df = workbook.read_sheet('VM Performance', columns = PERFORMANCE_SHEET.headers())
+
+    vmdata_df, diskperf_df = transform_vms(vmdata_df), transform_performance(diskperf_df)
+    with stage('merge'):
+        vm_consolidated = backend.left_merge(vmdata_df, diskperf_df, "vmId")
+    return apply_output_schema(vm_consolidated)
+
+
+def join_ip_addresses(first, *others):
+    """Join guest IP columns into one "ip1, ip2, ..." string per VM, skipping missing addresses.
+
+    A VM without a first address reads "no ip", followed by any later addresses it does have.
+    """
+    joined = first.fillna('no ip').astype(str)
+    for ips in others:
+        text = ips.astype(str)
+        present = ips.notna() & (text != 'no ip')
+        joined = joined + (', ' + text).where(present, '')
+    return joined
+
+
+def transform_vms(vmdata_df):
+    """Project, fill and convert the VMs sheet in one pass over only the columns that are kept."""
+    vms = VMS_SHEET.apply(vmdata_df)
+
+    # LiveOptics' vCenter column holds the product and build string, the same for every vCenter of a
+    # version, and no sheet names the vCenter host, so the column is left empty rather than misleading
+    vms.insert(vms.columns.get_loc('virtualDatacenter') + 1, 'vCenter', None)
+
+    # aggregate IP addresses into one column
+    vms['ip_addresses'] = join_ip_addresses(*(vmdata_df[col] for col in IP_COLUMNS))
+    return vms
+
+
+def transform_performance(diskperf_df):
+    return PERFORMANCE_SHEET.apply(diskperf_df)
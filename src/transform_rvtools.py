@@ -1,99 +1,86 @@
-import pandas as pd
+import logging
 import sys
 
+if 'pytest' in sys.modules:
+    from src.column_mapping import Column, SheetMapping, apply_output_schema
+    from src.frame_backend import get_backend
+    from src.metrics import stage
+    from src.workbook import Workbook
+else:
+    from column_mapping import Column, SheetMapping, apply_output_schema
+    from frame_backend import get_backend
+    from metrics import stage
+    from workbook import Workbook
+
+logger = logging.getLogger('inventory.transform')
+
+# the version of this conversion's output is kept in jobs.TRANSFORMS
+
 def rvtools_conversion(**kwargs):
     input_path = kwargs['input_path']
     file_name = kwargs['file_name'] 
 
-    print()
-    print("Parsing RVTools file(s) locally.")
-
-    vmdata_df = pd.read_excel(f'{input_path}/{file_name}', sheet_name = 'vInfo')
-
-    # specify columns to KEEP - all others will be dropped
-    keep_columns = ['VM ID','Cluster', 'Datacenter','Primary IP Address','OS according to the VMware Tools', 'DNS Name','Powerstate','CPUs','VM','Memory']
-    if 'Provisioned MiB' in vmdata_df:
-        keep_columns.extend(['Provisioned MiB','In Use MiB'])
-    else:
-        keep_columns.extend(['Provisioned MB','In Use MB'])
-    vmdata_df = vmdata_df.filter(items= keep_columns, axis= 1)
-
-    # rename remaining columns
-    vmdata_df.rename(columns = {
-        'VM ID':'vmId', 
-        'VM':'vmName',
-        'OS according to the VMware Tools':'os',
-        'DNS Name':'os_name',
-        'Powerstate':'vmState',
-        'CPUs':'vCpu',
-        'Memory':'vRam', 
-        'Primary IP Address':'ip_addresses',
-        'Folder':'vmFolder',
-        'Resource pool':'resourcePool',
-        'Cluster':'cluster', 
-        'Datacenter':'virtualDatacenter'
-        }, inplace = True)
-    
-    if 'Provisioned MiB' in vmdata_df:
-        vmdata_df.rename(columns = {
-            'Provisioned MiB':'vinfo_provisioned', 
-            'In Use MiB':'vinfo_used'
-            }, inplace = True)
-    else:
-        vmdata_df.rename(columns = {
-            'Provisioned MB':'vinfo_provisioned', 
-            'In Use MB':'vinfo_used'
-            }, inplace = True)
-
-    fillna_values = {"ip_addresses": "no ip", "os": "none specified"}
-    vmdata_df.fillna(value=fillna_values, inplace = True)
+    # 'pandas' or 'polars'; both produce equal frames, polars runs the group/merge stages on all cores
+    backend = get_backend(kwargs.get('backend', 'pandas'))
+
+    # reuse the caller's workbook handle when there is one, so the file is only unzipped and parsed once
+    workbook = kwargs.get('workbook')
+    if workbook is None:
+        with Workbook(input_path, file_name, kwargs.get('sheet_ids')) as workbook:
+            return _convert(workbook, backend)
+    return _convert(workbook, backend)
+
+
+# RVTools header(s) -> consolidated column, in output order; storage is reported in MiB or MB
+# depending on the RVTools version
+VINFO_SHEET = SheetMapping(
+    Column('vmId', 'VM ID'),
+    Column('cluster', 'Cluster'),
+    Column('virtualDatacenter', 'Datacenter'),
+    Column('vCenter', 'VI SDK Server'),
+    Column('ip_addresses', 'Primary IP Address', fill='no ip'),
+    Column('os', 'OS according to the VMware Tools', fill='none specified'),
+    Column('os_name', 'DNS Name'),
+    Column('vmState', 'Powerstate'),
+    Column('vCpu', 'CPUs'),
+    Column('vmName', 'VM'),
+    # convert RAM and storage numbers into GB
+    Column('vRam', 'Memory', divisor=1024),
+    Column('vinfo_provisioned', 'Provisioned MiB', 'Provisioned MB', divisor=1024),
+    Column('vinfo_used', 'In Use MiB', 'In Use MB', divisor=1024),
+    )
 
-    # pull in rows from vDisk for allocated storage
-    vdisk_df = pd.read_excel(f'{input_path}/{file_name}', sheet_name = 'vDisk')
+# rows from vDisk for allocated storage
+VDISK_SHEET = SheetMapping(
+    Column('vmId', 'VM ID'),
+    Column('vmdkTotal', 'Capacity MiB', 'Capacity MB', divisor=1024),
+    )
 
-    vdisk_columns = ['VM ID']
-    # Different versions of RVTools use either "MB" or "MiB" for storage; check for presence and include appropriate columns
-    if 'Capacity MiB' in vdisk_df:
-        vdisk_columns.extend(['Capacity MiB'])
-    else:
-        vdisk_columns.extend(['Capacity MB'])
-    vdisk_df = vdisk_df.filter(items= vdisk_columns, axis= 1)
+# rows from vPartition for consumed storage
+VPARTITION_SHEET = SheetMapping(
+    Column('vmId', 'VM ID'),
+    Column('vmdkUsed', 'Consumed MiB', 'Consumed MB', divisor=1024),
+    )
 
-    if 'Capacity MiB' in vdisk_df:
-        vdisk_df.rename(columns ={'Capacity MiB':'vmdkTotal'}, inplace = True)
-    else:
-        vdisk_df.rename(columns ={'Capacity MB':'vmdkTotal'}, inplace = True)
-    vdisk_df.rename(columns ={'VM ID':'vmId'}, inplace = True)
 
-    vdisk_df = vdisk_df.groupby(['vmId'])['vmdkTotal'].sum().reset_index()
+def _convert(workbook, backend):
+    logger.info('parsing RVTools file', extra={'fields': {'backend': backend.name}})
+
+    vmdata_df = VINFO_SHEET.apply(workbook.read_sheet('vInfo', columns = VINFO_SHEET.headers()))
+
+    # pull in rows from vDisk for allocated storage
+    vdisk_df = VDISK_SHEET.apply(workbook.read_sheet('vDisk', columns = VDISK_SHEET.headers()))
+    with stage('group_sum'):
+        vdisk_df = backend.group_sum(vdisk_df, "vmId", "vmdkTotal")
 
     # pull in rows from vPartition for consumed storage
-    vpart_df = pd.read_excel(f'{input_path}/{file_name}', sheet_name = 'vPartition')
-    
-    part_list = ['VM ID']
-    if 'Consumed MiB' in vpart_df:
-        part_list.extend(['Consumed MiB'])
-    else:
-        part_list.extend(['Consumed MB'])
-    vpart_df = vpart_df.filter(items= part_list, axis= 1)
-
-    if 'Consumed MiB' in vpart_df:
-        vpart_df.rename(columns ={'Consumed MiB':'vmdkUsed'}, inplace = True)
-    else:
-        vpart_df.rename(columns ={'Consumed MB':'vmdkUsed'}, inplace = True)
-    vpart_df.rename(columns ={'VM ID':'vmId'}, inplace = True)
-
-    vpart_df = vpart_df.groupby(['vmId'])['vmdkUsed'].sum().reset_index()
-
-    vm_consolidated = pd.merge(vmdata_df, vdisk_df, on = "vmId", how = "left")
-    vm_consolidated = pd.merge(vm_consolidated, vpart_df, on = "vmId", how = "left")
+    vpart_df = VPARTITION_SHEET.apply(workbook.read_sheet('vPartition', columns = VPARTITION_SHEET.headers()))
+    with stage('group_sum'):
+        vpart_df = backend.group_sum(vpart_df, "vmId", "vmdkUsed")
 
-    # convert RAM and storage numbers into GB
-    vm_consolidated['vinfo_provisioned'] = vm_consolidated['vinfo_provisioned']/1024
-    vm_consolidated['vinfo_used'] = vm_consolidated['vinfo_used']/1024
-    vm_consolidated['vmdkTotal'] = vm_consolidated['vmdkTotal']/1024
-    vm_consolidated['vmdkUsed'] = vm_consolidated['vmdkUsed']/1024
-    vm_consolidated['vRam'] = vm_consolidated['vRam']/1024
+    with stage('merge'):
+        vm_consolidated = backend.left_merge(vmdata_df, vdisk_df, "vmId")
+        vm_consolidated = backend.left_merge(vm_consolidated, vpart_df, "vmId")
 
     # Replace NA values for used VMDK and total VMDK with 0 GB
     storage_na_values = {"vmdkTotal": 0, "vmdkUsed": 0}
@@ -103,4 +90,4 @@ def rvtools_conversion(**kwargs):
     vm_consolidated.loc[vm_consolidated.vmdkTotal == 0, 'vmdkTotal'] = vm_consolidated.vinfo_provisioned
     vm_consolidated.loc[vm_consolidated.vmdkUsed == 0, 'vmdkUsed'] = vm_consolidated.vinfo_used
 
-    return vm_consolidated
\ No newline at end of file
+    return apply_output_schema(vm_consolidated)
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.utils import secure_filename
+
+# .xlsx files are zip containers, legacy .xls files OLE2 compound documents
+MAGIC_NUMBERS = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1')
+MAGIC_LENGTH = max(len(magic) for magic in MAGIC_NUMBERS)
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xls')
+
+# each upload's folder under the upload folder, and the name it is written under until it is kept
+FOLDER_PREFIX = 'upload-'
+PART_NAME = 'upload.part'
+
+
+class UploadWriter:
+    """Destination for one uploaded file, written chunk by chunk as the request body is parsed.
+
+    Each upload gets its own temporary folder under the upload folder, so uploads with the same
+    name never overwrite each other. The SHA-256 is computed while the chunks are written, and a
+    payload whose first bytes are neither a zip nor an OLE2 header is rejected (and its folder
+    removed) as soon as those bytes arrive, without reading the rest of the body.
+    """
+
+    def __init__(self, upload_folder):
+        os.makedirs(upload_folder, exist_ok=True)
+        self.folder = tempfile.mkdtemp(prefix=FOLDER_PREFIX, dir=upload_folder)
+        self.path = os.path.join(self.folder, PART_NAME)
+        self.size = 0
+        self.kept = False
+        self._file = open(self.path, 'w+b')
+        self._digest = hashlib.sha256()
+        self._head = b''
+
+    def write(self, data):
+        if len(self._head) < MAGIC_LENGTH:
+            self._head += data[:MAGIC_LENGTH - len(self._head)]
+            if len(self._head) == MAGIC_LENGTH and not self.is_workbook():
+                self.discard()
+                raise UnsupportedMediaType('Only Excel workbooks (.xlsx or .xls) can be uploaded.')
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def is_workbook(self):
+        return any(self._head.startswith(magic) for magic in MAGIC_NUMBERS)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def keep(self, file_name):
+        """Close the upload under its final name and return the folder it lives in."""
+        self._file.close()
+        os.replace(self.path, os.path.join(self.folder, file_name))
+        self.kept = True
+        return self.folder
+
+    def discard(self):
+        self._file.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    # werkzeug rewinds the container after the last chunk and closes it with the request
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def close(self):
+        self._file.close()
+
+
+class StreamingUploadRequest(Request):
+    """Request whose file parts are streamed into an UploadWriter instead of werkzeug's spooled temp file.
+
+    Uploads the view did not keep - rejected, cut off by MAX_CONTENT_LENGTH or simply unused - are
+    removed when the request closes.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        writer = UploadWriter(current_app.config['UPLOAD_FOLDER'])
+        self.__dict__.setdefault('upload_writers', []).append(writer)
+        return writer
+
+    def close(self):
+        super().close()
+        for writer in self.__dict__.get('upload_writers', ()):
+            if not writer.kept:
+                writer.discard()
+
+
+def evict_uploads(upload_folder, max_bytes, keep=()):
+    """Drop the least recently used upload folders until `upload_folder` is back under max_bytes.
+
+    Kept uploads are what the results page converts again once a result has left the ResultCache,
+    so they are dropped the way its entries are: oldest modification time first. The folders in
+    `keep` - those of conversions still queued or running - and uploads still being written are
+    never dropped. Returns the number of folders removed.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    total = 0
+    try:
+        folders = [entry.path for entry in os.scandir(upload_folder) if entry.name.startswith(FOLDER_PREFIX) and entry.is_dir()]
+    except FileNotFoundError:
+        return 0
+    for folder in folders:
+        try:
+            stats = [os.stat(folder)] + [entry.stat() for entry in os.scandir(folder) if entry.is_file()]
+            writing = os.path.exists(os.path.join(folder, PART_NAME))
+        except FileNotFoundError:
+            continue
+        size = sum(stat.st_size for stat in stats[1:])
+        total += size
+        if not writing and os.path.abspath(folder) not in keep:
+            entries.append((max(stat.st_mtime for stat in stats), size, folder))
+
+    removed = 0
+    for _, size, folder in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(folder, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def is_archive(path):
+    """True for a zip of exports, as opposed to an .xlsx, which is itself a zip container."""
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as archive:
+        return 'xl/workbook.xml' not in archive.namelist()
+
+
+def extract_workbooks(archive_path, folder, max_bytes, max_files):
+    """Unpack the .xlsx/.xls members of a zip of exports into `folder` and return their file names.
+
+    Folders inside the archive are flattened, clashing names are numbered, and everything else
+    (READMEs, macOS resource forks) is skipped. The sizes the archive declares are checked before
+    anything is written, and the bytes actually written are counted too, so a zip bomb cannot fill the disk.
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith(WORKBOOK_EXTENSIONS)
+                   and not os.path.basename(info.filename).startswith('.') and '__MACOSX' not in info.filename]
+        if len(members) > max_files:
+            raise RequestEntityTooLarge(f'Batches are limited to {max_files} workbooks.')
+        if sum(info.file_size for info in members) > max_bytes:
+            raise RequestEntityTooLarge()
+
+        file_names = []
+        written = 0
+        for info in members:
+            base, extension = os.path.splitext(secure_filename(os.path.basename(info.filename)) or f'upload{os.path.splitext(info.filename)[1]}')
+            file_name = f'{base}{extension}'
+            counter = 1
+            while file_name in file_names or os.path.exists(os.path.join(folder, file_name)):
+                file_name = f'{base}-{counter}{extension}'
+                counter += 1
+            with archive.open(info) as source, open(os.path.join(folder, file_name), 'wb') as target:
+                for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise RequestEntityTooLarge()
+                    target.write(chunk)
+            file_names.append(file_name)
+    return file_names
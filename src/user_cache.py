@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+
+# the users_tb columns a request needs from current_user; the password hash never enters the cache
+CACHED_FIELDS = ('id', 'username')
+
+
+class CachedUser(UserMixin):
+    """Detached stand-in for a User row, safe to share between requests and threads."""
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+
+class MemoryBackend:
+    """Entries of this process only, least recently used first out once `max_entries` is reached."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """Entries in a SQLite file every web process on the host shares, so one process's invalidation is seen by all.
+
+    Expired entries are removed whenever the table outgrows `max_entries`.
+    """
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS user_cache (key INTEGER PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # one connection per thread and process; sqlite3 connections must not cross either
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=5)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, key, now):
+        row = self._connect().execute('SELECT value FROM user_cache WHERE key = ? AND expires > ?', (key, now)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value, expires):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO user_cache (key, value, expires) VALUES (?, ?, ?)', (key, json.dumps(value), expires))
+            if len(self) > self.max_entries:
+                conn.execute('DELETE FROM user_cache WHERE expires <= ?', (time.time(),))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM user_cache WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._connect().execute('SELECT count(*) FROM user_cache').fetchone()[0]
+
+
+class UserCache:
+    """TTL cache of the user identities login_manager.user_loader hands out.
+
+    Entries expire `ttl` seconds after they were loaded and are dropped as soon as the user logs
+    out or the row changes, so a stale identity outlives neither. Hit and miss counts are kept per
+    process. A `ttl` of 0 turns the cache off and every lookup goes to the loader.
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def load(self, user_id, loader):
+        """The identity of `user_id`, from the cache or else from `loader(user_id)`, which returns a User or None."""
+        if self.ttl > 0:
+            # wall-clock time, which unlike monotonic time all processes sharing a backend agree on
+            fields = self.backend.get(user_id, time.time())
+            if fields is not None:
+                self._count(hit=True)
+                return CachedUser(**fields)
+        self._count(hit=False)
+
+        user = loader(user_id)
+        if user is None:
+            return None
+        fields = {name: getattr(user, name) for name in CACHED_FIELDS}
+        if self.ttl > 0:
+            self.backend.set(user_id, fields, time.time() + self.ttl)
+        return CachedUser(**fields)
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'ttl': self.ttl,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRatio': self.hits / lookups if lookups else None,
+        }
+
+
+def create_user_cache(ttl, max_entries, path=None):
+    """A UserCache in this process's memory, or in the SQLite file at `path` when one is given."""
+    backend = SqliteBackend(path, max_entries) if path else MemoryBackend(max_entries)
+    return UserCache(backend, ttl)
@@ -0,0 +1,54 @@
+import os
+import sys
+import zipfile
+import pandas as pd
+
+if 'pytest' in sys.modules:
+    from src.metrics import stage
+    from src.xlsx_reader import XlsxReader
+else:
+    from metrics import stage
+    from xlsx_reader import XlsxReader
+
+class Workbook:
+    """Open an uploaded Excel file once and hand out individual sheets from the same handle.
+
+    Every pd.read_excel call on a path unzips the container and parses the workbook manifest
+    and shared strings again, so validation and conversion share one of these instead.
+    .xlsx files are streamed with XlsxReader; legacy .xls files fall back to pandas.
+    """
+
+    def __init__(self, input_path, file_name, sheet_ids=None):
+        self.path = os.path.join(input_path, file_name)
+        if zipfile.is_zipfile(self.path):
+            self._reader = XlsxReader(self.path, sheet_ids)
+        else:
+            self._reader = pd.ExcelFile(self.path)
+
+    @property
+    def sheet_names(self):
+        return self._reader.sheet_names
+
+    def read_sheet(self, sheet_name, columns=None):
+        with stage('read_sheet', sheet=sheet_name) as timer:
+            df = self._read(sheet_name, columns)
+            timer.rows = len(df)
+        return df
+
+    def _read(self, sheet_name, columns):
+        # only materialise the columns the caller asked for - header variants that are not present are ignored
+        if isinstance(self._reader, XlsxReader):
+            return self._reader.read_sheet(sheet_name, columns)
+        if columns is None:
+            return self._reader.parse(sheet_name)
+        wanted = set(columns)
+        return self._reader.parse(sheet_name, usecols=lambda col: col in wanted)
+
+    def close(self):
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,264 @@
+import math
+import posixpath
+import zipfile
+from functools import lru_cache
+from xml.etree.ElementTree import iterparse
+
+# transitional and strict OOXML spreadsheet namespaces
+SPREADSHEET_NS = ('http://schemas.openxmlformats.org/spreadsheetml/2006/main', 'http://purl.oclc.org/ooxml/spreadsheetml/main')
+RELATIONSHIP_NS = ('http://schemas.openxmlformats.org/officeDocument/2006/relationships', 'http://purl.oclc.org/ooxml/officeDocument/relationships')
+PACKAGE_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+
+def _tags(name):
+    return {f'{{{ns}}}{name}' for ns in SPREADSHEET_NS}
+
+
+SHEET, SHEET_DATA, ROW, CELL, VALUE, INLINE, TEXT, SHARED_ITEM, PHONETIC = (
+    _tags(name) for name in ('sheet', 'sheetData', 'row', 'c', 'v', 'is', 't', 'si', 'rPh'))
+
+
+@lru_cache(maxsize=4096)
+def _letters_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def column_index(ref):
+    """Zero-based column index from a cell reference such as 'AB12'."""
+    return _letters_index(ref.rstrip('0123456789'))
+
+
+def _text(element):
+    # concatenate plain and rich-text runs, skipping phonetic guide text
+    if element is None:
+        return ''
+    parts = []
+    for child in element:
+        if child.tag in TEXT:
+            parts.append(child.text or '')
+        elif child.tag not in PHONETIC:
+            parts.extend(t.text or '' for t in child if t.tag in TEXT)
+    return ''.join(parts)
+
+
+def read_sheet_ids(zip_file):
+    """Sheet name -> relationship id, in workbook order, from xl/workbook.xml alone."""
+    sheet_ids = {}
+    with zip_file.open('xl/workbook.xml') as manifest:
+        for _, element in iterparse(manifest):
+            if element.tag in SHEET:
+                sheet_ids[element.get('name')] = next(element.get(f'{{{ns}}}id') for ns in RELATIONSHIP_NS if element.get(f'{{{ns}}}id'))
+    return sheet_ids
+
+
+def _convert_column(values):
+    """The array pandas' parsers make of a column's cells.
+
+    The default NA strings become NaN, then the column is converted to numbers, failing that to
+    booleans, and otherwise left as objects - the steps TextParser takes for each column it reads.
+    """
+    import numpy as np
+    from pandas._libs import lib, ops as libops, parsers as libparsers
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    try:
+        result = lib.maybe_convert_numeric(array, libparsers.STR_NA_VALUES, False)[0]
+    except (ValueError, TypeError):
+        libparsers.sanitize_objects(array, libparsers.STR_NA_VALUES)
+        result = array
+    if result.dtype == object:
+        result = libops.maybe_convert_bool(array)[0]
+    return result
+
+
+class XlsxReader:
+    """Read-only, streaming access to the sheets of an .xlsx container.
+
+    Only the manifest is parsed up front. Sheet XML is streamed row by row and only the requested
+    columns are kept, so peak memory follows the size of the output rather than the raw sheet.
+    Cells are converted the same way pandas' openpyxl reader converts them, and the projected rows go
+    through pandas' own TextParser, so the frames match pd.read_excel(..., usecols=...) for the
+    non-date columns the transforms use; date-formatted cells come back as Excel serial numbers.
+    """
+
+    def __init__(self, path, sheet_ids=None):
+        self._zip = zipfile.ZipFile(path)
+        self._shared_strings = None
+        # a sniffer that already read the sheet list can pass it on, so only the relationships are parsed here
+        self.sheet_parts = self._read_manifest(sheet_ids or read_sheet_ids(self._zip))
+
+    @property
+    def sheet_names(self):
+        return list(self.sheet_parts)
+
+    def _read_manifest(self, sheet_ids):
+        targets = {}
+        with self._zip.open('xl/_rels/workbook.xml.rels') as rels:
+            for _, element in iterparse(rels):
+                if element.tag == f'{{{PACKAGE_RELS_NS}}}Relationship':
+                    target = element.get('Target')
+                    target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+                    targets[element.get('Id')] = target
+        return {name: targets[rid] for name, rid in sheet_ids.items()}
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if 'xl/sharedStrings.xml' in self._zip.namelist():
+                with self._zip.open('xl/sharedStrings.xml') as part:
+                    for _, element in iterparse(part):
+                        if element.tag in SHARED_ITEM:
+                            self._shared_strings.append(_text(element))
+                            element.clear()
+        return self._shared_strings
+
+    def _cell_value(self, cell):
+        cell_type = cell.get('t', 'n')
+        if cell_type == 'inlineStr':
+            return _text(next((child for child in cell if child.tag in INLINE), None))
+        raw = next((child.text for child in cell if child.tag in VALUE), None)
+        if raw is None:
+            return ''
+        if cell_type == 'n':
+            # match openpyxl's number casting followed by pandas' int-if-integral conversion
+            value = float(raw) if ('.' in raw or 'E' in raw or 'e' in raw) else int(raw)
+            return int(value) if value == int(value) else value
+        if cell_type == 's':
+            return self.shared_strings[int(raw)]
+        if cell_type == 'b':
+            return bool(int(raw))
+        if cell_type == 'e':
+            return math.nan
+        return raw
+
+    def iter_rows(self, sheet_name, columns=None):
+        """Yield the header and data rows of a sheet, projected onto the wanted columns.
+
+        The first yielded row is the header of the kept columns. Interior blank rows are yielded as
+        empty-string rows and trailing blank rows are dropped, mirroring pandas' Excel reader.
+        """
+        wanted = None if columns is None else set(columns)
+        keep = None
+        header_done = False
+        pending_blank = 0
+        last_row = 1
+
+        with self._zip.open(self.sheet_parts[sheet_name]) as part:
+            sheet_data = None
+            for event, element in iterparse(part, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag in SHEET_DATA:
+                        sheet_data = element
+                    continue
+                if element.tag not in ROW:
+                    continue
+
+                row_number = int(element.get('r', last_row + 1))
+                values = {}
+                has_data = False
+                position = 0
+                for cell in element:
+                    if cell.tag not in CELL:
+                        continue
+                    ref = cell.get('r')
+                    position = column_index(ref) if ref else position
+                    if keep is None or position in keep:
+                        value = self._cell_value(cell)
+                        if value != '':
+                            values[position] = value
+                            has_data = True
+                    elif not has_data:
+                        has_data = any(child.tag in VALUE or child.tag in INLINE for child in cell)
+                    position += 1
+                element.clear()
+                if sheet_data is not None:
+                    sheet_data.remove(element)
+
+                if not header_done:
+                    # the header is always sheet row 1, even when that row is blank
+                    header_done = True
+                    header = values if row_number == 1 else {}
+                    names = [header.get(i, '') for i in range(max(header, default=-1) + 1)]
+                    if wanted is None:
+                        yield names
+                    else:
+                        # keep the first occurrence of each wanted header, as filter() on mangled names would
+                        seen = set()
+                        keep = [i for i, name in enumerate(names) if name in wanted and not (name in seen or seen.add(name))]
+                        yield [names[i] for i in keep]
+                        keep = {i: slot for slot, i in enumerate(keep)}
+                        values = {position: value for position, value in values.items() if position in keep}
+                    if row_number == 1:
+                        continue
+
+                # rows missing from the XML are blank rows
+                pending_blank += row_number - last_row - 1
+                last_row = row_number
+                if not has_data:
+                    pending_blank += 1
+                    continue
+                width = len(keep) if keep is not None else 0
+                for _ in range(pending_blank):
+                    yield [''] * width
+                pending_blank = 0
+                if keep is None:
+                    row = [''] * (max(values) + 1)
+                    for position, value in values.items():
+                        row[position] = value
+                else:
+                    row = [''] * width
+                    for position, value in values.items():
+                        row[keep[position]] = value
+                yield row
+
+        if not header_done:
+            yield []
+
+    def read_sheet(self, sheet_name, columns=None):
+        """Parse a sheet into a DataFrame holding only the wanted columns (all columns when None).
+
+        Cells are appended to a list per column as the rows stream in, so no row lists are kept, and
+        each column is converted on its own the way pandas' parsers convert one. Only the header row
+        goes through TextParser, which names blank and repeated headers as pd.read_excel does.
+        """
+        # pandas is only needed here, so sniffing an upload's manifest does not import it
+        import pandas as pd
+        from pandas.errors import EmptyDataError
+        from pandas.io.parsers import TextParser
+
+        rows = self.iter_rows(sheet_name, columns)
+        header = next(rows)
+        data = [[] for _ in header]
+        length = 0
+        for row in rows:
+            if len(row) > len(data):
+                # rows are ragged when every column is read - pad them the way pandas' Excel reader does
+                data.extend([''] * length for _ in range(len(row) - len(data)))
+            for values, value in zip(data, row):
+                values.append(value)
+            for values in data[len(row):]:
+                values.append('')
+            length += 1
+
+        try:
+            names = TextParser([header + [''] * (len(data) - len(header))], header=0, skip_blank_lines=False).read()
+        except EmptyDataError:
+            return pd.DataFrame()
+        if not length:
+            return names
+        converted = {}
+        for i in range(len(data)):
+            converted[i] = _convert_column(data[i])
+            # each column's cells are let go of once it is converted
+            data[i] = None
+        frame = pd.DataFrame(converted)
+        frame.columns = names.columns
+        return frame
+
+    def close(self):
+        self._zip.close()
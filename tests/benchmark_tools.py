@@ -0,0 +1,49 @@
+"""Helpers the benchmarks share: peak memory tracing and the stored baseline they are checked against.
+
+check_baseline fails a measurement worse than tests/benchmarks/baseline.json by more than
+BENCH_TOLERANCE (default 0.3, i.e. 30%); BENCH_UPDATE_BASELINE=1 records it instead.
+"""
+import json
+import os
+import tracemalloc
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmarks', 'baseline.json')
+BENCH_TOLERANCE = float(os.getenv('BENCH_TOLERANCE', '0.3'))
+BENCH_UPDATE_BASELINE = os.getenv('BENCH_UPDATE_BASELINE', '') == '1'
+
+
+def peak_traced(func, *args):
+    """Peak bytes traced while `func(*args)` runs.
+
+    Benchmarks time an untraced run separately - tracemalloc overhead would swamp the parsing cost.
+    """
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def check_baseline(key, measured):
+    """Compare the named measurements stored under `key` against the baseline, or record them."""
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    if BENCH_UPDATE_BASELINE:
+        baseline[key] = {name: round(value, 1) for name, value in measured.items()}
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write('\n')
+        return
+    for name, value in measured.items():
+        expected = baseline.get(key, {}).get(name)
+        if expected is None:
+            continue
+        # rates regress by falling, everything else - seconds, MiB - by growing
+        if name.endswith('_per_second'):
+            assert value >= expected * (1 - BENCH_TOLERANCE), f'{key} {name} regressed: {value:,.1f} against {expected:,.1f} in the baseline'
+        else:
+            assert value <= expected * (1 + BENCH_TOLERANCE), f'{key} {name} regressed: {value:,.1f} against {expected:,.1f} in the baseline'
@@ -0,0 +1,5 @@
+import pytest
+
+# the shared check modules are not collected as tests, so their asserts are only rewritten to report
+# the values that failed if registered before they are imported
+pytest.register_assert_rewrite('tests.benchmark_tools', 'tests.schema_checks')
@@ -0,0 +1,25 @@
+"""Checks that a conversion's frame carries the output schema, shared by the transform tests."""
+import pandas as pd
+from src.column_mapping import OUTPUT_DTYPES
+
+
+def pandas_defaults(frame):
+    """The frame as it was before the output schema: object labels and float64 numbers."""
+    return frame.astype({name: object if dtype == 'category' else 'float64'
+                         for name, dtype in frame.dtypes.items() if dtype != object})
+
+
+def assert_schema(frame):
+    # compared by name, since a categorical dtype also carries its categories
+    assert {name: dtype.name for name, dtype in frame.dtypes.items()} == \
+        {name: pd.api.types.pandas_dtype(OUTPUT_DTYPES[name]).name for name in frame.columns}
+
+
+def assert_compact(frame):
+    """The schema's columns take a fraction of their default size, and the whole frame well under half."""
+    compact = frame.memory_usage(deep=True, index=False)
+    defaults = pandas_defaults(frame).memory_usage(deep=True, index=False)
+    typed = [name for name in frame.columns if OUTPUT_DTYPES[name] != object]
+    assert compact[typed].sum() * 8 < defaults[typed].sum()
+    # the rest is the per-VM strings - ids, names, IPs - which stay object
+    assert compact.sum() * 2 < defaults.sum()
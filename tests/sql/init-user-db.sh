@@ -3,7 +3,7 @@ set -e
 
 psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
 	CREATE USER inventorydbuser WITH ENCRYPTED PASSWORD 'password';
-	CREATE DATABASE INVENTORYDB;
+	CREATE DATABASE INVENTORYDB OWNER inventorydbuser;
 	GRANT ALL PRIVILEGES ON DATABASE INVENTORYDB TO inventorydbuser;
 	\connect "inventorydb";
 
@@ -61,6 +61,12 @@ CREATE TABLE "public"."workloads_tb" (
 ALTER TABLE ONLY "public"."projects_tb" ADD CONSTRAINT "projects_tb_userid_fkey" FOREIGN KEY (userid) REFERENCES users_tb(id) NOT DEFERRABLE;
 
 ALTER TABLE ONLY "public"."workloads_tb" ADD CONSTRAINT "workloads_tb_pid_fkey" FOREIGN KEY (pid) REFERENCES projects_tb(pid) NOT DEFERRABLE;
+
+-- indexes and later schema changes are versioned scripts under migrations/, applied by "flask migrate",
+-- which runs as inventorydbuser and so needs to own the tables
+ALTER TABLE "public"."projects_tb" OWNER TO inventorydbuser;
+ALTER TABLE "public"."users_tb" OWNER TO inventorydbuser;
+ALTER TABLE "public"."workloads_tb" OWNER TO inventorydbuser;
 GRANT ALL ON ALL TABLES IN SCHEMA public TO inventorydbuser;
 GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA public TO inventorydbuser;
 
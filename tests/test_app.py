@@ -28,3 +28,58 @@ def test_logout(client):
     assert response.status_code == 302  # Assuming logout redirects
     # Check if the response contains a redirect to the login page
     assert '/login' in response.headers['Location']
+
+def test_job_status_requires_login(client):
+    response = client.get('/jobs/0123456789abcdef')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+def test_job_rows_require_login(client):
+    response = client.get('/jobs/0123456789abcdef/rows?offset=0&limit=50')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+def test_sizing_requires_login(client):
+    response = client.get('/projects/1/sizing?hostCores=64')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+def test_jobs_are_only_shown_to_their_owner(monkeypatch):
+    from flask_login import login_user
+    from src.app import User, job_queue, user_batch, user_job
+    jobs = {'mine': {'id': 'mine', 'owner': 1}, 'theirs': {'id': 'theirs', 'owner': 2}}
+    monkeypatch.setattr(job_queue, 'get', jobs.get)
+    monkeypatch.setattr(job_queue, 'get_batch', lambda batch_id: [jobs[batch_id]] if batch_id in jobs else [])
+    with app.test_request_context():
+        login_user(User(id=1, username='sally'))
+        assert user_job('mine') == jobs['mine']
+        assert user_job('theirs') is None and user_job('unknown') is None
+        assert user_batch('mine') == [jobs['mine']]
+        assert user_batch('theirs') == []
+
+def test_unknown_and_unavailable_export_formats(monkeypatch):
+    import sys
+    import pandas as pd
+    from flask_login import login_user
+    from src.app import User, job_export, job_queue
+    monkeypatch.setattr(job_queue, 'get', {'mine': {'id': 'mine', 'owner': 1, 'status': 'done', 'file_name': 'x.xlsx'}}.get)
+    monkeypatch.setattr(job_queue, 'load_result', lambda job: pd.DataFrame({'vmId': ['vm-1']}))
+    # as if pyarrow were not installed
+    monkeypatch.setitem(sys.modules, 'pyarrow.parquet', None)
+    with app.test_request_context():
+        login_user(User(id=1, username='sally'))
+        assert job_export('mine', 'ods')[1] == 400
+        assert job_export('mine', 'parquet')[1] == 501
+
+def test_status_routes_are_only_served_to_the_host_or_a_token_holder(client, monkeypatch):
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/status/db-pool', environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 403
+
+    monkeypatch.setitem(app.config, 'STATUS_TOKEN', 's3cret')
+    assert client.get('/status/user-cache').status_code == 401
+    assert client.get('/status/user-cache', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/status/sizing-cache', headers={'Authorization': 'Bearer s3cret'}, environ_base={'REMOTE_ADDR': '10.0.0.5'})
+    assert response.status_code == 200
+    assert list(response.get_json()['processes'].values())[0]['hits'] == 0
+    response = client.get('/status/result-cache', headers={'Authorization': 'Bearer s3cret'})
+    assert list(response.get_json()['processes'].values())[0]['hitRatio'] is None
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from pandas import testing as pdtest
+from src.column_mapping import Column, SheetMapping
+
+MAPPING = SheetMapping(
+    Column('vmId', 'VM ID'),
+    Column('os', 'OS', fill='none specified'),
+    Column('vmdkTotal', 'Capacity MiB', 'Capacity MB', divisor=1024),
+    Column('cluster', 'Cluster'),
+    )
+
+
+def test_headers_lists_every_alias():
+    assert MAPPING.headers() == ['VM ID', 'OS', 'Capacity MiB', 'Capacity MB', 'Cluster']
+
+
+def test_apply_projects_fills_and_scales():
+    sheet = pd.DataFrame({'Extra': [1, 2], 'Capacity MB': [2048, 512], 'OS': [np.nan, 'Linux'], 'VM ID': ['vm-1', 'vm-2']})
+    expected = pd.DataFrame({'vmId': ['vm-1', 'vm-2'], 'os': ['none specified', 'Linux'], 'vmdkTotal': [2.0, 0.5]})
+    # Cluster is not in the sheet, so it is left out rather than added empty
+    pdtest.assert_frame_equal(MAPPING.apply(sheet), expected)
+
+
+def test_first_alias_present_wins():
+    sheet = pd.DataFrame({'VM ID': ['vm-1'], 'Capacity MB': [1024], 'Capacity MiB': [4096]})
+    assert MAPPING.apply(sheet)['vmdkTotal'].tolist() == [4.0]
+
+
+def test_plan_resolved_once_per_header():
+    header = ['VM ID', 'Capacity MiB']
+    assert MAPPING.resolve(header) is MAPPING.resolve(list(header))
@@ -0,0 +1,85 @@
+import gzip
+import zlib
+from flask import Response
+from werkzeug.http import parse_accept_header
+from src.app import app
+from src.compression import compress_response, gzip_chunks
+
+
+def test_text_is_gzipped_for_clients_that_accept_it():
+    with app.test_client() as client:
+        plain = client.get('/metrics')
+        compressed = client.get('/metrics', headers={'Accept-Encoding': 'gzip, deflate'})
+        refused = client.get('/metrics', headers={'Accept-Encoding': 'gzip;q=0'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert b'# TYPE' in gzip.decompress(compressed.data)
+    assert len(compressed.data) < len(plain.data)
+    assert 'Content-Encoding' not in refused.headers
+
+
+def test_pages_are_never_gzipped():
+    # a page's CSRF token sits next to text from the request, which compression would leak (BREACH)
+    with app.test_client() as client:
+        page = client.get('/login', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in page.headers
+    assert b'One of us' in page.data
+    assert 'Content-Encoding' not in compress_response(Response('x' * 4096, mimetype='text/html'), parse_accept_header('gzip'), 6, 1024).headers
+
+
+def test_small_and_binary_bodies_are_sent_as_they_are():
+    small = compress_response(Response('{}', mimetype='application/json'), parse_accept_header('gzip'), 6, 1024)
+    assert 'Content-Encoding' not in small.headers and small.get_data() == b'{}'
+
+    workbook = compress_response(Response(b'PK' * 4096, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+                                 parse_accept_header('gzip'), 6, 1024)
+    assert 'Content-Encoding' not in workbook.headers
+
+    off = compress_response(Response('x' * 4096, mimetype='text/csv'), parse_accept_header('gzip'), 0, 1024)
+    assert 'Content-Encoding' not in off.headers
+
+
+def test_streamed_bodies_are_compressed_chunk_by_chunk():
+    closed = []
+
+    def body():
+        try:
+            yield 'vmId,vCpu\n'
+            yield ''
+            yield 'vm-1,4\n' * 50
+        finally:
+            closed.append(True)
+
+    response = compress_response(Response(body(), mimetype='text/csv'), parse_accept_header('gzip'), 6, 1024)
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    chunks = iter(response.response)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # each chunk can be decompressed on arrival, before the next one is produced
+    assert decompressor.decompress(next(chunks)) == b'vmId,vCpu\n'
+    rest = b''.join(decompressor.decompress(chunk) for chunk in chunks)
+    assert rest == b'vm-1,4\n' * 50
+    response.close()
+    assert closed == [True]
+
+
+def test_a_stream_closed_before_it_starts_closes_its_body():
+    class Body:
+        closed = False
+
+        def __iter__(self):
+            yield 'never sent'
+
+        def close(self):
+            self.closed = True
+
+    body = Body()
+    response = compress_response(Response(body, mimetype='text/csv'), parse_accept_header('gzip'), 6, 1024)
+    response.close()
+    assert body.closed
+
+
+def test_gzip_chunks_makes_one_gzip_stream():
+    assert gzip.decompress(b''.join(gzip_chunks([b'a' * 100, 'b' * 100], 6))) == b'a' * 100 + b'b' * 100
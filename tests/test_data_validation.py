@@ -0,0 +1,72 @@
+import pytest
+from openpyxl import Workbook
+from pandas import testing
+from src.data_validation import OLE_MAGIC, filetype_validation, rv_sheets, sniff_file
+from src.transform_lova import lova_conversion
+from src.transform_rvtools import rvtools_conversion
+
+
+def write_sheets(path, sheet_names):
+    wb = Workbook(write_only=True)
+    for name in sheet_names:
+        wb.create_sheet(name).append(['VM ID'])
+    wb.save(path)
+
+
+@pytest.mark.parametrize('file_name, file_type', [
+    ('liveoptics_file_sample.xlsx', 'live-optics'),
+    ('rvtools_file_sample.xlsx', 'rv-tools'),
+    # the same samples saved in the older binary format
+    ('liveoptics_file_sample.xls', 'live-optics'),
+    ('rvtools_file_sample.xls', 'rv-tools'),
+])
+def test_samples_match_with_full_confidence(file_name, file_type):
+    sniff = sniff_file('tests/test_files/', file_name)
+    assert (sniff.file_type, sniff.confidence) == (file_type, 1.0)
+    assert filetype_validation('tests/test_files/', file_name) == file_type
+
+
+def test_missing_conversion_sheet_is_invalid():
+    # vInfo is missing, so there is nothing to convert
+    assert sniff_file('tests/test_files/', 'bad_rvtools_file.xlsx').file_type == 'invalid'
+
+
+def test_missing_unused_sheets_lower_confidence():
+    sniff = sniff_file('tests/test_files/', 'bad_lova_file.xlsx')
+    assert sniff.file_type == 'live-optics'
+    assert sniff.confidence == pytest.approx(0.8)
+
+
+def test_extra_and_reordered_sheets_still_match(tmp_path):
+    write_sheets(tmp_path / 'newer.xlsx', ['vNewSheet'] + rv_sheets[::-1])
+    assert sniff_file(str(tmp_path), 'newer.xlsx').file_type == 'rv-tools'
+
+
+def test_too_few_known_sheets_is_invalid(tmp_path):
+    write_sheets(tmp_path / 'minimal.xlsx', ['VMs', 'VM Performance', 'Summary'])
+    sniff = sniff_file(str(tmp_path), 'minimal.xlsx')
+    assert (sniff.file_type, sniff.confidence) == ('invalid', 0.0)
+    assert sniff.sheet_names == ['VMs', 'VM Performance', 'Summary']
+
+
+@pytest.mark.parametrize('content', [b'not a workbook', OLE_MAGIC + b'\x00' * 504, b'PK\x03\x04 truncated'])
+def test_unreadable_files_are_invalid(tmp_path, content):
+    (tmp_path / 'upload.xlsx').write_bytes(content)
+    assert sniff_file(str(tmp_path), 'upload.xlsx').file_type == 'invalid'
+
+
+def test_sheet_ids_are_reused_by_the_conversion():
+    sniff = sniff_file('tests/test_files/', 'rvtools_file_sample.xlsx')
+    assert list(sniff.sheet_ids) == rv_sheets
+    vm_data_df = rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx', sheet_ids=sniff.sheet_ids)
+    assert len(vm_data_df) == 5
+
+
+@pytest.mark.parametrize('file_name, conversion', [
+    ('liveoptics_file_sample', lova_conversion),
+    ('rvtools_file_sample', rvtools_conversion),
+])
+def test_xls_converts_like_xlsx(file_name, conversion):
+    xls = conversion(input_path='tests/test_files/', file_name=f'{file_name}.xls')
+    xlsx = conversion(input_path='tests/test_files/', file_name=f'{file_name}.xlsx')
+    testing.assert_frame_equal(xls, xlsx)
@@ -0,0 +1,128 @@
+import io
+import time
+import pandas as pd
+import pytest
+from pandas import testing as pdtest
+from sqlalchemy import create_engine
+from src.app import Workload
+from src.exports import csv_stream, frame_chunks, get_exporter, parquet_stream, query_chunks, workload_export_query, xlsx_stream
+from src.persistence import persist_workloads
+from src.transform_lova import transform_vms
+from src.transform_rvtools import rvtools_conversion
+from tests.benchmark_tools import peak_traced
+from tests.workbook_generator import synthetic_vms_sheet
+
+TABLE = Workload.__table__
+
+
+@pytest.fixture(scope='module')
+def vm_data_df():
+    return pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+
+
+def test_csv_matches_pandas(vm_data_df):
+    streamed = b''.join(csv_stream(frame_chunks(vm_data_df, rows=2)))
+    assert streamed.decode('utf-8') == vm_data_df.to_csv(index=False)
+
+
+def test_xlsx_reads_back(vm_data_df):
+    streamed = b''.join(xlsx_stream(frame_chunks(vm_data_df, rows=2)))
+    read_back = pd.read_excel(io.BytesIO(streamed), sheet_name='VMs')
+    # Excel keeps no dtypes, so categorical labels read back as plain strings
+    labels = vm_data_df.select_dtypes('category').columns
+    pdtest.assert_frame_equal(read_back, vm_data_df.astype(dict.fromkeys(labels, object)), check_dtype=False)
+
+
+def test_exports_stream_chunk_by_chunk(vm_data_df):
+    consumed = []
+
+    def chunks():
+        for chunk in frame_chunks(vm_data_df, rows=1):
+            consumed.append(len(chunk))
+            yield chunk
+
+    for writer in (csv_stream, xlsx_stream):
+        consumed.clear()
+        stream = writer(chunks())
+        first = next(stream)
+        while not first:
+            first = next(stream)
+        # bytes go out before the rest of the rows have been read
+        assert len(consumed) < len(vm_data_df)
+        list(stream)
+
+
+def test_project_rows_are_read_in_chunks(vm_data_df):
+    engine = create_engine('sqlite://')
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        persist_workloads(conn, TABLE, 3, vm_data_df)
+
+    chunks = list(query_chunks(engine, workload_export_query(TABLE, 3), rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    exported = pd.concat(chunks, ignore_index=True)
+    assert exported['vmId'].tolist() == vm_data_df['vmId'].tolist()
+    assert exported['vmdkTotal'].tolist() == pytest.approx(vm_data_df['vmdkTotal'].tolist())
+
+    # a project without workloads still exports its header
+    assert list(next(query_chunks(engine, workload_export_query(TABLE, 4))).columns) == list(exported.columns)
+
+
+def test_parquet_reads_back(vm_data_df):
+    pytest.importorskip('pyarrow')
+    streamed = b''.join(parquet_stream(frame_chunks(vm_data_df, rows=2)))
+    pdtest.assert_frame_equal(pd.read_parquet(io.BytesIO(streamed)), vm_data_df)
+
+
+def test_parquet_columns_empty_in_the_first_chunk(vm_data_df):
+    pytest.importorskip('pyarrow')
+    # the first rows of a batch may come from an export without some of the columns
+    sparse = vm_data_df.copy()
+    sparse.loc[:1, ['vinfo_used', 'vCpu', 'vCenter']] = None
+    streamed = b''.join(parquet_stream(frame_chunks(sparse, rows=2)))
+    pdtest.assert_frame_equal(pd.read_parquet(io.BytesIO(streamed)), sparse)
+
+
+def test_parquet_of_project_rows(vm_data_df):
+    pytest.importorskip('pyarrow')
+    engine = create_engine('sqlite://')
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        persist_workloads(conn, TABLE, 3, vm_data_df.assign(vCpu=vm_data_df['vCpu'].where(vm_data_df.index > 1)))
+
+    # rows read back from the database are plain objects and float64s, but export with the output schema
+    streamed = b''.join(parquet_stream(query_chunks(engine, workload_export_query(TABLE, 3), rows=2)))
+    read_back = pd.read_parquet(io.BytesIO(streamed))
+    assert str(read_back['vCpu'].dtype) == 'Int16' and read_back['vCpu'].isna().sum() == 2
+    assert str(read_back['cluster'].dtype) == 'category' and str(read_back['vmdkTotal'].dtype) == 'float32'
+    assert read_back['vmId'].tolist() == vm_data_df['vmId'].tolist()
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match='unknown export format'):
+        get_exporter('ods')
+
+
+def drain(writer, vm_data_df):
+    for _ in writer(frame_chunks(vm_data_df)):
+        pass
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('writer', [csv_stream, xlsx_stream])
+def test_export_memory_is_constant(writer):
+    small, large = transform_vms(synthetic_vms_sheet(20_000)), transform_vms(synthetic_vms_sheet(100_000))
+
+    start = time.perf_counter()
+    stream = writer(frame_chunks(large))
+    next(stream)
+    first_bytes = time.perf_counter() - start
+    size = sum(len(data) for data in stream)
+    small_peak, large_peak = peak_traced(drain, writer, small), peak_traced(drain, writer, large)
+
+    print()
+    print(f'{writer.__name__}: {size / 1e6:.1f} MB for 100k VMs, first bytes after {first_bytes * 1000:.0f}ms, '
+          f'peak {small_peak / 1e6:.1f} MB allocated for 20k VMs, {large_peak / 1e6:.1f} MB for 100k')
+    # a chunk's worth of memory, whatever the number of rows
+    assert large_peak < 1.5 * small_peak
+    assert first_bytes < 0.5
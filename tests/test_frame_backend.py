@@ -0,0 +1,48 @@
+import importlib.util
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import testing as pdtest
+from src.frame_backend import PandasBackend, get_backend
+from src.transform_lova import lova_conversion
+from src.transform_rvtools import rvtools_conversion
+
+# in tests/requirements.txt; skipped test by test, so the checks that need no Polars still run without it
+needs_polars = pytest.mark.skipif(importlib.util.find_spec('polars') is None, reason='needs polars')
+
+SAMPLES = [
+    (lova_conversion, 'src/input/', 'liveoptics_file.xlsx'),
+    (rvtools_conversion, 'src/input/', 'rvtools_file.xlsx'),
+    (lova_conversion, 'tests/test_files/', 'liveoptics_file_sample.xlsx'),
+    (rvtools_conversion, 'tests/test_files/', 'rvtools_file_sample.xlsx'),
+]
+
+
+@needs_polars
+@pytest.mark.parametrize('conversion, input_path, file_name', SAMPLES)
+def test_backends_convert_samples_equally(conversion, input_path, file_name):
+    expected = conversion(input_path=input_path, file_name=file_name, backend='pandas')
+    actual = conversion(input_path=input_path, file_name=file_name, backend='polars')
+    pdtest.assert_frame_equal(actual, expected)
+
+
+@needs_polars
+def test_group_sum_matches_pandas():
+    df = pd.DataFrame({'vmId': ['vm-3', 'vm-1', None, 'vm-3', 'vm-2', 'vm-1'],
+                       'vmdkTotal': [1.0, 2.0, 4.0, np.nan, 8.0, 16.0]})
+    pdtest.assert_frame_equal(get_backend('polars').group_sum(df, 'vmId', 'vmdkTotal'),
+                              PandasBackend().group_sum(df, 'vmId', 'vmdkTotal'))
+
+
+@needs_polars
+def test_left_merge_matches_pandas():
+    left = pd.DataFrame({'vmId': ['vm-1', 'vm-2', np.nan, 'vm-4', 'vm-1'], 'vCpu': [1, 2, 3, 4, 5]})
+    right = pd.DataFrame({'vmId': ['vm-4', 'vm-1', np.nan, 'vm-1', 'vm-9'], 'readIOPS': [10, 20, 30, 40, 50],
+                          'note': ['a', 'b', 'c', 'd', 'e']})
+    pdtest.assert_frame_equal(get_backend('polars').left_merge(left, right, 'vmId'),
+                              PandasBackend().left_merge(left, right, 'vmId'))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend('spark')
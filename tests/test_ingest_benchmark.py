@@ -0,0 +1,193 @@
+"""Throughput and peak memory of sniff, convert, persist and render at 1k, 10k and 100k VMs, against a stored baseline.
+
+The generator tests always run; the benchmarks are deselected by default and need pytest-benchmark,
+from tests/requirements.txt - run them with
+`python -m pytest -c tests/pytest.ini tests/test_ingest_benchmark.py -k slow`.
+Set BENCH_SIZES to a comma-separated list of VM counts to run other sizes.
+
+Persist saves a snapshot into an emptied project with apply_snapshot, as the save route does, in an
+in-memory SQLite database; set BENCH_DATABASE_URI to a PostgreSQL database to time COPY instead.
+Render streams the results page for a finished job, as the success route sends it.
+
+Each benchmark records VMs per second and peak traced memory in the run's extra_info, and fails
+when either is worse than tests/benchmarks/baseline.json by more than BENCH_TOLERANCE (default 0.3,
+i.e. 30%). Stages without a baseline entry only report. The baseline belongs to the machine it was
+recorded on: rerun with BENCH_UPDATE_BASELINE=1 to record the current machine's results instead.
+"""
+import os
+import uuid
+import pytest
+from flask_login import login_user
+from flask_wtf import FlaskForm
+from pandas import testing as pdtest
+from sqlalchemy import create_engine, delete, insert, select
+from src.app import Project, SaveWorkloadsForm, Snapshot, User, Workload, WorkloadChange, app, db, job_queue, success
+from src.data_validation import sniff_file
+from src.jobs import CONVERSIONS
+from src.snapshots import apply_snapshot
+from tests.benchmark_tools import check_baseline, peak_traced
+from tests.workbook_generator import write_liveoptics_workbook, write_rvtools_workbook
+
+BENCH_SIZES = [int(size) for size in os.getenv('BENCH_SIZES', '1000,10000,100000').split(',')]
+BENCH_DATABASE_URI = os.getenv('BENCH_DATABASE_URI', 'sqlite://')
+
+WORKLOADS, SNAPSHOTS, CHANGES = Workload.__table__, Snapshot.__table__, WorkloadChange.__table__
+
+WRITERS = {
+    'rv-tools': write_rvtools_workbook,
+    'live-optics': write_liveoptics_workbook,
+}
+
+
+@pytest.mark.parametrize('file_type', list(WRITERS))
+def test_generated_workbooks_convert_under_both_units(tmp_path, file_type):
+    frames = []
+    for unit in ('MiB', 'MB'):
+        file_name = f'{file_type}-{unit}.xlsx'
+        WRITERS[file_type](str(tmp_path / file_name), vms=50, unit=unit)
+        sniff = sniff_file(str(tmp_path), file_name)
+        assert sniff.file_type == file_type
+        assert sniff.confidence == 1
+
+        frame = CONVERSIONS[file_type](input_path=str(tmp_path), file_name=file_name, sheet_ids=sniff.sheet_ids)
+        assert len(frame) == 50
+        assert frame['vmdkTotal'].notna().all()
+        frames.append(frame)
+    # the same sizes under either header give the same consolidated frame
+    pdtest.assert_frame_equal(*frames)
+
+
+@pytest.fixture(scope='module')
+def workbooks(tmp_path_factory):
+    """Generated workbooks by (file type, VM count), written on first use and shared by the module's benchmarks."""
+    folder = str(tmp_path_factory.mktemp('ingest-bench'))
+    written = {}
+
+    def workbook(file_type, vms):
+        if (file_type, vms) not in written:
+            file_name = f'{file_type}-{vms}.xlsx'
+            WRITERS[file_type](os.path.join(folder, file_name), vms=vms)
+            written[file_type, vms] = (folder, file_name)
+        return written[file_type, vms]
+    return workbook
+
+
+@pytest.fixture(scope='module')
+def converted(workbooks):
+    frames = {}
+
+    def frame(file_type, vms):
+        if (file_type, vms) not in frames:
+            input_path, file_name = workbooks(file_type, vms)
+            frames[file_type, vms] = CONVERSIONS[file_type](input_path=input_path, file_name=file_name)
+        return frames[file_type, vms]
+    return frame
+
+
+@pytest.fixture(scope='module')
+def project_database():
+    """An engine on the benchmark database and the pid of a project created in it for the module."""
+    engine = create_engine(BENCH_DATABASE_URI)
+    db.metadata.create_all(engine)
+    # unique, as a shared database may hold another run's project
+    name = f'bench-{uuid.uuid4().hex[:8]}'
+    with engine.begin() as conn:
+        userid = conn.execute(insert(User.__table__).values(username=name, password='')).inserted_primary_key[0]
+        pid = conn.execute(insert(Project.__table__).values(userid=userid, projectname=name)).inserted_primary_key[0]
+    yield engine, pid
+    with engine.begin() as conn:
+        empty_project(conn, pid)
+        conn.execute(delete(Project.__table__).where(Project.__table__.c.pid == pid))
+        conn.execute(delete(User.__table__).where(User.__table__.c.id == userid))
+    engine.dispose()
+
+
+def empty_project(conn, pid):
+    snapshotids = select(SNAPSHOTS.c.snapshotid).where(SNAPSHOTS.c.pid == pid)
+    conn.execute(delete(CHANGES).where(CHANGES.c.snapshotid.in_(snapshotids)))
+    conn.execute(delete(SNAPSHOTS).where(SNAPSHOTS.c.pid == pid))
+    conn.execute(delete(WORKLOADS).where(WORKLOADS.c.pid == pid))
+
+
+class ProjectlessSaveForm(SaveWorkloadsForm):
+    """The save form without the user's projects to choose from, which would need the application database."""
+
+    def __init__(self, *args, **kwargs):
+        FlaskForm.__init__(self, *args, **kwargs)
+        self.project.choices = []
+
+
+def run_benchmark(benchmark, key, vms, func, *args, setup_args=None, rounds=None):
+    """Time `func`, trace one more run for peak memory, then record and check both against the baseline."""
+    if rounds is None:
+        rounds = 3 if vms <= 10_000 else 1
+    if setup_args is None:
+        result = benchmark.pedantic(func, args=args, rounds=rounds, iterations=1)
+        peak = peak_traced(func, *args)
+    else:
+        result = benchmark.pedantic(func, setup=lambda: (setup_args(), {}), rounds=rounds, iterations=1)
+        peak = peak_traced(func, *setup_args())
+
+    measured = {'vms_per_second': vms / benchmark.stats.stats.min, 'peak_mib': peak / 2 ** 20}
+    benchmark.extra_info.update(measured)
+    print()
+    print(f'{key}: {measured["vms_per_second"]:,.0f} VMs/s, {measured["peak_mib"]:.1f} MiB peak')
+    check_baseline(key, measured)
+    return result
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('vms', BENCH_SIZES)
+@pytest.mark.parametrize('file_type', list(WRITERS))
+def test_sniff_benchmark(benchmark, workbooks, file_type, vms):
+    # sniffing only reads the manifest, so it takes well under a millisecond at any size; many rounds steady the minimum
+    sniff = run_benchmark(benchmark, f'{file_type}/sniff/{vms}', vms, sniff_file, *workbooks(file_type, vms), rounds=50)
+    assert sniff.file_type == file_type
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('vms', BENCH_SIZES)
+@pytest.mark.parametrize('file_type', list(WRITERS))
+def test_convert_benchmark(benchmark, workbooks, file_type, vms):
+    input_path, file_name = workbooks(file_type, vms)
+
+    def convert():
+        return CONVERSIONS[file_type](input_path=input_path, file_name=file_name)
+    assert len(run_benchmark(benchmark, f'{file_type}/convert/{vms}', vms, convert)) == vms
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('vms', BENCH_SIZES)
+@pytest.mark.parametrize('file_type', list(WRITERS))
+def test_persist_benchmark(benchmark, converted, project_database, file_type, vms):
+    vm_data_df = converted(file_type, vms)
+    engine, pid = project_database
+
+    def emptied():
+        with engine.begin() as conn:
+            empty_project(conn, pid)
+        return ()
+
+    def persist():
+        with engine.begin() as conn:
+            return apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, pid, vm_data_df)
+    assert run_benchmark(benchmark, f'{file_type}/persist/{vms}', vms, persist, setup_args=emptied)['added'] == vms
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('vms', BENCH_SIZES)
+@pytest.mark.parametrize('file_type', list(WRITERS))
+def test_render_benchmark(benchmark, monkeypatch, converted, file_type, vms):
+    vm_data_df = converted(file_type, vms)
+    job = {'id': 'bench', 'owner': 1, 'status': 'done', 'file_name': 'bench.xlsx', 'file_type': file_type}
+    monkeypatch.setattr(job_queue, 'get', {job['id']: job}.get)
+    monkeypatch.setattr(job_queue, 'has_result', lambda job: True)
+    monkeypatch.setattr(job_queue, 'load_result', lambda job: vm_data_df)
+    monkeypatch.setattr('src.app.SaveWorkloadsForm', ProjectlessSaveForm)
+
+    def render():
+        # the whole page as the success route streams it, with the results table's first rows
+        with app.test_request_context(f'/success/uploads/{file_type}/bench.xlsx?job=bench'):
+            login_user(User(id=1, username='bench'))
+            return success('uploads', file_type, 'bench.xlsx').get_data(as_text=True)
+    assert vm_data_df['vmName'].iloc[0] in run_benchmark(benchmark, f'{file_type}/render/{vms}', vms, render)
@@ -0,0 +1,127 @@
+import sqlite3
+import time
+import pandas as pd
+import pytest
+from pandas import testing as pdtest
+from src.jobs import JobQueue, QueueFull
+from src.transform_rvtools import rvtools_conversion
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), str(tmp_path / 'results'), workers=1, max_queued=1)
+    yield queue
+    queue.shutdown()
+
+
+def wait_for(queue, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_conversion_runs_in_background(job_queue):
+    job_id = job_queue.submit('tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools')
+    assert job_queue.get(job_id)['status'] in ('queued', 'running', 'done')
+
+    job = wait_for(job_queue, job_id)
+    assert job['status'] == 'done'
+    expected = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+    pdtest.assert_frame_equal(job_queue.load_result(job), expected)
+
+
+def test_resubmitted_file_is_served_from_cache(job_queue):
+    wait_for(job_queue, job_queue.submit('tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools'))
+
+    job = job_queue.get(job_queue.submit('tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools'))
+    assert job['status'] == 'done'
+    # showing the result checks the cache again, which is not another lookup
+    assert job_queue.has_result(job)
+    assert job_queue.cache.stats()['hits'] == 1
+    assert job_queue.cache.stats()['misses'] == 1
+
+
+def test_queue_depth_limit(job_queue):
+    job_id = job_queue.submit('tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools')
+    with pytest.raises(QueueFull):
+        job_queue.submit('tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools')
+    # its upload is in use until the conversion ends
+    assert job_queue.active_inputs() in ([], ['tests/test_files/'])
+    wait_for(job_queue, job_id)
+    assert job_queue.active_inputs() == []
+
+
+def test_failed_conversion_is_recorded(job_queue, tmp_path):
+    (tmp_path / 'corrupt.xlsx').write_bytes(b'not a workbook')
+    job = wait_for(job_queue, job_queue.submit(str(tmp_path), 'corrupt.xlsx', 'rv-tools'))
+    assert job['status'] == 'failed'
+    assert job['error']
+
+
+def test_unknown_job(job_queue):
+    assert job_queue.get('not-a-job') is None
+
+
+def test_batch_is_converted_and_combined(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), str(tmp_path / 'results'), workers=2, max_queued=2)
+    try:
+        batch = queue.submit_batch([
+            {'input_path': 'tests/test_files/', 'file_name': 'rvtools_file_sample.xlsx', 'file_type': 'rv-tools'},
+            {'input_path': 'tests/test_files/', 'file_name': 'bad_rvtools_file.xlsx', 'file_type': 'invalid'},
+            {'input_path': 'tests/test_files/', 'file_name': 'liveoptics_file_sample.xlsx', 'file_type': 'live-optics'},
+        ])
+        jobs = [wait_for(queue, job['id']) for job in queue.get_batch(batch)]
+        assert [(job['file_name'], job['status']) for job in jobs] == [
+            ('rvtools_file_sample.xlsx', 'done'), ('bad_rvtools_file.xlsx', 'failed'), ('liveoptics_file_sample.xlsx', 'done')]
+
+        combined = queue.load_batch(jobs)
+        assert combined.columns[0] == 'sourceFile'
+        assert combined['sourceFile'].tolist() == ['rvtools_file_sample.xlsx'] * 5 + ['liveoptics_file_sample.xlsx'] * 5
+        assert combined['vCenter'].iloc[:5].tolist() == ['vcenter.company.com'] * 5
+        # RVTools-only columns, and the vCenter LiveOptics does not name, are empty for the LiveOptics rows
+        assert combined['vinfo_used'].iloc[5:].isna().all() and combined['vCenter'].iloc[5:].isna().all()
+        assert queue.load_batch(jobs) is combined
+    finally:
+        queue.shutdown()
+
+
+def test_batch_needs_room_for_every_file(job_queue):
+    upload = {'input_path': 'tests/test_files/', 'file_name': 'rvtools_file_sample.xlsx', 'file_type': 'rv-tools'}
+    with pytest.raises(QueueFull):
+        job_queue.submit_batch([upload, dict(upload, file_name='liveoptics_file_sample.xlsx', file_type='live-optics')])
+    assert job_queue.get_batch('not-a-batch') == []
+
+
+def test_jobs_and_batches_record_their_owner(job_queue, tmp_path):
+    job = wait_for(job_queue, job_queue.submit('tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools', owner=7))
+    assert job['owner'] == 7
+    batch = job_queue.submit_batch([{'input_path': str(tmp_path), 'file_name': 'notes.xlsx', 'file_type': 'invalid'}], owner=8)
+    assert [job['owner'] for job in job_queue.get_batch(batch)] == [8]
+
+
+def test_orphaned_jobs_are_failed_and_old_ones_deleted(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    queue = JobQueue(db_path, str(tmp_path / 'results'), workers=1)
+    queue._insert('crashed', 'running', 'tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools', 'digest')
+    queue._insert('stale', 'queued', 'tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools', 'digest')
+    queue._insert('expired', 'done', 'tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools', 'digest')
+    conn = sqlite3.connect(db_path)
+    with conn:
+        # a web process that cannot exist (past Linux's pid limit), a job not heard of for two hours and one queued two weeks ago
+        conn.execute("UPDATE jobs SET process = 4194305 WHERE id = 'crashed'")
+        conn.execute("UPDATE jobs SET updated = updated - 7200 WHERE id = 'stale'")
+        conn.execute("UPDATE jobs SET created = created - 14 * 24 * 3600 WHERE id = 'expired'")
+    conn.close()
+    queue._insert('live', 'running', 'tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools', 'digest')
+
+    restarted = JobQueue(db_path, str(tmp_path / 'results'), workers=1)
+    assert restarted.get('crashed')['status'] == 'failed' and restarted.get('crashed')['error']
+    assert restarted.get('stale')['status'] == 'failed'
+    assert restarted.get('expired') is None
+    # still running in this process
+    assert restarted.get('live')['status'] == 'running'
+    assert restarted.active_inputs() == ['tests/test_files/']
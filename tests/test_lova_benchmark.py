@@ -0,0 +1,63 @@
+"""Throughput of the vectorized LiveOptics VM transform against the original row-wise implementation.
+
+The parity test always runs; the benchmarks are deselected by default - run them with
+`python -m pytest -c tests/pytest.ini tests/test_lova_benchmark.py -k slow`.
+"""
+import time
+import pytest
+from pandas import testing as pdtest
+from src.transform_lova import transform_vms
+from tests.workbook_generator import synthetic_vms_sheet
+
+
+def legacy_transform_vms(vmdata_df):
+    """The VMs-sheet half of lova_conversion before it was vectorized, kept as the reference."""
+    keep_columns = ['Cluster','Datacenter','Guest IP1','Guest IP2','Guest IP3','Guest IP4','VM OS','Guest Hostname', 'Power State', 'Virtual CPU', 'VM Name', 'MOB ID']
+    if 'Virtual Disk Size (MiB)' in vmdata_df:
+        keep_columns.extend(['Virtual Disk Size (MiB)','Virtual Disk Used (MiB)', 'Provisioned Memory (MiB)'])
+    else:
+        keep_columns.extend(['Virtual Disk Size (MB)','Virtual Disk Used (MB)', 'Provisioned Memory (MB)'])
+    vmdata_df = vmdata_df.filter(items= keep_columns, axis= 1)
+    vmdata_df.rename(columns = {'MOB ID':'vmId', 'VM Name':'vmName', 'VM OS':'os', 'Guest Hostname':'os_name', 'Power State':'vmState',
+                                'Virtual CPU':'vCpu', 'Cluster':'cluster', 'Datacenter':'virtualDatacenter'}, inplace = True)
+    if 'Virtual Disk Size (MiB)' in vmdata_df:
+        vmdata_df.rename(columns = {'Provisioned Memory (MiB)':'vRam', 'Virtual Disk Size (MiB)':'vmdkTotal', 'Virtual Disk Used (MiB)':'vmdkUsed'}, inplace = True)
+    else:
+        vmdata_df.rename(columns = {'Provisioned Memory (MB)':'vRam', 'Virtual Disk Size (MB)':'vmdkTotal', 'Virtual Disk Used (MB)':'vmdkUsed'}, inplace = True)
+    fillna_values = {"Guest IP1": "no ip", "Guest IP2": "no ip", "Guest IP3": "no ip", "Guest IP4": "no ip", "os": "none specified"}
+    vmdata_df.fillna(value=fillna_values, inplace = True)
+    vmdata_df['ip_addresses'] = vmdata_df['Guest IP1'].map(str)+ ', ' + vmdata_df['Guest IP2'].map(str)+ ', ' + vmdata_df['Guest IP3'].map(str)+ ', ' + vmdata_df['Guest IP4'].map(str)
+    vmdata_df['ip_addresses'] = vmdata_df.ip_addresses.str.replace(', no ip' , '')
+    vmdata_df.drop(['Guest IP1', 'Guest IP2', 'Guest IP3', 'Guest IP4'], axis=1, inplace=True)
+    vmdata_df['vmdkUsed'] = vmdata_df['vmdkUsed']/1024
+    vmdata_df['vmdkTotal'] = vmdata_df['vmdkTotal']/1024
+    vmdata_df['vRam'] = vmdata_df['vRam']/1024
+    vmdata_df.round({'vmdkUsed':0,'vmdkTotal':0,'vRam':0})
+    return vmdata_df
+
+
+@pytest.mark.parametrize('unit', ['MiB', 'MB'])
+def test_vectorized_transform_matches_legacy(unit):
+    vmdata_df = synthetic_vms_sheet(2000, unit)
+    # the legacy transform predates the (always empty) vCenter column
+    pdtest.assert_frame_equal(transform_vms(vmdata_df).drop(columns='vCenter'), legacy_transform_vms(vmdata_df))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('rows', [10_000, 100_000, 1_000_000])
+def test_vectorized_transform_benchmark(rows):
+    vmdata_df = synthetic_vms_sheet(rows)
+
+    def best_of(func, repeat=3):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(vmdata_df)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    legacy = best_of(legacy_transform_vms)
+    vectorized = best_of(transform_vms)
+    print()
+    print(f'{rows} rows: legacy {rows / legacy:,.0f} rows/s, vectorized {rows / vectorized:,.0f} rows/s ({legacy / vectorized:.1f}x)')
+    assert vectorized < legacy
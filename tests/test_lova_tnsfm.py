@@ -1,13 +1,24 @@
 import pandas as pd
 from pandas import testing as pdtest
+from src.column_mapping import apply_output_schema
 from src.transform_lova import lova_conversion
+from tests.schema_checks import assert_compact, assert_schema
+from tests.workbook_generator import write_liveoptics_workbook
 
 def test_lova_transform():
-    target_df = pd.read_csv('tests/test_files/lova_expected_df.csv')
+    target_df = apply_output_schema(pd.read_csv('tests/test_files/lova_expected_df.csv', dtype={'vCenter': object}))
 
     file_name = 'liveoptics_file_sample.xlsx'
     input_path = 'tests/test_files/'
     describe_params = {"file_name":file_name, "input_path":input_path}
     source_df = pd.DataFrame(lova_conversion(**describe_params))
 
-    pdtest.assert_frame_equal(source_df,target_df,check_dtype=False)
\ No newline at end of file
+    pdtest.assert_frame_equal(source_df,target_df)
+
+
+def test_output_schema_and_memory(tmp_path):
+    write_liveoptics_workbook(str(tmp_path / 'liveoptics.xlsx'), vms=2000, filler_columns=0)
+    vm_data_df = lova_conversion(input_path=str(tmp_path), file_name='liveoptics.xlsx')
+
+    assert_schema(vm_data_df)
+    assert_compact(vm_data_df)
@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import pytest
+from src.jobs import JobQueue
+from src.metrics import JsonFormatter, ProcessShare, Registry, STAGE_SECONDS, collecting, record, request_id_var, stage
+
+
+def sample(text, line_start):
+    """The value of the exposition line starting with `line_start`, or None."""
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def stage_count(name, sheet=''):
+    return sample('\n'.join(STAGE_SECONDS.render()), f'inventory_stage_duration_seconds_count{{stage="{name}",sheet="{sheet}"}}') or 0
+
+
+def test_histogram_exposition():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Request latency.', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, route='/a"b')
+    registry.counter('rows_total', 'Rows.').inc(3)
+
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    # buckets are cumulative, and label values escaped
+    assert sample(text, 'latency_seconds_bucket{route="/a\\"b",le="0.1"}') == 1
+    assert sample(text, 'latency_seconds_bucket{route="/a\\"b",le="1.0"}') == 2
+    assert sample(text, 'latency_seconds_bucket{route="/a\\"b",le="+Inf"}') == 3
+    assert sample(text, 'latency_seconds_count{route="/a\\"b"}') == 3
+    assert sample(text, 'latency_seconds_sum{route="/a\\"b"}') == pytest.approx(5.55)
+    assert sample(text, 'rows_total') == 3
+
+
+def test_stages_inside_a_worker_are_collected():
+    before = stage_count('unit_test')
+    with collecting('req-1') as observations:
+        assert request_id_var.get() == 'req-1'
+        with stage('unit_test') as timer:
+            timer.rows = 7
+        record({'stage': 'unit_test', 'seconds': 0.5})
+    # nothing is recorded in this process until the web process applies them
+    assert stage_count('unit_test') == before
+    assert [(o['stage'], o.get('rows')) for o in observations] == [('unit_test', 7), ('unit_test', None)]
+    assert request_id_var.get() is None
+
+    with stage('unit_test'):
+        pass
+    assert stage_count('unit_test') == before + 1
+
+
+def test_failed_stages_are_recorded():
+    before = stage_count('unit_test_failure')
+    with pytest.raises(ZeroDivisionError):
+        with stage('unit_test_failure'):
+            1 / 0
+    assert stage_count('unit_test_failure') == before + 1
+
+
+def test_log_lines_carry_the_request_id():
+    record = logging.LogRecord('inventory.test', logging.INFO, __file__, 1, 'parsed %s', ('vInfo',), None)
+    record.fields = {'rows': 12}
+    token = request_id_var.set('req-2')
+    try:
+        entry = json.loads(JsonFormatter().format(record))
+    finally:
+        request_id_var.reset(token)
+    assert entry['message'] == 'parsed vInfo'
+    assert entry['request_id'] == 'req-2'
+    assert entry['rows'] == 12
+
+
+def test_conversion_stages_reach_the_web_process(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), str(tmp_path / 'results'), workers=1)
+    before = {(name, sheet): stage_count(name, sheet) for name, sheet in
+              (('read_sheet', 'vInfo'), ('group_sum', ''), ('merge', ''), ('convert', ''), ('queue_wait', ''))}
+    try:
+        queue.submit('tests/test_files/', 'rvtools_file_sample.xlsx', 'rv-tools')
+        # the worker's stages are applied by the job's done callback
+        deadline = time.time() + 60
+        while stage_count('convert') == before[('convert', '')] and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        queue.shutdown()
+
+    assert stage_count('read_sheet', 'vInfo') == before[('read_sheet', 'vInfo')] + 1
+    assert stage_count('group_sum') == before[('group_sum', '')] + 2
+    assert stage_count('merge') == before[('merge', '')] + 1
+    assert stage_count('queue_wait') == before[('queue_wait', '')] + 1
+
+
+def worker_registry(rows, peak, latencies):
+    """A registry as each web process has one, holding the given values."""
+    registry = Registry()
+    registry.counter('rows_total', 'Rows.', ('stage',)).inc(rows, stage='read')
+    registry.gauge('peak_bytes', 'Peak memory.').set(peak)
+    latency = registry.histogram('latency_seconds', 'Latency.', buckets=(1.0,))
+    for value in latencies:
+        latency.observe(value)
+    return registry
+
+
+def test_processes_sharing_a_folder_are_reported_together(tmp_path):
+    share = ProcessShare(worker_registry(2, 10, [0.5]), str(tmp_path), reports={'cache': lambda: {'hits': 1}})
+    # a worker that is still running, and one that has exited since it last published
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    for pid, registry, hits in ((os.getppid(), worker_registry(3, 20, [2.0]), 5), (exited.pid, worker_registry(4, 30, [0.1]), 7)):
+        (tmp_path / f'{pid}.json').write_text(json.dumps({'metrics': registry.snapshot(), 'reports': {'cache': {'hits': hits}}}))
+
+    text = share.render()
+    # counts of exited workers still count, or the totals would go back
+    assert sample(text, 'rows_total{stage="read"}') == 9
+    assert sample(text, 'latency_seconds_bucket{le="1.0"}') == 2
+    assert sample(text, 'latency_seconds_count') == 3
+    # levels are each running process's own
+    assert sample(text, f'peak_bytes{{pid="{os.getpid()}"}}') == 10
+    assert sample(text, f'peak_bytes{{pid="{os.getppid()}"}}') == 20
+    assert sample(text, f'peak_bytes{{pid="{exited.pid}"}}') is None
+    assert share.report('cache') == {str(os.getpid()): {'hits': 1}, str(os.getppid()): {'hits': 5}}
+
+
+def test_without_a_folder_only_this_process_is_reported():
+    share = ProcessShare(worker_registry(2, 10, [0.5]), reports={'cache': lambda: {'hits': 1}})
+    share.start()
+    assert sample(share.render(), 'rows_total{stage="read"}') == 2
+    assert share.report('cache') == {str(os.getpid()): {'hits': 1}}
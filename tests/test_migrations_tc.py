@@ -0,0 +1,94 @@
+"""The migrations apply cleanly, and the hot queries are answered from indexes rather than table scans."""
+from pathlib import Path
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import postgresql
+from src.app import Project, User, Workload
+from src.migrate import apply_migrations, available_migrations
+from src.persistence import WORKLOAD_COLUMNS
+from src.project_summary import summary_query
+from src.table_query import query_workloads
+from testcontainers.postgres import PostgresContainer
+
+USERS = 2000
+PROJECTS = 50
+WORKLOADS_PER_PROJECT = 1000
+
+
+@pytest.fixture(scope='session', autouse=True)
+def postgres_container():
+    """Fixture for the Postgres container and initialize the schema"""
+    postgres = PostgresContainer('postgres:16.4-alpine3.20')
+    script = Path(__file__).parent/ 'sql' / 'init-user-db.sh'
+    postgres.with_volume_mapping(host=str(script), container=f"/docker-entrypoint-initdb.d/{script.name}")
+    with postgres:
+        yield postgres
+
+
+@pytest.fixture(scope='module')
+def engine(postgres_container: PostgresContainer):
+    """Migrate the schema and fill it with enough rows for the planner to prefer indexes where they apply."""
+    engine = create_engine(postgres_container.get_connection_url())
+    assert apply_migrations(engine) == [version for version, _, _ in available_migrations()]
+    # a second run finds nothing left to do
+    assert apply_migrations(engine) == []
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users_tb (username, password) SELECT 'user' || i, 'not a real hash' FROM generate_series(1, :n) AS i"),
+                     {'n': USERS})
+        conn.execute(text("INSERT INTO projects_tb (userid, projectname) SELECT id, 'project ' || id FROM users_tb ORDER BY id LIMIT :n"),
+                     {'n': PROJECTS})
+        conn.execute(text("""INSERT INTO workloads_tb (pid, mobid, cluster, vmstate, vcpu, vmname)
+                             SELECT p.pid, 'vm-' || i, 'Cluster ' || (i / 100), 'poweredOn', 2, 'vm' || i
+                             FROM projects_tb AS p CROSS JOIN generate_series(1, :n) AS i"""),
+                     {'n': WORKLOADS_PER_PROJECT})
+        conn.execute(text('ANALYZE'))
+    yield engine
+
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM workloads_tb'))
+        conn.execute(text('DELETE FROM projects_tb'))
+        conn.execute(text('DELETE FROM users_tb'))
+    engine.dispose()
+
+
+def explain(engine, statement):
+    sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    with engine.connect() as conn:
+        return '\n'.join(row[0] for row in conn.execute(text(f'EXPLAIN {sql}')))
+
+
+def assert_index_scan(plan, index):
+    assert 'Seq Scan' not in plan, plan
+    assert index in plan, plan
+
+
+def test_login_looks_up_username_by_index(engine):
+    statement = select(User).where(User.username == 'user1500')
+    assert_index_scan(explain(engine, statement), 'users_tb_username_key')
+
+
+def test_users_projects_by_index(engine):
+    statement = select(Project).where(Project.userid == 25)
+    assert_index_scan(explain(engine, statement), 'projects_tb_userid_idx')
+
+
+def test_workload_page_and_count_by_index(engine):
+    table = Workload.__table__
+    count_query, page_query = query_workloads(table, 10, list(WORKLOAD_COLUMNS), 0, 50, None, False, {})
+    assert_index_scan(explain(engine, count_query), 'workloads_tb_pid_')
+    # the page may also walk the primary key in vmid order, but never the whole table
+    assert_index_scan(explain(engine, page_query), 'workloads_tb_')
+
+    count_query, _ = query_workloads(table, 10, list(WORKLOAD_COLUMNS), 0, 50, None, False, {'cluster': 'Cluster 3'})
+    assert_index_scan(explain(engine, count_query), 'workloads_tb_pid_')
+
+
+def test_summary_by_index(engine):
+    assert_index_scan(explain(engine, summary_query(Workload.__table__, 10)), 'workloads_tb_pid_')
+
+
+def test_reingest_key_is_unique(engine):
+    with pytest.raises(Exception, match='workloads_tb_pid_inventory_mobid_key'):
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO workloads_tb (pid, mobid) SELECT pid, 'vm-1' FROM projects_tb LIMIT 1"))
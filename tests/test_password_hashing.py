@@ -0,0 +1,17 @@
+from flask import Flask
+from flask_bcrypt import Bcrypt
+from src.password_hashing import PasswordHasher
+
+
+def test_hash_and_check_on_the_pool():
+    app = Flask(__name__)
+    app.config['BCRYPT_LOG_ROUNDS'] = 4
+    hasher = PasswordHasher(Bcrypt(app), workers=2)
+    try:
+        pw_hash = hasher.hash('sells seashells')
+        # the configured cost factor is in the hash
+        assert pw_hash.startswith('$2b$04$')
+        assert hasher.check(pw_hash, 'sells seashells')
+        assert not hasher.check(pw_hash, 'sells sea shells')
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,84 @@
+import pandas as pd
+from sqlalchemy import create_engine, select
+from src.app import Workload
+from src.persistence import persist_workloads, workload_rows
+from src.transform_lova import lova_conversion
+from src.transform_rvtools import rvtools_conversion
+
+TABLE = Workload.__table__
+
+
+def test_columns_are_mapped_and_coerced():
+    vm_data_df = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+    vm_data_df.loc[0, 'vmName'] = 'x' * 100
+    rows = workload_rows(vm_data_df, TABLE, pid=7)
+
+    assert list(rows.columns) == ['pid', 'inventory', 'mobid', 'cluster', 'virtualdatacenter', 'vcenter', 'os', 'os_name', 'vmstate', 'vcpu', 'vmname', 'vram',
+                                  'ip_addresses', 'vinfo_provisioned', 'vinfo_used', 'vmdktotal', 'vmdkused']
+    assert (rows['pid'] == 7).all()
+    assert rows['mobid'].tolist() == vm_data_df['vmId'].tolist()
+    assert (rows['inventory'] == 'vcenter.company.com').all()
+    assert rows.loc[0, 'vmname'] == 'x' * 40
+    assert str(rows['vram'].dtype) == 'Int64'
+
+
+def test_batched_insert_fallback():
+    # SQLite has no COPY, so this exercises the executemany path
+    engine = create_engine('sqlite://')
+    TABLE.create(engine)
+    vm_data_df = pd.DataFrame(lova_conversion(input_path='tests/test_files/', file_name='liveoptics_file_sample.xlsx'))
+
+    with engine.begin() as conn:
+        assert persist_workloads(conn, TABLE, 3, vm_data_df) == len(vm_data_df)
+    with engine.connect() as conn:
+        saved = conn.execute(select(TABLE.c.mobid, TABLE.c.pid, TABLE.c.readiops).order_by(TABLE.c.vmid)).all()
+
+    assert [row.mobid for row in saved] == vm_data_df['vmId'].tolist()
+    assert {row.pid for row in saved} == {3}
+    assert [float(row.readiops) for row in saved] == vm_data_df['readIOPS'].tolist()
+
+
+def test_vms_without_a_vcenter_take_the_given_inventory():
+    vm_data_df = pd.DataFrame(lova_conversion(input_path='tests/test_files/', file_name='liveoptics_file_sample.xlsx'))
+    rows = workload_rows(vm_data_df, TABLE, pid=7, inventory='live-optics')
+    assert rows['vcenter'].isna().all()
+    assert (rows['inventory'] == 'live-optics').all()
+
+
+def test_saving_again_upserts_on_pid_inventory_and_mobid():
+    engine = create_engine('sqlite://')
+    TABLE.create(engine)
+    vm_data_df = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+
+    with engine.begin() as conn:
+        persist_workloads(conn, TABLE, 3, vm_data_df)
+    changed = vm_data_df.copy()
+    changed['vCpu'] = 64
+    with engine.begin() as conn:
+        # the second save updates the rows in place, and a VM listed twice is saved once
+        assert persist_workloads(conn, TABLE, 3, pd.concat([changed, changed.tail(1)])) == len(vm_data_df)
+        persist_workloads(conn, TABLE, 4, vm_data_df)
+    with engine.connect() as conn:
+        saved = conn.execute(select(TABLE.c.pid, TABLE.c.mobid, TABLE.c.vcpu)).all()
+
+    assert len(saved) == 2 * len(vm_data_df)
+    assert {row.vcpu for row in saved if row.pid == 3} == {64}
+    assert [row.mobid for row in saved if row.pid == 4] == vm_data_df['vmId'].tolist()
+
+
+def test_vms_of_different_vcenters_sharing_an_id_are_kept_apart():
+    engine = create_engine('sqlite://')
+    TABLE.create(engine)
+    vm_data_df = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+    other = vm_data_df.assign(vCenter='vcenter2.company.com')
+
+    with engine.begin() as conn:
+        persist_workloads(conn, TABLE, 3, vm_data_df)
+        persist_workloads(conn, TABLE, 3, other)
+        # VMs of an export without vCenters are told apart by the inventory they are saved under
+        persist_workloads(conn, TABLE, 3, vm_data_df.assign(vCenter=None), inventory='live-optics')
+    with engine.connect() as conn:
+        saved = conn.execute(select(TABLE.c.inventory, TABLE.c.mobid)).all()
+
+    assert len(saved) == 3 * len(vm_data_df)
+    assert {row.inventory for row in saved} == {'vcenter.company.com', 'vcenter2.company.com', 'live-optics'}
@@ -0,0 +1,147 @@
+import os
+import time
+from pathlib import Path
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from src.app import app, db, Project, Snapshot, User, Workload, WorkloadChange
+from src.migrate import apply_migrations
+from src.persistence import persist_workloads
+from src.project_summary import project_summary
+from src.snapshots import apply_snapshot
+from src.transform_rvtools import rvtools_conversion
+from testcontainers.postgres import PostgresContainer
+from tests.workbook_generator import synthetic_inventory
+
+BENCH_ROWS = int(os.getenv('BENCH_ROWS', '100000'))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def postgres_container():
+    """Fixture for the Postgres container and initialize the schema"""
+    postgres = PostgresContainer('postgres:16.4-alpine3.20')
+    script = Path(__file__).parent/ 'sql' / 'init-user-db.sh'
+    postgres.with_volume_mapping(host=str(script), container=f"/docker-entrypoint-initdb.d/{script.name}")
+    with postgres:
+        apply_migrations(create_engine(postgres.get_connection_url()))
+        yield postgres
+
+
+@pytest.fixture(scope='function')
+def project(postgres_container: PostgresContainer):
+    """Create a user and project to load workloads into, and remove them again afterwards."""
+    app.config['SQLALCHEMY_DATABASE_URI'] = postgres_container.get_connection_url()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        user = User(username="loader", password="not a real hash")
+        db.session.add(user)
+        db.session.flush()
+        project = Project(userid=user.id, projectname="bulk load")
+        db.session.add(project)
+        db.session.commit()
+
+        yield project
+
+        db.session.execute(text('DELETE FROM workload_changes_tb'))
+        db.session.execute(text('DELETE FROM snapshots_tb'))
+        db.session.execute(text('DELETE FROM workloads_tb'))
+        db.session.delete(project)
+        db.session.delete(user)
+        db.session.commit()
+        db.session.remove()
+
+
+def test_copy_loads_converted_file(project):
+    vm_data_df = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            assert persist_workloads(conn, Workload.__table__, project.pid, vm_data_df) == len(vm_data_df)
+
+        saved = Workload.query.filter_by(pid=project.pid).order_by(Workload.vmid).all()
+        assert [w.mobid for w in saved] == vm_data_df['vmId'].tolist()
+        assert [w.vcpu for w in saved] == vm_data_df['vCpu'].tolist()
+        assert [float(w.vmdktotal) for w in saved] == pytest.approx(vm_data_df['vmdkTotal'].tolist())
+
+
+def test_saving_again_updates_in_place(project):
+    vm_data_df = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            persist_workloads(conn, Workload.__table__, project.pid, vm_data_df)
+        vm_data_df['vCpu'] = 64
+        with db.engine.begin() as conn:
+            persist_workloads(conn, Workload.__table__, project.pid, vm_data_df)
+
+        saved = Workload.query.filter_by(pid=project.pid).all()
+        assert len(saved) == len(vm_data_df)
+        assert {w.vcpu for w in saved} == {64}
+
+
+def test_snapshot_writes_only_the_delta(project):
+    vm_data_df = synthetic_inventory(1000)
+    week = pd.concat([vm_data_df.iloc[:-5].assign(vCpu=lambda df: df['vCpu'].where(df.index >= 10, 64)),
+                      synthetic_inventory(5).assign(vmId=lambda df: 'new-' + df['vmId'])], ignore_index=True)
+    tables = (Workload.__table__, Snapshot.__table__, WorkloadChange.__table__)
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            apply_snapshot(conn, *tables, project.pid, vm_data_df)
+        with db.engine.begin() as conn:
+            result = apply_snapshot(conn, *tables, project.pid, week)
+
+        assert (result['added'], result['changed'], result['removed'], result['unchanged']) == (5, 10, 5, 985)
+        saved = Workload.query.filter_by(pid=project.pid).all()
+        assert sorted(w.mobid for w in saved) == sorted(week['vmId'])
+        assert sum(w.vcpu == 64 for w in saved) == 10
+        assert WorkloadChange.query.filter_by(snapshotid=result['snapshotid']).count() == 20
+
+
+@pytest.mark.slow
+def test_copy_benchmark_against_orm(project):
+    vm_data_df = synthetic_inventory(BENCH_ROWS)
+
+    with app.app_context():
+        start = time.perf_counter()
+        with db.engine.begin() as conn:
+            persist_workloads(conn, Workload.__table__, project.pid, vm_data_df)
+        copy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # other VMs than the COPYed ones, which (pid, inventory, mobid) would otherwise reject
+        orm_df = vm_data_df.assign(vmId=vm_data_df['vmId'] + '-orm')
+        for record in orm_df.rename(columns=lambda col: 'mobid' if col == 'vmId' else col.lower()).to_dict('records'):
+            db.session.add(Workload(pid=project.pid, **record))
+        db.session.commit()
+        orm_time = time.perf_counter() - start
+
+        count = db.session.execute(select(func.count()).select_from(Workload).where(Workload.pid == project.pid)).scalar()
+
+    print()
+    print(f'{BENCH_ROWS} workloads: COPY {copy_time:.2f}s, ORM session.add {orm_time:.2f}s')
+    assert count == 2 * BENCH_ROWS
+    assert copy_time < orm_time
+
+
+@pytest.mark.slow
+def test_summary_benchmark(project):
+    vm_data_df = synthetic_inventory(BENCH_ROWS)
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            persist_workloads(conn, Workload.__table__, project.pid, vm_data_df)
+            conn.execute(text('ANALYZE workloads_tb'))
+
+        with db.engine.connect() as conn:
+            project_summary(conn, Workload.__table__, project.pid)
+            start = time.perf_counter()
+            summary = project_summary(conn, Workload.__table__, project.pid)
+            elapsed = time.perf_counter() - start
+
+    print()
+    print(f'{BENCH_ROWS} workloads: summary in {elapsed * 1000:.1f}ms')
+    assert summary['totals']['workloads'] == BENCH_ROWS
+    assert len(summary['clusters']) == 4
+    assert elapsed < 0.1
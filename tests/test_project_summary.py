@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from src.app import Workload
+from src.persistence import persist_workloads
+from src.project_summary import SUMMED_COLUMNS, project_summary
+from src.transform_lova import lova_conversion
+from src.transform_rvtools import rvtools_conversion
+
+TABLE = Workload.__table__
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        persist_workloads(conn, TABLE, 1, lova_conversion(input_path='tests/test_files/', file_name='liveoptics_file_sample.xlsx'))
+        persist_workloads(conn, TABLE, 2, rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+    return engine
+
+
+def test_summary_matches_the_saved_rows(engine):
+    with engine.connect() as conn:
+        summary = project_summary(conn, TABLE, 1)
+        saved = pd.read_sql(TABLE.select().where(TABLE.c.pid == 1), conn)
+
+    assert summary['totals']['workloads'] == len(saved)
+    assert summary['totals']['vCpu'] == saved['vcpu'].sum()
+    assert summary['totals']['peakReadIOPS'] == pytest.approx(saved['peakreadiops'].astype(float).sum())
+
+    by_cluster = saved.groupby('cluster')['vmdktotal'].sum()
+    assert [row['cluster'] for row in summary['clusters']] == list(by_cluster.index)
+    assert [row['vmdkTotal'] for row in summary['clusters']] == pytest.approx(by_cluster.astype(float).tolist())
+    assert [row['virtualDatacenter'] for row in summary['datacenters']] == sorted(saved['virtualdatacenter'].unique())
+    assert summary['vmStates'] == saved['vmstate'].value_counts().sort_index().to_dict()
+
+
+def test_projects_are_summarised_separately(engine):
+    with engine.connect() as conn:
+        summary = project_summary(conn, TABLE, 2)
+        empty = project_summary(conn, TABLE, 99)
+
+    assert summary['totals']['workloads'] == 5
+    # RVTools exports carry no performance numbers
+    assert summary['totals']['peakWriteIOPS'] == 0
+    assert empty['totals'] == dict.fromkeys(('workloads', *SUMMED_COLUMNS), 0)
+    assert empty['clusters'] == [] and empty['vmStates'] == {}
@@ -0,0 +1,56 @@
+import pytest
+from src.rate_limit import TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_refill():
+    clock = Clock()
+    limiter = TokenBucketLimiter(per_minute=6, burst=3, clock=clock)
+
+    assert [limiter.attempt('ip:10.0.0.1') for _ in range(3)] == [0, 0, 0]
+    # one token every ten seconds
+    assert limiter.attempt('ip:10.0.0.1') == 10
+    clock.now = 4
+    assert limiter.attempt('ip:10.0.0.1') == 6
+    clock.now = 10
+    assert limiter.attempt('ip:10.0.0.1') == 0
+    # other keys have buckets of their own
+    assert limiter.attempt('ip:10.0.0.2') == 0
+
+
+def test_tracked_keys_are_bounded():
+    clock = Clock()
+    limiter = TokenBucketLimiter(per_minute=60, burst=2, max_keys=10, clock=clock)
+
+    for i in range(25):
+        limiter.attempt(f'user:{i}')
+    assert len(limiter) <= 10
+
+    # buckets that have refilled are forgotten first
+    clock.now = 60
+    limiter.attempt('user:latest')
+    assert len(limiter) == 1
+
+
+@pytest.mark.parametrize('per_minute, burst', [(10, 0), (10, -1), (0, 5)])
+def test_limits_that_would_refuse_every_attempt_are_rejected(per_minute, burst):
+    with pytest.raises(ValueError):
+        TokenBucketLimiter(per_minute=per_minute, burst=burst)
+
+
+def test_refused_address_does_not_draw_on_the_username(monkeypatch):
+    from src import app as web
+
+    monkeypatch.setattr(web, 'auth_limiter', TokenBucketLimiter(per_minute=6, burst=1, clock=Clock()))
+
+    assert web.auth_retry_after('ip:10.0.0.1', 'user:bob') == 0
+    # the guessing address is out of attempts, so sally's bucket is left for sally
+    assert web.auth_retry_after('ip:10.0.0.1', 'user:sally') == 10
+    assert web.auth_retry_after('ip:10.0.0.2', 'user:sally') == 0
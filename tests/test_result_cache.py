@@ -0,0 +1,55 @@
+import os
+import pandas as pd
+from pandas import testing as pdtest
+from src.result_cache import ResultCache, file_digest
+
+FRAME = pd.DataFrame({'vmId': ['vm-01', 'vm-02'], 'vCpu': [2, 4], 'vRam': [4.0, 8.0]})
+
+
+def test_digest_depends_only_on_content(tmp_path):
+    (tmp_path / 'a.xlsx').write_bytes(b'same bytes')
+    (tmp_path / 'b.xlsx').write_bytes(b'same bytes')
+    (tmp_path / 'c.xlsx').write_bytes(b'other bytes')
+    assert file_digest(tmp_path / 'a.xlsx') == file_digest(tmp_path / 'b.xlsx')
+    assert file_digest(tmp_path / 'a.xlsx') != file_digest(tmp_path / 'c.xlsx')
+
+
+def test_hit_and_miss_counters(tmp_path):
+    cache = ResultCache(str(tmp_path), 1024 ** 2, {'rv-tools': 1})
+    assert not cache.contains('abc', 'rv-tools')
+    cache.put('abc', 'rv-tools', FRAME)
+    assert cache.contains('abc', 'rv-tools')
+    pdtest.assert_frame_equal(cache.get('abc', 'rv-tools'), FRAME)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hitRatio': 0.5}
+
+
+def test_exists_is_not_counted(tmp_path):
+    cache = ResultCache(str(tmp_path), 1024 ** 2, {'rv-tools': 1})
+    assert not cache.exists('abc', 'rv-tools')
+    cache.put('abc', 'rv-tools', FRAME)
+    assert cache.exists('abc', 'rv-tools')
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'hitRatio': None}
+
+
+def test_transform_version_bump_drops_entries(tmp_path):
+    ResultCache(str(tmp_path), 1024 ** 2, {'rv-tools': 1}).put('abc', 'rv-tools', FRAME)
+
+    cache = ResultCache(str(tmp_path), 1024 ** 2, {'rv-tools': 2})
+    assert os.listdir(tmp_path) == []
+    assert cache.get('abc', 'rv-tools') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path), 1024 ** 2, {'rv-tools': 1})
+    for digest in ('old', 'used', 'new'):
+        cache.put(digest, 'rv-tools', FRAME)
+    entry_size = os.path.getsize(cache._path('old', 'rv-tools'))
+    os.utime(cache._path('old', 'rv-tools'), (1, 1))
+    os.utime(cache._path('used', 'rv-tools'), (2, 2))
+    assert cache.contains('used', 'rv-tools')
+
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert not os.path.exists(cache._path('old', 'rv-tools'))
+    assert cache.get('used', 'rv-tools') is not None
+    assert cache.get('new', 'rv-tools') is not None
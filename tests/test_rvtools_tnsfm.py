@@ -1,15 +1,24 @@
 import pandas as pd
 from pandas import testing as pdtest
+from src.column_mapping import apply_output_schema
 from src.transform_rvtools import rvtools_conversion
+from tests.schema_checks import assert_compact, assert_schema
+from tests.workbook_generator import write_rvtools_workbook
 
 def test_lova_transform():
-    target_df = pd.read_csv('tests/test_files/rvtools_expected_df.csv')
-    target_df['vRam'] = target_df['vRam'].astype(float)
-    target_df['vmdkTotal'] = target_df['vmdkTotal'].astype(float)    
+    target_df = apply_output_schema(pd.read_csv('tests/test_files/rvtools_expected_df.csv'))
 
     file_name = 'rvtools_file_sample.xlsx'
     input_path = 'tests/test_files/'
     describe_params = {"file_name":file_name, "input_path":input_path}
     source_df = pd.DataFrame(rvtools_conversion(**describe_params))
 
-    pdtest.assert_frame_equal(source_df,target_df)
\ No newline at end of file
+    pdtest.assert_frame_equal(source_df,target_df)
+
+
+def test_output_schema_and_memory(tmp_path):
+    write_rvtools_workbook(str(tmp_path / 'rvtools.xlsx'), vms=2000, filler_columns=0)
+    vm_data_df = rvtools_conversion(input_path=str(tmp_path), file_name='rvtools.xlsx')
+
+    assert_schema(vm_data_df)
+    assert_compact(vm_data_df)
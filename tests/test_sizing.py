@@ -0,0 +1,184 @@
+import time
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from src.app import Snapshot, Workload, WorkloadChange, db
+from src.sizing import HOST_PARAMETERS, Fleet, SizingCache, SizingError, bins_needed, bins_packed, load_fleet, parse_sizing_args, size_fleet
+from src.snapshots import apply_snapshot
+from tests.benchmark_tools import check_baseline
+from tests.workbook_generator import synthetic_inventory
+
+WORKLOADS, SNAPSHOTS, CHANGES = Workload.__table__, Snapshot.__table__, WorkloadChange.__table__
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    return engine
+
+
+def save(engine, pid, vm_data_df):
+    with engine.begin() as conn:
+        return apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, pid, vm_data_df)
+
+
+@pytest.mark.parametrize('sizes, capacity, expected', [
+    ([], 10, 0),
+    ([10] * 3, 10, 3),
+    ([6] * 3, 10, 3),
+    ([5] * 4, 10, 2),
+    ([1] * 25, 10, 3),
+    # one big item each, with the small ones filling the room they leave
+    ([7, 7, 3, 3], 10, 2),
+    ([0.33, 0.67] * 3, 1, 3),
+])
+def test_bins_needed(sizes, capacity, expected):
+    assert bins_needed(np.array(sizes, dtype=float), capacity) == expected
+
+
+def first_fit_decreasing(sizes, capacity):
+    """Bins used placing one item at a time, largest first, in the first bin with room."""
+    bins = []
+    for size in sorted(sizes, reverse=True):
+        for i, used in enumerate(bins):
+            if used + size <= capacity:
+                bins[i] += size
+                break
+        else:
+            bins.append(size)
+    return len(bins)
+
+
+def test_packing_is_first_fit_decreasing_and_never_below_the_bound():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        sizes = rng.integers(1, 60, rng.integers(1, 40)).astype(float)
+        packed = bins_packed(sizes, 100)
+        assert packed == first_fit_decreasing(sizes, 100)
+        assert np.ceil(sizes.sum() / 100) <= bins_needed(sizes, 100) <= packed
+
+
+def test_packing_rounds_many_sizes_up():
+    rng = np.random.default_rng(1)
+    sizes = rng.random(2000) * 30
+    # every rounded item holds its real one, so a coarse grid costs bins but stays a packing of the real sizes
+    assert bins_needed(sizes, 100) <= bins_packed(sizes, 100) <= bins_packed(sizes, 100, max_sizes=16)
+    assert bins_packed(sizes, 100, max_sizes=len(sizes)) == first_fit_decreasing(sizes, 100)
+
+
+def test_parse_sizing_args_defaults_and_key():
+    params = dict(parse_sizing_args({}))
+    assert params['cpuOvercommit'] == HOST_PARAMETERS['cpuOvercommit'][0]
+    assert params['vmState'] == ('poweredOn',) and params['cluster'] == () and params['storage'] == 'provisioned'
+    # the same parameters in another order make the same key
+    assert parse_sizing_args({'cluster': 'b, a', 'os': ' Linux'}) == parse_sizing_args({'os': 'linux', 'cluster': 'a,b'})
+    # an empty power state list means every VM
+    assert dict(parse_sizing_args({'vmState': ''}))['vmState'] == ()
+
+
+@pytest.mark.parametrize('args', [{'hostCores': 'many'}, {'hostCores': '8.5'}, {'cpuOvercommit': '0'}, {'storage': 'thin'}])
+def test_parse_sizing_args_rejects_bad_values(args):
+    with pytest.raises(SizingError):
+        parse_sizing_args(args)
+
+
+def test_filters_and_overcommit(engine):
+    vm_data_df = synthetic_inventory(400)
+    save(engine, 1, vm_data_df)
+    with engine.connect() as conn:
+        fleet = load_fleet(conn, WORKLOADS, 1)
+    assert len(fleet) == 400
+
+    sizing = size_fleet(fleet, parse_sizing_args({'cluster': 'Cluster 1,Cluster 2', 'os': 'linux'}))
+    selected = vm_data_df[(vm_data_df['vmState'] == 'poweredOn') & vm_data_df['cluster'].isin(['Cluster 1', 'Cluster 2'])
+                          & vm_data_df['os'].str.contains('Linux', na=False)]
+    assert sizing['workloads'] == len(selected)
+    assert sizing['demand']['vCpu'] == selected['vCpu'].sum()
+    assert sizing['demand']['iops'] == pytest.approx((selected['peakReadIOPS'] + selected['peakWriteIOPS']).sum())
+
+    everything = size_fleet(fleet, parse_sizing_args({'vmState': ''}))
+    assert everything['workloads'] == 400
+    assert everything['demand']['storageGb'] == pytest.approx(vm_data_df['vmdkTotal'].sum())
+    assert size_fleet(fleet, parse_sizing_args({'vmState': '', 'storage': 'used'}))['demand']['storageGb'] == pytest.approx(vm_data_df['vmdkUsed'].sum())
+
+    # with little CPU per host and plenty of everything else, CPU sets the count, and overcommit divides it;
+    # bigger hosts also pack the larger VMs with less waste
+    cpu_bound = {'vmState': '', 'hostCores': '16', 'maxUtilization': '1', 'spareHosts': '0'}
+    one_to_one = size_fleet(fleet, parse_sizing_args({**cpu_bound, 'cpuOvercommit': '1'}))
+    four_to_one = size_fleet(fleet, parse_sizing_args({**cpu_bound, 'cpuOvercommit': '4'}))
+    assert one_to_one['limitedBy'] == 'cpu'
+    assert np.ceil(vm_data_df['vCpu'].sum() / 16) <= one_to_one['hostsLowerBound'] <= one_to_one['hostsNeeded']
+    assert np.ceil(vm_data_df['vCpu'].sum() / 64) <= four_to_one['hostsNeeded'] <= np.ceil(one_to_one['hostsNeeded'] / 4)
+    assert size_fleet(fleet, parse_sizing_args({**cpu_bound, 'cpuOvercommit': '1', 'spareHosts': '2'}))['hostsNeeded'] == one_to_one['hostsNeeded'] + 2
+
+
+def test_vms_bigger_than_a_host_are_counted_not_packed(engine):
+    vm_data_df = synthetic_inventory(20).assign(vCpu=4)
+    vm_data_df.loc[0, 'vCpu'] = 64
+    save(engine, 1, vm_data_df)
+    with engine.connect() as conn:
+        sizing = size_fleet(load_fleet(conn, WORKLOADS, 1), parse_sizing_args({'vmState': '', 'hostCores': '16', 'cpuOvercommit': '1'}))
+    assert sizing['oversized']['cpu'] == 1
+    assert sizing['demand']['vCpu'] == 64 + 19 * 4
+
+
+def test_results_are_memoized_until_the_next_snapshot(engine):
+    cache = SizingCache()
+    save(engine, 1, synthetic_inventory(100))
+    save(engine, 2, synthetic_inventory(50))
+    params = parse_sizing_args({})
+
+    with engine.connect() as conn:
+        first = cache.size(conn, WORKLOADS, SNAPSHOTS, 1, params)
+        assert cache.size(conn, WORKLOADS, SNAPSHOTS, 1, params) is first
+        cache.size(conn, WORKLOADS, SNAPSHOTS, 1, parse_sizing_args({'hostCores': '64'}))
+        cache.size(conn, WORKLOADS, SNAPSHOTS, 2, params)
+    assert cache.stats() == {'results': 3, 'fleets': 2, 'hits': 1, 'misses': 3, 'hitRatio': 0.25}
+
+    # a new snapshot is seen even by a cache that was not told of it
+    save(engine, 1, synthetic_inventory(60))
+    with engine.connect() as conn:
+        # 48 of the 60 VMs are powered on
+        assert cache.size(conn, WORKLOADS, SNAPSHOTS, 1, params)['workloads'] == 48
+    cache.invalidate(1)
+    assert cache.stats()['results'] == 1 and cache.stats()['fleets'] == 1
+
+
+@pytest.mark.slow
+def test_sizing_benchmark():
+    """Every slider move on a 100k-VM project, once its fleet is loaded, is answered in milliseconds.
+
+    Deselected by default; run with `python -m pytest -c tests/pytest.ini tests/test_sizing.py -k slow`.
+    """
+    rng = np.random.default_rng(0)
+    rows = 100_000
+    demands = {
+        'vCpu': rng.integers(1, 17, rows).astype(float),
+        'vRam': rng.integers(1, 129, rows).astype(float),
+        'provisioned': rng.random(rows) * 2000,
+        'used': rng.random(rows) * 1000,
+        'iops': rng.random(rows) * 1000,
+    }
+    labels = {'vmState': np.array(['poweredOff', 'poweredOn'], dtype=object),
+              'cluster': np.array([f'Cluster {i}' for i in range(50)], dtype=object),
+              'os': np.array(['Linux', 'Windows'], dtype=object)}
+    codes = {col: rng.integers(0, len(names), rows) for col, names in labels.items()}
+    fleet = Fleet(demands, codes, labels)
+
+    timings = []
+    for cores in range(8, 193, 8):
+        params = parse_sizing_args({'hostCores': str(cores), 'cluster': 'Cluster 1,Cluster 7', 'os': 'linux'})
+        start = time.perf_counter()
+        size_fleet(fleet, params)
+        timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        size_fleet(fleet, parse_sizing_args({'hostCores': str(cores)}))
+        timings.append(time.perf_counter() - start)
+
+    # the median, as single moves are at the mercy of the rest of the machine
+    measured = {'median_ms': float(np.median(timings)) * 1000}
+    print()
+    print(f'sizing 100k VMs: {measured["median_ms"]:.1f} ms median, {max(timings) * 1000:.1f} ms worst')
+    check_baseline('sizing/100000', measured)
+    assert measured['median_ms'] < 100
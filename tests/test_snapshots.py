@@ -0,0 +1,146 @@
+import json
+import time
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from src.app import Snapshot, Workload, WorkloadChange, db
+from src.persistence import persist_workloads
+from src.snapshots import apply_snapshot
+from src.transform_lova import lova_conversion
+from src.transform_rvtools import rvtools_conversion
+from tests.workbook_generator import synthetic_inventory
+
+WORKLOADS, SNAPSHOTS, CHANGES = Workload.__table__, Snapshot.__table__, WorkloadChange.__table__
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    # the history tables reference projects_tb, so the whole schema is created
+    db.metadata.create_all(engine)
+    return engine
+
+
+def next_week(vm_data_df, changed, removed, added):
+    """The estate a week later: `changed` VMs resized, the last `removed` gone and `added` new ones."""
+    week = vm_data_df.iloc[:len(vm_data_df) - removed].copy()
+    week.loc[week.index[:changed], 'vCpu'] += 1
+    new = synthetic_inventory(added, seed=1).assign(vmId=[f'new-{i}' for i in range(added)])
+    return pd.concat([week, new], ignore_index=True)
+
+
+def count_writes(engine):
+    """Rows inserted, updated or deleted in workloads_tb, as the driver reports them."""
+    writes = {'rows': 0}
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split()[0] in ('INSERT', 'UPDATE', 'DELETE') and 'workloads_tb' in statement.split('(')[0]:
+            writes['rows'] += cursor.rowcount
+    return writes
+
+
+def test_first_snapshot_adds_every_vm(engine):
+    vm_data_df = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+    with engine.begin() as conn:
+        result = apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df, source='rvtools_file_sample.xlsx')
+    assert (result['added'], result['changed'], result['removed'], result['unchanged']) == (len(vm_data_df), 0, 0, 0)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(WORKLOADS)).scalar() == len(vm_data_df)
+        assert conn.execute(select(SNAPSHOTS.c.source)).scalar() == 'rvtools_file_sample.xlsx'
+
+    # saving the same file again finds nothing to do
+    with engine.begin() as conn:
+        result = apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df)
+    assert (result['added'], result['changed'], result['removed'], result['unchanged']) == (0, 0, 0, len(vm_data_df))
+
+
+def test_inventories_are_snapshotted_apart(engine):
+    rvtools = pd.DataFrame(rvtools_conversion(input_path='tests/test_files/', file_name='rvtools_file_sample.xlsx'))
+    lova = pd.DataFrame(lova_conversion(input_path='tests/test_files/', file_name='liveoptics_file_sample.xlsx'))
+    # both samples list vm-01 to vm-05, but from a named vCenter and from an export that names none
+    with engine.begin() as conn:
+        apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, rvtools, inventory='rv-tools')
+        result = apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, lova, inventory='live-optics')
+    assert (result['added'], result['changed'], result['removed'], result['unchanged']) == (5, 0, 0, 0)
+
+    # a VM gone from one inventory is removed from that inventory only
+    with engine.begin() as conn:
+        result = apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, lova.iloc[1:], inventory='live-optics')
+    assert (result['added'], result['changed'], result['removed'], result['unchanged']) == (0, 0, 1, 4)
+    with engine.connect() as conn:
+        saved = conn.execute(select(WORKLOADS.c.inventory, WORKLOADS.c.mobid).where(WORKLOADS.c.pid == 1)).all()
+        removed = conn.execute(select(CHANGES.c.inventory, CHANGES.c.mobid).where(CHANGES.c.snapshotid == result['snapshotid'])).all()
+    assert len(saved) == 9 and ('vcenter.company.com', 'vm-01') in saved
+    assert removed == [('live-optics', 'vm-01')]
+
+
+def test_only_the_delta_is_written(engine):
+    vm_data_df = synthetic_inventory(1000)
+    with engine.begin() as conn:
+        apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df)
+        apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 2, vm_data_df)
+
+    writes = count_writes(engine)
+    week = next_week(vm_data_df, changed=10, removed=5, added=5)
+    with engine.begin() as conn:
+        result = apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, week)
+
+    assert (result['added'], result['changed'], result['removed'], result['unchanged']) == (5, 10, 5, 985)
+    assert writes['rows'] == 20
+    with engine.connect() as conn:
+        saved = pd.read_sql(select(WORKLOADS).where(WORKLOADS.c.pid == 1), conn).set_index('mobid')
+        # the other project is left alone
+        assert conn.execute(select(func.count()).select_from(WORKLOADS).where(WORKLOADS.c.pid == 2)).scalar() == 1000
+    assert sorted(saved.index) == sorted(week['vmId'])
+    assert saved.loc[week['vmId'], 'vcpu'].tolist() == week['vCpu'].tolist()
+
+
+def test_changes_are_recorded(engine):
+    vm_data_df = synthetic_inventory(100)
+    with engine.begin() as conn:
+        apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df)
+        result = apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, next_week(vm_data_df, changed=2, removed=1, added=1))
+
+    with engine.connect() as conn:
+        changes = conn.execute(select(CHANGES).where(CHANGES.c.snapshotid == result['snapshotid']).order_by(CHANGES.c.changeid)).all()
+    assert [(c.inventory, c.mobid, c.change) for c in changes] == [('', 'new-0', 'added'), ('', 'vm-0', 'changed'), ('', 'vm-1', 'changed'), ('', 'vm-99', 'removed')]
+    assert changes[1].columns == 'vcpu'
+    assert json.loads(changes[1].previous) == {'vcpu': int(vm_data_df.loc[0, 'vCpu'])}
+    assert json.loads(changes[3].previous)['vmname'] == 'vm99'
+
+
+def test_rows_saved_without_fingerprints_are_rewritten_once(engine):
+    vm_data_df = synthetic_inventory(50)
+    with engine.begin() as conn:
+        persist_workloads(conn, WORKLOADS, 1, vm_data_df)
+        conn.execute(WORKLOADS.update().values(fingerprint=None))
+        assert apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df)['changed'] == 50
+        assert apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df)['unchanged'] == 50
+
+
+def test_fingerprints_ignore_how_a_column_was_typed(engine):
+    vm_data_df = synthetic_inventory(20)
+    with engine.begin() as conn:
+        apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df)
+        retyped = vm_data_df.astype({'vRam': 'int64', 'vCpu': 'float64', 'os': object})
+        assert apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, retyped)['unchanged'] == 20
+
+
+@pytest.mark.slow
+def test_reingest_benchmark(engine):
+    vm_data_df = synthetic_inventory(100_000)
+    with engine.begin() as conn:
+        apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, vm_data_df)
+
+    week = next_week(vm_data_df, changed=1000, removed=500, added=500)
+    writes = count_writes(engine)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        apply_snapshot(conn, WORKLOADS, SNAPSHOTS, CHANGES, 1, week)
+    elapsed = time.perf_counter() - start
+
+    print()
+    print(f'100k VMs, 2% changed: {writes["rows"]} workload rows written in {elapsed:.2f}s')
+    assert writes['rows'] == 2000
@@ -0,0 +1,80 @@
+"""Cold start of a web process and the memory of a worker forked from it, the way gunicorn's preload_app forks them.
+
+Each measurement runs the app in a fresh interpreter, outside pytest, so nothing the test session
+has already imported is counted. The benchmark is deselected by default; run it with
+`python -m pytest -c tests/pytest.ini tests/test_startup.py -k slow`. It checks against
+tests/benchmarks/baseline.json the way the ingest benchmarks do (BENCH_TOLERANCE, BENCH_UPDATE_BASELINE).
+"""
+import json
+import os
+import subprocess
+import sys
+import pytest
+from tests.benchmark_tools import check_baseline
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# modules only the conversion path should load
+HEAVY_MODULES = ('numpy', 'pandas', 'openpyxl')
+
+STARTUP_ROUNDS = 5
+
+# imports the app, then forks a worker off it that serves a login page; each process prints one JSON line
+STARTUP_SCRIPT = '''
+import gc, json, os, sys, time
+
+def memory(name):
+    # the fields are in kB in both files
+    with open(name) as f:
+        return sum(int(line.split()[1]) for line in f if line.split()[0] in FIELDS) / 1024
+
+sys.path.insert(0, SRC)
+start = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - start) * 1000
+FIELDS = ('VmRSS:',)
+print(json.dumps({'import_ms': import_ms, 'rss_mib': memory('/proc/self/status')}), flush=True)
+
+gc.freeze()
+pid = os.fork()
+if pid == 0:
+    status = app.app.test_client().get('/login').status_code
+    FIELDS = ('Private_Clean:', 'Private_Dirty:')
+    private = memory('/proc/self/smaps_rollup') if os.path.exists('/proc/self/smaps_rollup') else None
+    print(json.dumps({'status': status, 'private_mib': private,
+                      'loaded': [name for name in HEAVY_MODULES if name in sys.modules]}), flush=True)
+    os._exit(0)
+os.waitpid(pid, 0)
+'''
+
+
+def start_app(tmp_path):
+    """Run STARTUP_SCRIPT in `tmp_path`, on a SQLite database, and return the master's and the worker's numbers."""
+    env = {**os.environ, 'DATABASE_URI': f'sqlite:///{tmp_path / "startup.db"}'}
+    env.pop('PYTEST_CURRENT_TEST', None)
+    script = f'SRC = {SRC!r}\nHEAVY_MODULES = {HEAVY_MODULES!r}\n{STARTUP_SCRIPT}'
+    out = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120, check=True)
+    master, worker = (json.loads(line) for line in out.stdout.splitlines()[-2:])
+    return master, worker
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='forks a worker the way gunicorn does')
+def test_serving_a_login_page_does_not_import_the_conversion_stack(tmp_path):
+    master, worker = start_app(tmp_path)
+    assert worker['status'] == 200
+    assert worker['loaded'] == []
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup'), reason='reads process memory from /proc')
+def test_startup_benchmark(tmp_path):
+    runs = [start_app(tmp_path) for _ in range(STARTUP_ROUNDS)]
+    # the quickest start is the one least disturbed by the rest of the machine
+    master = {name: min(run[0][name] for run in runs) for name in ('import_ms', 'rss_mib')}
+    worker = {'private_mib': min(run[1]['private_mib'] for run in runs)}
+
+    print()
+    print(f'startup: {master["import_ms"]:.0f} ms to import the app, {master["rss_mib"]:.1f} MiB resident, '
+          f'{worker["private_mib"]:.1f} MiB private to a forked worker after a login page')
+    check_baseline('startup/master', master)
+    check_baseline('startup/worker', worker)
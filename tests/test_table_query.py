@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from src.app import Workload
+from src.persistence import WORKLOAD_COLUMNS, persist_workloads
+from src.table_query import FirstPage, TableQueryError, frame_rows, parse_table_args, query_frame, query_workloads
+
+VMS = pd.DataFrame({
+    'vmId': ['vm-1', 'vm-2', 'vm-3', 'vm-4'],
+    'cluster': ['Cluster 01', 'Cluster 02', 'Cluster 01', None],
+    'os': ['Windows', 'Ubuntu Linux', 'CentOS Linux', 'Windows'],
+    'vmState': ['poweredOn', 'poweredOff', 'poweredOn', 'poweredOn'],
+    'vCpu': [4, 2, 8, 2],
+    'vRam': [16.0, None, 32.0, 4.0],
+})
+
+
+def test_parse_table_args_defaults_and_validation():
+    assert parse_table_args({}, VMS.columns) == {'offset': 0, 'limit': 100, 'sort': None, 'descending': False, 'filters': {}}
+    assert parse_table_args({'sort': 'vCpu', 'order': 'desc', 'os': 'linux', 'vmName': 'x'}, VMS.columns)['filters'] == {'os': 'linux'}
+    for bad in ({'limit': '0'}, {'limit': '5000'}, {'offset': '-1'}, {'offset': 'x'}, {'sort': 'password'}, {'order': 'up'}):
+        with pytest.raises(TableQueryError):
+            parse_table_args(bad, VMS.columns)
+
+
+def test_filter_sort_and_page():
+    total, page = query_frame(VMS, offset=0, limit=1, sort='vCpu', descending=True, filters={'os': 'LINUX'})
+    assert total == 2
+    assert page['vmId'].tolist() == ['vm-3']
+
+    total, page = query_frame(VMS, offset=1, limit=2, sort='vCpu', descending=False, filters={})
+    assert total == 4
+    assert page['vmId'].tolist() == ['vm-4', 'vm-1']
+
+
+def test_frame_rows_are_json_ready():
+    _, page = query_frame(VMS, offset=1, limit=1, sort=None, descending=False, filters={})
+    assert frame_rows(page) == [['vm-2', 'Cluster 02', 'Ubuntu Linux', 'poweredOff', 2, None]]
+
+
+def test_persisted_workloads_query():
+    engine = create_engine('sqlite://')
+    table = Workload.__table__
+    table.create(engine)
+    with engine.begin() as conn:
+        persist_workloads(conn, table, 1, VMS)
+        persist_workloads(conn, table, 2, VMS)
+
+    columns = list(WORKLOAD_COLUMNS)
+    count_query, page_query = query_workloads(table, 1, columns, offset=0, limit=2, sort='vCpu', descending=True, filters={'vmState': 'poweredon'})
+    with engine.connect() as conn:
+        assert conn.execute(count_query).scalar() == 3
+        rows = conn.execute(page_query).all()
+    assert [row.vmId for row in rows] == ['vm-3', 'vm-1']
+
+
+def test_first_page_loads_only_when_iterated():
+    loads = []
+    first_page = FirstPage(lambda: loads.append(1) or VMS, limit=3, chunk_rows=2)
+    assert loads == [] and first_page.payload is None
+
+    chunks = list(first_page)
+    assert loads == [1]
+    assert [len(rows) for rows in chunks] == [2, 1]
+    assert sum(chunks, []) == frame_rows(VMS.iloc[:3])
+    assert first_page.payload == {'total': 4, 'offset': 0, 'limit': 3, 'columns': list(VMS.columns), 'rows': []}
+
+    # an expired result streams no rows and leaves the page to fetch them
+    expired = FirstPage(lambda: None)
+    assert list(expired) == [] and expired.payload is None
@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+import zipfile
+import pytest
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from src.app import app
+from src.uploads import evict_uploads, extract_workbooks, is_archive
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    saved = app.config['UPLOAD_FOLDER'], app.config['MAX_CONTENT_LENGTH']
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    yield tmp_path
+    app.config['UPLOAD_FOLDER'], app.config['MAX_CONTENT_LENGTH'] = saved
+
+
+def post_file(content, file_name='upload.xlsx'):
+    return app.test_request_context('/upload', method='POST', content_type='multipart/form-data',
+                                    data={'file': (io.BytesIO(content), file_name)})
+
+
+def test_upload_is_streamed_into_its_own_folder(upload_folder):
+    with open('tests/test_files/rvtools_file_sample.xlsx', 'rb') as f:
+        content = f.read()
+    with post_file(content):
+        upload = request.files['file'].stream
+        input_path = upload.keep('rvtools_file_sample.xlsx')
+        assert upload.hexdigest() == hashlib.sha256(content).hexdigest()
+
+    assert os.path.dirname(input_path) == str(upload_folder)
+    with open(os.path.join(input_path, 'rvtools_file_sample.xlsx'), 'rb') as f:
+        assert f.read() == content
+
+
+def test_same_names_do_not_collide(upload_folder):
+    folders = set()
+    for _ in range(2):
+        with post_file(b'PK\x03\x04' + b'\x00' * 100):
+            folders.add(request.files['file'].stream.keep('upload.xlsx'))
+    assert len(folders) == 2
+
+
+def test_wrong_magic_is_rejected_before_the_body_is_read(upload_folder):
+    with post_file(b'<html>' + b'x' * 1024 * 1024):
+        with pytest.raises(UnsupportedMediaType):
+            request.files
+    assert os.listdir(upload_folder) == []
+
+
+def test_oversized_upload_is_rejected(upload_folder):
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    with post_file(b'PK\x03\x04' + b'\x00' * 4096):
+        with pytest.raises(RequestEntityTooLarge):
+            request.files
+    assert os.listdir(upload_folder) == []
+
+
+def test_uploads_not_kept_are_removed_with_the_request(upload_folder):
+    with post_file(b'PK\x03\x04'):
+        assert not request.files['file'].stream.kept
+        assert len(os.listdir(upload_folder)) == 1
+    assert os.listdir(upload_folder) == []
+
+
+def test_least_recently_used_uploads_are_evicted(tmp_path):
+    folders = {}
+    for age, name in enumerate(['newest', 'converting', 'middle', 'oldest', 'writing']):
+        folder = tmp_path / f'upload-{name}'
+        folder.mkdir()
+        (folder / ('upload.part' if name == 'writing' else 'export.xlsx')).write_bytes(b'x' * 1000)
+        for path in (folder, *folder.iterdir()):
+            os.utime(path, (1000 - age, 1000 - age))
+        folders[name] = folder
+    (tmp_path / 'jobs.sqlite3').write_bytes(b'not an upload')
+
+    # the oldest two that are neither being converted nor written go
+    assert evict_uploads(str(tmp_path), 3000, keep=[str(folders['converting'])]) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['jobs.sqlite3', 'upload-converting', 'upload-newest', 'upload-writing']
+    assert evict_uploads(str(tmp_path), 3000) == 0
+
+
+def test_zip_of_exports_is_unpacked(tmp_path):
+    archive_path = tmp_path / 'exports.zip'
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.write('tests/test_files/rvtools_file_sample.xlsx', 'site a/vcenter.xlsx')
+        archive.write('tests/test_files/rvtools_file_sample.xlsx', 'site b/vcenter.xlsx')
+        archive.writestr('__MACOSX/site a/._vcenter.xlsx', b'resource fork')
+        archive.writestr('README.txt', 'not an export')
+    assert is_archive(str(archive_path))
+    assert not is_archive('tests/test_files/rvtools_file_sample.xlsx')
+
+    assert extract_workbooks(str(archive_path), str(tmp_path), 10 * 1024 * 1024, 10) == ['vcenter.xlsx', 'vcenter-1.xlsx']
+    assert sorted(os.listdir(tmp_path)) == ['exports.zip', 'vcenter-1.xlsx', 'vcenter.xlsx']
+
+
+def test_zip_bomb_is_refused(tmp_path):
+    archive_path = tmp_path / 'bomb.zip'
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('huge.xlsx', b'\x00' * 1024 * 1024)
+    with pytest.raises(RequestEntityTooLarge):
+        extract_workbooks(str(archive_path), str(tmp_path), 64 * 1024, 10)
+    # the declared size is checked before anything is written
+    assert os.listdir(tmp_path) == ['bomb.zip']
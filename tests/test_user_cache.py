@@ -0,0 +1,83 @@
+import time
+from types import SimpleNamespace
+from src.user_cache import MemoryBackend, SqliteBackend, UserCache, create_user_cache
+
+
+class Loader:
+    """Stands in for the users_tb query and counts how often it runs."""
+
+    def __init__(self, *users):
+        self.users = {user.id: user for user in users}
+        self.calls = 0
+
+    def __call__(self, user_id):
+        self.calls += 1
+        return self.users.get(user_id)
+
+
+SALLY = SimpleNamespace(id=1, username='sally', password='hash')
+
+
+def test_repeat_lookups_are_served_from_the_cache():
+    cache = create_user_cache(ttl=60, max_entries=8)
+    loader = Loader(SALLY)
+
+    first, second = cache.load(1, loader), cache.load(1, loader)
+
+    assert loader.calls == 1
+    assert (second.id, second.username, second.get_id()) == (1, 'sally', '1')
+    assert first == second
+    assert not hasattr(second, 'password')
+    assert cache.stats()['hitRatio'] == 0.5
+
+
+def test_invalidated_and_expired_entries_are_reloaded(monkeypatch):
+    cache = create_user_cache(ttl=60, max_entries=8)
+    loader = Loader(SALLY)
+    cache.load(1, loader)
+
+    cache.invalidate(1)
+    cache.load(1, loader)
+    assert loader.calls == 2
+
+    monkeypatch.setattr(time, 'time', lambda now=time.time(): now + 61)
+    cache.load(1, loader)
+    assert loader.calls == 3
+
+
+def test_unknown_users_and_disabled_cache():
+    loader = Loader(SALLY)
+    assert create_user_cache(ttl=60, max_entries=8).load(2, loader) is None
+
+    cache = create_user_cache(ttl=0, max_entries=8)
+    cache.load(1, loader)
+    cache.load(1, loader)
+    assert loader.calls == 3
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    backend = MemoryBackend(max_entries=2)
+    for key in (1, 2):
+        backend.set(key, {'id': key}, expires=time.time() + 60)
+    backend.get(1, time.time())
+    backend.set(3, {'id': 3}, expires=time.time() + 60)
+
+    assert backend.get(2, time.time()) is None
+    assert backend.get(1, time.time()) == {'id': 1}
+
+
+def test_sqlite_backend_is_shared_between_processes(tmp_path):
+    # two caches on one file stand in for two gunicorn workers
+    path = str(tmp_path / 'users.sqlite3')
+    worker_a, worker_b = UserCache(SqliteBackend(path), ttl=60), UserCache(SqliteBackend(path), ttl=60)
+    loader = Loader(SALLY)
+
+    worker_a.load(1, loader)
+    assert worker_b.load(1, loader).username == 'sally'
+    assert loader.calls == 1
+
+    worker_b.invalidate(1)
+    worker_a.load(1, loader)
+    assert loader.calls == 2
+    assert worker_a.stats()['entries'] == 1
@@ -0,0 +1,66 @@
+"""Wall-clock and peak-memory comparison of the shared workbook handle against per-sheet read_excel calls.
+
+The benchmark is deselected by default; run it with `python -m pytest -c tests/pytest.ini tests -k slow`.
+The check that both paths convert alike runs by default, on a small generated workbook.
+Set BENCH_VMS to change the number of generated VMs.
+"""
+import os
+import time
+import pandas as pd
+import pytest
+from pandas import testing as pdtest
+from src.data_validation import filetype_validation
+from src.transform_rvtools import rvtools_conversion
+from src.workbook import Workbook
+from tests.benchmark_tools import peak_traced
+from tests.workbook_generator import write_rvtools_workbook
+
+BENCH_VMS = int(os.getenv('BENCH_VMS', '2000'))
+
+
+def legacy_ingest(input_path, file_name):
+    """The pre-Workbook access pattern: one ExcelFile for validation, then one read_excel per sheet."""
+    path = os.path.join(input_path, file_name)
+    pd.ExcelFile(path).sheet_names
+    return [pd.read_excel(path, sheet_name=sheet) for sheet in ('vInfo', 'vDisk', 'vPartition')]
+
+
+def shared_ingest(input_path, file_name):
+    with Workbook(input_path, file_name) as workbook:
+        filetype_validation(input_path, file_name, workbook=workbook)
+        return rvtools_conversion(input_path=input_path, file_name=file_name, workbook=workbook)
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    return result, elapsed, peak_traced(func, *args)
+
+
+@pytest.fixture(scope='module')
+def large_rvtools(tmp_path_factory):
+    input_path = str(tmp_path_factory.mktemp('bench'))
+    write_rvtools_workbook(os.path.join(input_path, 'rvtools_large.xlsx'), vms=BENCH_VMS)
+    return input_path, 'rvtools_large.xlsx'
+
+
+@pytest.mark.slow
+def test_shared_workbook_benchmark(large_rvtools):
+    _, legacy_time, legacy_peak = measure(legacy_ingest, *large_rvtools)
+    result, shared_time, shared_peak = measure(shared_ingest, *large_rvtools)
+
+    print()
+    print(f'{BENCH_VMS} VMs: legacy {legacy_time:.2f}s / {legacy_peak / 2**20:.1f} MiB peak, '
+          f'shared handle {shared_time:.2f}s / {shared_peak / 2**20:.1f} MiB peak')
+
+    assert len(result) == BENCH_VMS
+    assert shared_time < legacy_time
+    assert shared_peak < legacy_peak
+
+
+def test_shared_workbook_matches_path_based_conversion(tmp_path):
+    write_rvtools_workbook(str(tmp_path / 'rvtools_small.xlsx'), vms=50)
+    input_path, file_name = str(tmp_path), 'rvtools_small.xlsx'
+    expected = rvtools_conversion(input_path=input_path, file_name=file_name)
+    pdtest.assert_frame_equal(shared_ingest(input_path, file_name), expected)
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from pandas import testing as pdtest
+from src.xlsx_reader import XlsxReader
+
+SHEET_COLUMNS = [
+    ('rvtools_file_sample.xlsx', 'vInfo', ['VM ID', 'Cluster', 'Datacenter', 'Primary IP Address', 'DNS Name', 'CPUs', 'Memory', 'Provisioned MiB', 'In Use MiB']),
+    ('rvtools_file_sample.xlsx', 'vDisk', ['VM ID', 'Capacity MiB']),
+    ('rvtools_file_sample.xlsx', 'vPartition', ['VM ID', 'Consumed MiB']),
+    ('liveoptics_file_sample.xlsx', 'VMs', ['MOB ID', 'VM Name', 'Guest IP1', 'Guest IP2', 'Virtual CPU', 'Provisioned Memory (MiB)']),
+    ('liveoptics_file_sample.xlsx', 'VM Performance', ['MOB ID', 'Avg Read IOPS', 'Peak Write MB/s']),
+]
+
+
+@pytest.mark.parametrize('file_name,sheet,columns', SHEET_COLUMNS)
+def test_projection_matches_read_excel(file_name, sheet, columns):
+    path = f'tests/test_files/{file_name}'
+    reader = XlsxReader(path)
+    expected = pd.read_excel(path, sheet_name=sheet, usecols=lambda col: col in columns)
+
+    assert reader.sheet_names == pd.ExcelFile(path).sheet_names
+    pdtest.assert_frame_equal(reader.read_sheet(sheet, columns), expected)
+
+
+def test_sparse_rows_and_missing_cells(tmp_path):
+    path = tmp_path / 'sparse.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'vInfo'
+    ws.append(['VM ID', 'Notes', 'CPUs', 'Memory'])
+    ws.append(['vm-1', 'kept row', 2, 4096.5])
+    ws['B4'] = 'only an unwanted column has data'
+    ws.append(['vm-3', None, None, 8192])
+    ws['C8'] = 4
+    wb.save(path)
+
+    columns = ['VM ID', 'CPUs', 'Memory']
+    expected = pd.read_excel(path, sheet_name='vInfo', usecols=lambda col: col in columns)
+    pdtest.assert_frame_equal(XlsxReader(path).read_sheet('vInfo', columns), expected)
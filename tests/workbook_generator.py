@@ -0,0 +1,136 @@
+"""Synthetic RVTools and LiveOptics inventories for testing and benchmarking the ingestion path at realistic sizes.
+
+Whole workbooks for the path from upload on, a LiveOptics VMs sheet as read for the transform alone,
+and consolidated frames, as a conversion outputs them, for everything after conversion.
+Both exporters have written sizes under MiB and MB headers over the years; `unit` picks the variant.
+Workbook values are derived from the row number, and frame values from a seeded generator, so the
+same arguments always produce the same data.
+"""
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+RV_SHEETS = ['vInfo', 'vCPU', 'vMemory', 'vDisk', 'vPartition', 'vNetwork', 'vCD', 'vUSB', 'vSnapshot', 'vTools', 'vSource', 'vRP', 'vCluster', 'vHost', 'vHBA', 'vNIC', 'vSwitch', 'vPort', 'dvSwitch', 'dvPort', 'vSC_VMK', 'vDatastore', 'vMultiPath', 'vLicense', 'vFileInfo', 'vHealth', 'vMetaData']
+LO_SHEETS = ['Details', 'ESX Hosts', 'ESX Performance', 'Host Devices', 'VMs', 'VM Performance', 'VM Disks', 'ESX Licenses', 'Host Disks', 'Host Network Adapters']
+
+
+def _filler(prefix, count):
+    return [f'{prefix} {i}' for i in range(count)]
+
+
+def _ip(i):
+    return f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'
+
+
+def write_rvtools_workbook(path, vms, disks_per_vm=3, unit='MiB', filler_columns=60):
+    """Write an RVTools-shaped workbook with `vms` rows in vInfo and `disks_per_vm` rows per VM in vDisk/vPartition."""
+    wb = Workbook(write_only=True)
+    sheets = {name: wb.create_sheet(name) for name in RV_SHEETS}
+
+    filler = _filler('vInfo extra', filler_columns)
+    sheets['vInfo'].append(['VM', 'Powerstate', 'DNS Name', 'CPUs', 'Memory', 'Primary IP Address',
+                            f'Provisioned {unit}', f'In Use {unit}', 'OS according to the VMware Tools',
+                            'Datacenter', 'Cluster', 'VI SDK Server', 'VM ID'] + filler)
+    for i in range(vms):
+        sheets['vInfo'].append([f'vm{i}', 'poweredOn' if i % 5 else 'poweredOff', f'vm{i}.example.com', 1 + i % 8,
+                                4096 * (1 + i % 4), _ip(i) if i % 11 else None,
+                                102400.5 + i, 51200.25 + i, 'Microsoft Windows Server 2016 or later (64-bit)' if i % 7 else None,
+                                f'Datacenter {i % 3}', f'Cluster {i % 10}', f'vcenter{i % 2}.example.com', f'vm-{i}'] + [f'value {i}'] * filler_columns)
+
+    filler = _filler('vDisk extra', filler_columns // 2)
+    sheets['vDisk'].append(['VM', 'Disk', f'Capacity {unit}', 'VM ID'] + filler)
+    filler_part = _filler('vPartition extra', filler_columns // 3)
+    sheets['vPartition'].append(['VM', 'Disk', f'Capacity {unit}', f'Consumed {unit}', 'VM ID'] + filler_part)
+    for i in range(vms):
+        for d in range(disks_per_vm):
+            sheets['vDisk'].append([f'vm{i}', f'Hard disk {d + 1}', 40960 + d, f'vm-{i}'] + [d] * len(filler))
+            sheets['vPartition'].append([f'vm{i}', f'C{d}:\\', 40960 + d, 20480 + d, f'vm-{i}'] + [d] * len(filler_part))
+
+    wb.save(path)
+    return path
+
+
+def write_liveoptics_workbook(path, vms, unit='MiB', filler_columns=40):
+    """Write a LiveOptics-shaped workbook with `vms` rows in VMs and VM Performance.
+
+    Guest IPs are sparse the way real exports are - most VMs report one, few report four - and
+    every seventh VM has no OS, so the transforms' fills and IP joins are exercised.
+    """
+    wb = Workbook(write_only=True)
+    sheets = {name: wb.create_sheet(name) for name in LO_SHEETS}
+
+    filler = _filler('VMs extra', filler_columns)
+    sheets['VMs'].append(['VM Name', 'MOB ID', 'Power State', 'Guest Hostname', 'VM OS', 'Virtual CPU',
+                          f'Provisioned Memory ({unit})', f'Virtual Disk Size ({unit})', f'Virtual Disk Used ({unit})',
+                          'Datacenter', 'Cluster', 'vCenter', 'Guest IP1', 'Guest IP2', 'Guest IP3', 'Guest IP4'] + filler)
+    for i in range(vms):
+        ips = [_ip(i + offset) if i % divisor == 0 else None for offset, divisor in ((0, 1), (1, 3), (2, 10), (3, 20))]
+        sheets['VMs'].append([f'vm{i}', f'vm-{i}', 'poweredOn' if i % 5 else 'poweredOff', f'vm{i}.example.com',
+                              'Microsoft Windows Server 2016 or later (64-bit)' if i % 7 else None, 1 + i % 8,
+                              4096 * (1 + i % 4), 122880.5 + i, 61440.25 + i,
+                              f'Datacenter {i % 3}', f'Cluster {i % 10}', f'vcenter{i % 2}.example.com'] + ips + [f'value {i}'] * filler_columns)
+
+    sheets['VM Performance'].append(['VM Name', 'MOB ID', 'Avg Read IOPS', 'Avg Write IOPS', 'Peak Read IOPS', 'Peak Write IOPS',
+                                     'Avg Read MB/s', 'Avg Write MB/s', 'Peak Read MB/s', 'Peak Write MB/s'])
+    for i in range(vms):
+        sheets['VM Performance'].append([f'vm{i}', f'vm-{i}', 10.5 + i % 100, 5.25 + i % 50, 100 + i % 1000, 50 + i % 500,
+                                         1.5 + i % 10, 0.75 + i % 5, 15 + i % 100, 7.5 + i % 50])
+
+    wb.save(path)
+    return path
+
+
+def synthetic_vms_sheet(rows, unit='MiB', seed=0):
+    """A VMs sheet as read from a LiveOptics export, with sparse guest IPs and missing OS names."""
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+
+    def ips(fraction):
+        return pd.Series(np.where(rng.random(rows) < fraction, [f'10.0.{i % 256}.{i % 254 + 1}' for i in index], None), dtype=object)
+
+    return pd.DataFrame({
+        'MOB ID': [f'vm-{i}' for i in index],
+        'VM Name': [f'vm{i}' for i in index],
+        'Guest Hostname': [f'vm{i}.example.com' for i in index],
+        'Power State': np.where(index % 5, 'poweredOn', 'poweredOff'),
+        'VM OS': pd.Series(np.where(index % 7, 'Microsoft Windows Server 2016 or later (64-bit)', None), dtype=object),
+        'Virtual CPU': rng.integers(1, 32, rows),
+        f'Provisioned Memory ({unit})': rng.integers(1, 64, rows) * 1024,
+        f'Virtual Disk Size ({unit})': rng.random(rows) * 1e6,
+        f'Virtual Disk Used ({unit})': rng.random(rows) * 5e5,
+        'Datacenter': [f'Datacenter {i % 3}' for i in index],
+        'Cluster': [f'Cluster {i % 12}' for i in index],
+        'Guest IP1': ips(0.8),
+        'Guest IP2': ips(0.3),
+        'Guest IP3': ips(0.1),
+        'Guest IP4': ips(0.05),
+        'Datastore': 'datastore1',
+    })
+
+
+def synthetic_inventory(rows, seed=0):
+    """A consolidated frame of `rows` VMs in four clusters, as a conversion outputs it.
+
+    Every fifth VM is powered off, every seventh reports no OS and every third of the rest runs
+    Windows, the others Linux; sizes and IOPS vary with the seed.
+    """
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+    return pd.DataFrame({
+        'vmId': [f'vm-{i}' for i in index],
+        'vmName': [f'vm{i}' for i in index],
+        'cluster': [f'Cluster {i % 4}' for i in index],
+        'virtualDatacenter': 'Datacenter 01',
+        'vmState': np.where(index % 5, 'poweredOn', 'poweredOff'),
+        'os': pd.Series(np.where(index % 7, np.where(index % 3, 'Ubuntu Linux (64-bit)', 'Microsoft Windows Server 2019'), None), dtype=object),
+        'os_name': [f'vm{i}.example.com' for i in index],
+        'ip_addresses': 'no ip',
+        'vCpu': rng.integers(1, 17, rows),
+        'vRam': rng.integers(1, 129, rows).astype(float),
+        'vinfo_provisioned': (rng.random(rows) * 2000).round(3),
+        'vinfo_used': (rng.random(rows) * 1000).round(3),
+        'vmdkTotal': (rng.random(rows) * 2000).round(3),
+        'vmdkUsed': (rng.random(rows) * 1000).round(3),
+        'peakReadIOPS': (rng.random(rows) * 500).round(3),
+        'peakWriteIOPS': (rng.random(rows) * 500).round(3),
+    })